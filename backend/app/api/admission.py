@@ -0,0 +1,154 @@
+import contextvars
+import heapq
+import itertools
+import json
+import math
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.api.query_backend import QueryBackend
+
+# Queries waiting for a slot are admitted by priority, then in order of arrival
+INTERACTIVE = 0  # point lookups of a few ships
+SCAN = 1  # lists and aggregations over the whole table
+
+_query_priority = contextvars.ContextVar("query_priority", default=SCAN)
+
+
+@contextmanager
+def query_priority(priority: int):
+    """Sets the priority of the queries run in the block"""
+    token = _query_priority.set(priority)
+    try:
+        yield
+    finally:
+        _query_priority.reset(token)
+
+
+class QueueFullError(Exception):
+    """Raised when a query cannot be admitted: the queue is full or the query waited too
+    long. The caller should retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int, message: str = "Too many queries in flight"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def overloaded_response(error: QueueFullError) -> dict:
+    return {
+        "statusCode": 503,
+        "headers": {"Content-Type": "application/json", "Retry-After": str(error.retry_after)},
+        "body": json.dumps({"error": str(error)}),
+    }
+
+
+class AdmissionController:
+    """Limits the number of queries in flight, to stay under the concurrent query quota of
+    Athena. Queries over the limit wait in a priority queue, so interactive lookups pass
+    before list scans. When `max_queue` queries are already waiting, or a query waits more
+    than `max_wait_seconds`, it is rejected at once with an estimate of when to retry,
+    instead of piling up.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int = 50,
+        max_wait_seconds: float = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._queue: List[list] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._mean_duration = 1.0
+        self._counters = {"admitted": 0, "rejected": 0, "max_queue_depth": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        with self._condition:
+            metrics = {"in_flight": self._in_flight, "queue_depth": len(self._queue), **self._counters}
+        metrics["mean_wait_seconds"] = metrics["wait_seconds_total"] / max(metrics["admitted"], 1)
+        return metrics
+
+    def _retry_after(self) -> int:
+        """The time to drain the queue at the mean query duration"""
+        return max(1, math.ceil(self._mean_duration * (len(self._queue) + 1) / self.max_in_flight))
+
+    def _reject(self, message: str):
+        self._counters["rejected"] += 1
+        raise QueueFullError(self._retry_after(), message)
+
+    def _wait_for_slot(self, priority: int, start: float):
+        if len(self._queue) >= self.max_queue:
+            self._reject("Too many queries waiting, the queue is full")
+
+        entry = [priority, next(self._sequence)]
+        heapq.heappush(self._queue, entry)
+        self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], len(self._queue))
+
+        while not (self._in_flight < self.max_in_flight and self._queue[0] is entry):
+            remaining = start + self.max_wait_seconds - self.clock()
+            if remaining <= 0:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+                self._reject("Timed out waiting for a query slot")
+            self._condition.wait(remaining)
+
+        heapq.heappop(self._queue)
+        # the next query of the queue may take another free slot
+        self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, priority: int = SCAN):
+        start = self.clock()
+        with self._condition:
+            if self._in_flight >= self.max_in_flight or self._queue:
+                self._wait_for_slot(priority, start)
+            self._in_flight += 1
+
+            waited = self.clock() - start
+            self._counters["admitted"] += 1
+            self._counters["wait_seconds_total"] += waited
+            self._counters["wait_seconds_max"] = max(self._counters["wait_seconds_max"], waited)
+
+        started = self.clock()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._mean_duration = 0.8 * self._mean_duration + 0.2 * (self.clock() - started)
+                self._condition.notify_all()
+
+
+class AdmissionBackend(QueryBackend):
+    """Runs the queries of a backend through an admission controller, with the priority set
+    by `query_priority`. A query throttled by Athena is rejected like a full queue."""
+
+    THROTTLING_ERRORS = {"TooManyRequestsException", "ThrottlingException"}
+
+    def __init__(self, backend: QueryBackend, controller: AdmissionController):
+        self.backend = backend
+        self.controller = controller
+
+    def execute(self, query: str, parameters: Optional[Sequence] = None) -> List[Dict[str, str]]:
+        with self.controller.admit(_query_priority.get()):
+            try:
+                return self.backend.execute(query, parameters)
+            except Exception as e:
+                code = getattr(e, "response", {}).get("Error", {}).get("Code")
+                if code in self.THROTTLING_ERRORS:
+                    raise QueueFullError(1, "Athena is throttling the queries") from e
+                raise
+
+    def columns(self, table: str) -> List[str]:
+        return self.backend.columns(table)
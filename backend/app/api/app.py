@@ -0,0 +1,154 @@
+"""The API as a single application: one Lambda handler routes the requests of every endpoint,
+so the endpoints share a warm container, its query backend and its clients.
+
+The endpoint modules are imported on the first request of one of their routes, and the
+clients they use are created on their first query, so a cold start only pays for the route
+it serves.
+
+For development, the application runs as a WSGI server (DATABASE, TABLE and API_URL set, and
+QUERY_BACKEND=duckdb with DUCKDB_DATA_PATH to serve local Parquet files):
+    python -m app.api.app --port 8000
+"""
+import argparse
+import base64
+import importlib
+import json
+import re
+
+from http import HTTPStatus
+from socketserver import ThreadingMixIn
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, make_server
+
+# method, path template, endpoint module, handler
+ROUTES = [
+    ("GET", "/emissions", "emissions_endpoint", "lambda_handler"),
+    ("GET", "/emissions/batch", "emissions_endpoint", "batch_lambda_handler"),
+    ("POST", "/emissions/batch", "emissions_endpoint", "batch_lambda_handler"),
+    ("GET", "/ships", "ship_types_endpoint", "lambda_handler"),
+    ("GET", "/ship_types", "ship_types_endpoint", "lambda_handler"),
+    ("GET", "/ships/{ship_id}", "ship_data_endpoint", "lambda_handler"),
+    ("GET", "/metadata", "metadata_endpoint", "lambda_handler"),
+    ("GET", "/rankings", "rankings_endpoint", "lambda_handler"),
+    ("POST", "/exports", "export_endpoint", "submit_lambda_handler"),
+    ("GET", "/exports/{job_id}", "export_endpoint", "status_lambda_handler"),
+]
+
+
+def compile_path(template: str) -> re.Pattern:
+    return re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template) + "/?$")
+
+
+_routes = [(method, compile_path(template), module, handler) for method, template, module, handler in ROUTES]
+_handlers: Dict[Tuple[str, str], Callable] = {}
+
+
+def endpoint_handler(module: str, handler: str) -> Callable:
+    """The handler of an endpoint module, imported on its first request"""
+    if (module, handler) not in _handlers:
+        endpoint = importlib.import_module(f"app.api.endpoints.{module}")
+        _handlers[(module, handler)] = getattr(endpoint, handler)
+    return _handlers[(module, handler)]
+
+
+def resolve(method: str, path: str) -> Tuple[Optional[Callable], Dict[str, str], List[str]]:
+    """The handler and path parameters of a request, or no handler and the methods allowed
+    on the path"""
+    allowed = []
+    for route_method, pattern, module, handler in _routes:
+        match = pattern.match(path)
+        if match is None:
+            continue
+        if route_method == method:
+            return endpoint_handler(module, handler), match.groupdict(), []
+        allowed.append(route_method)
+    return None, {}, allowed
+
+
+def request_line(event: Dict) -> Tuple[str, str]:
+    """The method and path of a REST API (v1) or HTTP API (v2) event, without the stage"""
+    context = event.get("requestContext") or {}
+    method = event.get("httpMethod") or context.get("http", {}).get("method", "GET")
+    path = event.get("path") or event.get("rawPath") or "/"
+
+    stage = context.get("stage")
+    if stage and stage != "$default" and path.startswith(f"/{stage}/"):
+        path = path[len(stage) + 1:]
+    return method.upper(), path
+
+
+def error_response(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> Dict:
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json", **(headers or {})},
+        "body": json.dumps({"error": message}),
+    }
+
+
+def lambda_handler(event, context):
+    method, path = request_line(event)
+    handler, path_parameters, allowed = resolve(method, path)
+    if handler is None:
+        if allowed:
+            return error_response(405, "Method not allowed", {"Allow": ", ".join(allowed)})
+        return error_response(404, "Not found")
+
+    event = {**event, "pathParameters": {**(event.get("pathParameters") or {}), **path_parameters}}
+    response = handler(event, context)
+
+    # API Gateway expects a string body, some error responses of the endpoints are objects
+    if not isinstance(response.get("body", ""), str):
+        response = {**response, "body": json.dumps(response["body"])}
+    return response
+
+
+def wsgi_event(environ: Dict) -> Dict:
+    """The API Gateway (REST API) event of a WSGI request"""
+    query = {name: values[-1] for name, values in parse_qs(environ.get("QUERY_STRING", "")).items()}
+    headers = {
+        name[5:].replace("_", "-").title(): value for name, value in environ.items() if name.startswith("HTTP_")
+    }
+    if environ.get("CONTENT_TYPE"):
+        headers["Content-Type"] = environ["CONTENT_TYPE"]
+
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    body = environ["wsgi.input"].read(length).decode("utf-8") if length else None
+    return {
+        "httpMethod": environ["REQUEST_METHOD"],
+        "path": environ.get("PATH_INFO") or "/",
+        "queryStringParameters": query or None,
+        "pathParameters": None,
+        "headers": headers,
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def wsgi_app(environ, start_response):
+    response = lambda_handler(wsgi_event(environ), None)
+
+    body = response.get("body") or ""
+    body = base64.b64decode(body) if response.get("isBase64Encoded") else body.encode("utf-8")
+    status = HTTPStatus(response["statusCode"])
+    start_response(f"{status.value} {status.phrase}", list((response.get("headers") or {}).items()))
+    return [body]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    with make_server(args.host, args.port, wsgi_app, server_class=ThreadingWSGIServer) as server:
+        print(f"Serving the API on http://{args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
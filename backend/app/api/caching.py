@@ -0,0 +1,84 @@
+import hashlib
+import json
+
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+
+from app.api.query_backend import current_dataset_version
+from app.api.responses import request_header
+from app.api.ship_snapshot import get_ship_snapshot_reader
+
+# The responses only change when the ETL loads a new dataset version, which changes their
+# ETag, so the clients revalidate often and a revalidation is a 304 without any query.
+# Shared caches (a CDN) keep the responses longer.
+CACHE_CONTROL = {
+    "metadata": "public, max-age=300, s-maxage=3600, stale-while-revalidate=86400",
+    "ship_types": "public, max-age=300, s-maxage=3600, stale-while-revalidate=86400",
+    "emissions": "public, max-age=60, s-maxage=600",
+    "ship_data": "public, max-age=60, s-maxage=600",
+    "rankings": "public, max-age=300, s-maxage=3600, stale-while-revalidate=86400",
+}
+
+
+def last_modified() -> Optional[float]:
+    """The time the ETL published the dataset version served, if the snapshots are deployed"""
+    reader = get_ship_snapshot_reader()
+    return reader.published_at() if reader is not None else None
+
+
+def entity_tag(event: Dict, endpoint: str, dataset_version: str) -> str:
+    """A weak ETag of the response to a request: the same request gets the same response
+    until the dataset version changes (the request_id and timestamp aside)"""
+    request = json.dumps(
+        [
+            endpoint,
+            dataset_version,
+            event.get("pathParameters") or {},
+            event.get("queryStringParameters") or {},
+            event.get("body"),
+        ],
+        sort_keys=True,
+    )
+    return f'W/"{hashlib.sha256(request.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def cache_headers(event: Dict, endpoint: str) -> Dict[str, str]:
+    """The validators and Cache-Control of the response to a request, or no headers when
+    the dataset version is unknown"""
+    dataset_version = current_dataset_version()
+    if not dataset_version:
+        return {}
+
+    headers = {"ETag": entity_tag(event, endpoint, dataset_version), "Cache-Control": CACHE_CONTROL[endpoint]}
+    published_at = last_modified()
+    if published_at is not None:
+        headers["Last-Modified"] = formatdate(published_at, usegmt=True)
+    return headers
+
+
+def is_not_modified(event: Dict, headers: Dict[str, str]) -> bool:
+    """Whether the client has the response already: If-None-Match, or else If-Modified-Since,
+    as in RFC 9110"""
+    if_none_match = request_header(event, "If-None-Match")
+    if if_none_match is not None:
+        if "ETag" not in headers:
+            return False
+        # the weak comparison, W/ prefixes aside
+        etag = headers["ETag"].removeprefix("W/")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request_header(event, "If-Modified-Since")
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]).timestamp() <= since
+
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Dict:
+    """The 304 response of a conditional request, with the headers of the full response"""
+    return {"statusCode": 304, "headers": {**headers, "Vary": "Accept-Encoding"}, "body": ""}
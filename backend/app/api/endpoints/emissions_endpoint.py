@@ -1,115 +1,74 @@
+import base64
 import json
-import boto3
 import time
 import os
 import math
-import random, string
 from datetime import datetime
-from typing import Dict, Optional, TypedDict
+from typing import Dict, List, Optional, TypedDict
 from dataclasses import dataclass
 from decimal import Decimal
 
-# Initialize the Athena client
-athena_client = boto3.client("athena")
+from app.api.admission import INTERACTIVE, QueueFullError, overloaded_response, query_priority
+from app.api.caching import cache_headers, is_not_modified, not_modified_response
+from app.api.query_backend import execute_query, latest_data_cte, page_clause, parse_fields
+from app.api.responses import format_rows, json_response, parse_format, random_string
+from app.api.ship_snapshot import get_ship_snapshot_reader
 
 DATABASE = os.environ["DATABASE"]
 TABLE = os.environ["TABLE"]
-OUTPUT_LOCATION = os.environ["OUTPUT_LOCATION"]
 API_URL = os.environ["API_URL"]
-
-current_datetime = datetime.now()
-
-
-def random_string(length):
-    return "".join(
-        random.choice(string.ascii_lowercase + string.digits) for _ in range(length)
-    )
-
-
-def execute_athena_query(query):
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={"Database": DATABASE},
-        ResultConfiguration={"OutputLocation": OUTPUT_LOCATION},
-    )
-
-    query_execution_id = response["QueryExecutionId"]
-
-    # Wait for the query to complete (simplified for brevity)
-    while True:
-        query_status = athena_client.get_query_execution(
-            QueryExecutionId=query_execution_id
-        )
-        status = query_status["QueryExecution"]["Status"]["State"]
-        if status in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            break
-
-    if status == "SUCCEEDED":
-        results = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-        columns = [
-            col["Label"]
-            for col in results["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
-        ]
-        rows = results["ResultSet"]["Rows"][1:]  # Skip the header row
-        return [
-            dict(zip(columns, [field.get("VarCharValue", "") for field in row["Data"]]))
-            for row in rows
-        ]
-    else:
-        raise Exception(f"Query failed with status: {status}")
-
-
-joined_table = f"""
-    WITH latest_versions AS (
-        SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-        FROM "{DATABASE}"."{TABLE}"
-        GROUP BY CAST(year AS INTEGER)
-    ),
-
-    latest_data AS (
-        SELECT *
-        FROM "{DATABASE}"."{TABLE}" se
-        JOIN latest_versions lv
-        ON CAST(se.year AS INT) = lv.year
-        AND CAST(se.version AS INT) = lv.latest_version
-    )
-"""
-
-base_query = """
-    SELECT imo_number, name, ship_type, reporting_period, total_co2_emissions, 
-        co2_emissions_from_all_voyages_between_ports_under_a_ms_jurisdiction, 
-        co2_emissions_from_all_voyages_which_departed_from_ports_under_a_ms_jurisdiction, 
-        co2_emissions_from_all_voyages_to_ports_under_a_ms_jurisdiction, 
-        co2_emissions_which_occurred_within_ports_under_a_ms_jurisdiction_at_berth, 
-        co2_emissions_assigned_to_passenger_transport, 
-        co2_emissions_assigned_to_freight_transport, co2_emissions_assigned_to_on_laden
+MAX_BATCH_SHIPS = int(os.environ.get("MAX_BATCH_SHIPS", 200))
+
+joined_table = latest_data_cte(DATABASE, TABLE)
+
+EMISSIONS_COLUMNS = [
+    "imo_number",
+    "name",
+    "ship_type",
+    "reporting_period",
+    "total_co2_emissions",
+    "co2_emissions_from_all_voyages_between_ports_under_a_ms_jurisdiction",
+    "co2_emissions_from_all_voyages_which_departed_from_ports_under_a_ms_jurisdiction",
+    "co2_emissions_from_all_voyages_to_ports_under_a_ms_jurisdiction",
+    "co2_emissions_which_occurred_within_ports_under_a_ms_jurisdiction_at_berth",
+    "co2_emissions_assigned_to_passenger_transport",
+    "co2_emissions_assigned_to_freight_transport",
+    "co2_emissions_assigned_to_on_laden",
+]
+
+# the types of the columns in the typed and columnar formats
+EMISSIONS_TYPES = {column: float for column in EMISSIONS_COLUMNS}
+EMISSIONS_TYPES.update(imo_number=int, name=str, ship_type=str, reporting_period=int)
+
+
+def select_emissions(fields: Optional[List[str]] = None) -> str:
+    """The SELECT of the requested columns, all of EMISSIONS_COLUMNS by default. Athena only
+    reads the column chunks of the selected columns from the Parquet files."""
+    return f"""
+    SELECT {", ".join(fields or EMISSIONS_COLUMNS)}
     FROM latest_data
 """
 
 
 def get_total_results():
-    statement = f"""
+    statement = """
         SELECT COUNT(*) AS total_results
         FROM latest_data
     """
 
     query = joined_table + statement
 
-    total_results_value = execute_athena_query(query=query)
+    total_results_value = execute_query(query=query)
     return total_results_value
 
 
-def emissions_data_without_conditions(page, limit):
-    offset = (page - 1) * limit
-
+def emissions_data_without_conditions(page, limit, fields=None):
     pagination_query = f"""
-        ORDER BY imo_number, reporting_period DESC
-        OFFSET {offset}
-        LIMIT {limit}
+        ORDER BY imo_number, reporting_period DESC{page_clause(page, limit)}
     """
 
-    query = joined_table + base_query + pagination_query
-    data_response = execute_athena_query(query=query)
+    query = joined_table + select_emissions(fields) + pagination_query
+    data_response = execute_query(query=query)
     print(data_response)
 
     print(get_total_results())
@@ -134,7 +93,7 @@ def emissions_data_without_conditions(page, limit):
 
     return {
         "metadata": {
-            "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
             "request_id": random_string(10),
             "total_results": total_results,
             "page": page,
@@ -147,33 +106,33 @@ def emissions_data_without_conditions(page, limit):
     }
 
 
-def emissions_per_ship_id(ship_id):
+def emissions_per_ship_id(ship_id, fields=None):
     print("in am in func the parameters are ship id")
 
-    condition = f"""
-        WHERE imo_number = {ship_id}
+    condition = """
+        WHERE imo_number = ?
         ORDER BY reporting_period DESC;
     """
-    query = joined_table + base_query + condition
+    query = joined_table + select_emissions(fields) + condition
 
-    response = execute_athena_query(query=query)
+    response = execute_query(query=query, parameters=[ship_id])
 
-    statement = f"""
+    statement = """
         SELECT COUNT(*) AS total_results
         FROM latest_data
-        WHERE imo_number = {ship_id};
+        WHERE imo_number = ?;
     """
 
     query = joined_table + statement
 
-    total_results_value = execute_athena_query(query=query)
+    total_results_value = execute_query(query=query, parameters=[ship_id])
     total_results = int(total_results_value[0]["total_results"])
 
     print(total_results)
 
     return {
         "metadata": {
-            "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
             "request_id": random_string(10),
             "total_results": total_results,
         },
@@ -181,32 +140,67 @@ def emissions_per_ship_id(ship_id):
     }
 
 
-def emissions_per_ship_type_and_year(ship_type, year, page, limit):
-    print("Our parameters are ship_type and year")
-    offset = (page - 1) * limit
+def emissions_per_ship_ids(ship_ids: List[int], fields: Optional[List[str]] = None) -> Dict:
+    """Returns the emissions of several ships, grouped per ship in the order of the request.
+    The ships are looked up in the snapshot published by the ETL, and the ones it does not
+    have are fetched with a single query."""
+    fields = fields or EMISSIONS_COLUMNS
+    rows_per_ship = {ship_id: None for ship_id in ship_ids}
+
+    reader = get_ship_snapshot_reader()
+    if reader is not None:
+        for ship_id in ship_ids:
+            rows_per_ship[ship_id] = reader.lookup(ship_id, fields)
 
+    missing = [ship_id for ship_id, rows in rows_per_ship.items() if rows is None]
+    if missing:
+        condition = f"""
+        WHERE imo_number IN ({", ".join(["?"] * len(missing))})
+        ORDER BY imo_number, reporting_period DESC;
+    """
+        # the rows are grouped by imo_number, even when it is not requested
+        columns = fields if "imo_number" in fields else fields + ["imo_number"]
+        for ship_id in missing:
+            rows_per_ship[ship_id] = []
+        for row in execute_query(query=joined_table + select_emissions(columns) + condition, parameters=missing):
+            rows_per_ship[int(row["imo_number"])].append({field: row[field] for field in fields})
+
+    return {
+        "metadata": {
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
+            "request_id": random_string(10),
+            "total_ships": len(ship_ids),
+            "total_results": sum(len(rows) for rows in rows_per_ship.values()),
+        },
+        "results": [
+            {"ship_id": str(ship_id), "total_results": len(rows), "results": rows}
+            for ship_id, rows in rows_per_ship.items()
+        ],
+    }
+
+
+def emissions_per_ship_type_and_year(ship_type, year, page, limit, fields=None):
+    print("Our parameters are ship_type and year")
     condition_query = f"""
-        WHERE ship_type = '{ship_type}' AND reporting_period={year}
-        ORDER BY imo_number, reporting_period DESC
-        OFFSET {offset}
-        LIMIT {limit};
+        WHERE ship_type = ? AND reporting_period = ?
+        ORDER BY imo_number, reporting_period DESC{page_clause(page, limit)};
     """
 
     print(condition_query)
 
-    query = joined_table + base_query + condition_query
-    data_response = execute_athena_query(query=query)
+    query = joined_table + select_emissions(fields) + condition_query
+    data_response = execute_query(query=query, parameters=[ship_type, year])
     print(data_response)
 
-    statement = f"""
+    statement = """
         SELECT COUNT(*) AS total_results
         FROM latest_data
-        WHERE ship_type = '{ship_type}' AND reporting_period={year};
+        WHERE ship_type = ? AND reporting_period = ?;
     """
 
     query = joined_table + statement
 
-    total_results_value = execute_athena_query(query=query)
+    total_results_value = execute_query(query=query, parameters=[ship_type, year])
     total_results = int(total_results_value[0]["total_results"])
 
     total_pages = math.ceil(total_results / page)
@@ -226,7 +220,7 @@ def emissions_per_ship_type_and_year(ship_type, year, page, limit):
 
     return {
         "metadata": {
-            "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
             "request_id": random_string(10),
             "total_results": total_results,
             "page": page,
@@ -239,28 +233,24 @@ def emissions_per_ship_type_and_year(ship_type, year, page, limit):
     }
 
 
-def emissions_per_ship_type(ship_type, page, limit):
-    offset = (page - 1) * limit
-
+def emissions_per_ship_type(ship_type, page, limit, fields=None):
     condition_query = f"""
-        WHERE ship_type = '{ship_type}'
-        ORDER BY imo_number, reporting_period DESC
-        OFFSET {offset}
-        LIMIT {limit};
+        WHERE ship_type = ?
+        ORDER BY imo_number, reporting_period DESC{page_clause(page, limit)};
     """
 
-    query = joined_table + base_query + condition_query
-    data_response = execute_athena_query(query=query)
+    query = joined_table + select_emissions(fields) + condition_query
+    data_response = execute_query(query=query, parameters=[ship_type])
 
-    statement = f"""
+    statement = """
         SELECT COUNT(*) AS total_results
         FROM latest_data
-        WHERE ship_type = '{ship_type}';
+        WHERE ship_type = ?;
     """
 
     query = joined_table + statement
 
-    total_results_value = execute_athena_query(query=query)
+    total_results_value = execute_query(query=query, parameters=[ship_type])
     total_results = int(total_results_value[0]["total_results"])
     total_pages = math.ceil(total_results / page)
 
@@ -280,7 +270,7 @@ def emissions_per_ship_type(ship_type, page, limit):
 
     return {
         "metadata": {
-            "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
             "request_id": random_string(10),
             "total_results": total_results,
             "page": page,
@@ -293,27 +283,23 @@ def emissions_per_ship_type(ship_type, page, limit):
     }
 
 
-def emissions_per_year(year, page, limit):
-    offset = (page - 1) * limit
-
+def emissions_per_year(year, page, limit, fields=None):
     condition_query = f"""
-        WHERE reporting_period = {year}
-        ORDER BY imo_number, reporting_period DESC
-        OFFSET {offset}
-        LIMIT {limit};
+        WHERE reporting_period = ?
+        ORDER BY imo_number, reporting_period DESC{page_clause(page, limit)};
     """
-    query = joined_table + base_query + condition_query
-    data_response = execute_athena_query(query=query)
+    query = joined_table + select_emissions(fields) + condition_query
+    data_response = execute_query(query=query, parameters=[year])
 
-    statement = f"""
+    statement = """
         SELECT COUNT(*) AS total_results
         FROM latest_data
-        WHERE reporting_period = {year};
+        WHERE reporting_period = ?;
     """
 
     query = joined_table + statement
 
-    total_results_value = execute_athena_query(query=query)
+    total_results_value = execute_query(query=query, parameters=[year])
     total_results = int(total_results_value[0]["total_results"])
     total_pages = math.ceil(total_results / page)
 
@@ -329,7 +315,7 @@ def emissions_per_year(year, page, limit):
 
     return {
         "metadata": {
-            "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
             "request_id": random_string(10),
             "total_results": total_results,
             "page": page,
@@ -346,9 +332,11 @@ def emissions_per_year(year, page, limit):
 class QueryParams:
     limit: int = 10  # Default limit
     page: int = 1  # Default page
-    ship_id: Optional[str] = None
+    ship_id: Optional[int] = None
     ship_type: Optional[str] = None
     year: Optional[int] = None
+    fields: Optional[List[str]] = None  # Default EMISSIONS_COLUMNS
+    format: str = "json"  # Default rows of strings
 
 
 def parse_query_parameters(event: Dict) -> QueryParams:
@@ -364,7 +352,7 @@ def parse_query_parameters(event: Dict) -> QueryParams:
         params = QueryParams(
             limit=int(query_params.get("limit", 10)),
             page=int(query_params.get("page", 1)),
-            ship_id=query_params.get("ship_id"),
+            ship_id=int(query_params.get("ship_id")) if query_params.get("ship_id") else None,
             ship_type=query_params.get("ship_type"),
             year=int(query_params.get("year")) if query_params.get("year") else None,
         )
@@ -375,11 +363,13 @@ def parse_query_parameters(event: Dict) -> QueryParams:
         if params.page < 1:
             raise ValueError("Page must be greater than 0")
 
-        return params
-
     except ValueError as e:
         raise ValueError(f"Invalid parameter value: {str(e)}")
 
+    params.fields = parse_fields(query_params.get("fields"), EMISSIONS_COLUMNS)
+    params.format = parse_format(query_params.get("format"))
+    return params
+
 
 def determine_query_type(params: QueryParams) -> str:
     """
@@ -387,24 +377,26 @@ def determine_query_type(params: QueryParams) -> str:
     Returns a string identifier for the query type.
     """
     if params.ship_id:
-        return emissions_per_ship_id(ship_id=params.ship_id)
+        with query_priority(INTERACTIVE):
+            return emissions_per_ship_id(ship_id=params.ship_id, fields=params.fields)
     elif params.ship_type and params.year:
         return emissions_per_ship_type_and_year(
             ship_type=params.ship_type,
             year=params.year,
             page=params.page,
             limit=params.limit,
+            fields=params.fields,
         )
     elif params.ship_type:
         return emissions_per_ship_type(
-            ship_type=params.ship_type, page=params.page, limit=params.limit
+            ship_type=params.ship_type, page=params.page, limit=params.limit, fields=params.fields
         )
     elif params.year:
         return emissions_per_year(
-            year=params.year, page=params.page, limit=params.limit
+            year=params.year, page=params.page, limit=params.limit, fields=params.fields
         )
     else:
-        return emissions_data_without_conditions(page=params.page, limit=params.limit)
+        return emissions_data_without_conditions(page=params.page, limit=params.limit, fields=params.fields)
 
 
 # Example usage in Lambda handler
@@ -412,19 +404,89 @@ def lambda_handler(event, context):
     print(event)
     try:
         params = parse_query_parameters(event)
+    except ValueError as e:
+        return {"statusCode": 400, "body": {"error": str(e)}}
+
+    caching = cache_headers(event, "emissions")
+    if is_not_modified(event, caching):
+        return not_modified_response(caching)
+
+    try:
         print(params)
 
         print(type(params.year))
         print(params.year)
         query_response = determine_query_type(params)
+        query_response["results"] = format_rows(query_response["results"], params.format, EMISSIONS_TYPES)
 
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(query_response),
-        }
+        return json_response(event, query_response, headers=caching)
 
+    except QueueFullError as e:
+        return overloaded_response(e)
     except ValueError as e:
         return {"statusCode": 400, "body": {"error": str(e)}}
     except Exception as e:
         return {"statusCode": 500, "body": {"error": "Internal server error"}}
+
+
+def parse_ship_ids(event: Dict) -> List[int]:
+    """
+    Parse the IMO numbers of a batch request, from a comma separated ship_ids query
+    parameter (GET) or from a JSON body {"ship_ids": [...]} (POST).
+    Duplicates are dropped and the order of the request is kept.
+    """
+    query_params = event.get("queryStringParameters", {}) or {}
+    if query_params.get("ship_ids"):
+        ship_ids = query_params["ship_ids"].split(",")
+    else:
+        body = event.get("body") or "{}"
+        if event.get("isBase64Encoded"):
+            body = base64.b64decode(body).decode("utf-8")
+        try:
+            ship_ids = json.loads(body).get("ship_ids", [])
+        except (json.JSONDecodeError, AttributeError):
+            raise ValueError("The body must be a JSON object with a ship_ids list")
+        if not isinstance(ship_ids, list):
+            raise ValueError("ship_ids must be a list of IMO numbers")
+
+    try:
+        ship_ids = list(dict.fromkeys(int(str(ship_id).strip()) for ship_id in ship_ids))
+    except ValueError:
+        raise ValueError("Invalid parameter value: ship_ids must be IMO numbers")
+
+    if not ship_ids:
+        raise ValueError("At least one ship id is required")
+    if len(ship_ids) > MAX_BATCH_SHIPS:
+        raise ValueError(f"At most {MAX_BATCH_SHIPS} ship ids can be requested at once")
+
+    return ship_ids
+
+
+def batch_lambda_handler(event, context):
+    """Handler of /emissions/batch: the emissions of up to MAX_BATCH_SHIPS ships in one request"""
+    try:
+        ship_ids = parse_ship_ids(event)
+        query_params = event.get("queryStringParameters") or {}
+        fields = parse_fields(query_params.get("fields"), EMISSIONS_COLUMNS)
+        layout = parse_format(query_params.get("format"))
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
+
+    caching = cache_headers(event, "emissions")
+    if is_not_modified(event, caching):
+        return not_modified_response(caching)
+
+    try:
+        with query_priority(INTERACTIVE):
+            query_response = emissions_per_ship_ids(ship_ids, fields)
+
+        for ship in query_response["results"]:
+            ship["results"] = format_rows(ship["results"], layout, EMISSIONS_TYPES)
+        return json_response(event, query_response, headers=caching)
+
+    except QueueFullError as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
+    except Exception as e:
+        return {"statusCode": 500, "body": json.dumps({"error": "Internal server error"})}
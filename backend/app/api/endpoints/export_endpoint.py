@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+from typing import Dict, Optional
+
+from app.api.admission import AdmissionBackend, QueueFullError, overloaded_response
+from app.api.exports import EXPORT_FORMATS, AthenaExports, ExportRequest
+from app.api.query_backend import get_query_backend, parse_fields
+from app.api.responses import json_response
+
+DATABASE = os.environ["DATABASE"]
+TABLE = os.environ["TABLE"]
+API_URL = os.environ["API_URL"]
+MAX_EXPORT_SHIPS = int(os.environ.get("MAX_EXPORT_SHIPS", 1000))
+
+_default_exports: Optional[AthenaExports] = None
+
+
+def get_exports() -> AthenaExports:
+    """The exports of the process, written under EXPORT_LOCATION"""
+    global _default_exports
+    if _default_exports is None:
+        _default_exports = AthenaExports(
+            DATABASE,
+            TABLE,
+            output_location=os.environ["OUTPUT_LOCATION"],
+            export_location=os.environ["EXPORT_LOCATION"],
+            url_expires_seconds=int(os.environ.get("EXPORT_URL_EXPIRES_SECONDS", 3600)),
+        )
+    return _default_exports
+
+
+def parse_export_request(event: Dict) -> ExportRequest:
+    """
+    Parse and validate the JSON body of an export request:
+    {"format": "parquet" | "tsv", "fields": [...], "ship_type": ..., "year": ..., "ship_ids": [...]}
+    Every filter is optional, an empty body exports the whole dataset. The TSV files have no
+    header and no quoting (see EXPORT_FORMATS).
+    """
+    body = event.get("body") or "{}"
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    try:
+        body = json.loads(body)
+    except json.JSONDecodeError:
+        raise ValueError("The body must be a JSON object")
+    if not isinstance(body, dict):
+        raise ValueError("The body must be a JSON object")
+    if body.get("ship_ids") and not isinstance(body["ship_ids"], list):
+        raise ValueError("ship_ids must be a list of IMO numbers")
+
+    try:
+        request = ExportRequest(
+            format=str(body.get("format", "parquet")).lower(),
+            ship_type=str(body["ship_type"]) if body.get("ship_type") else None,
+            year=int(body["year"]) if body.get("year") else None,
+            ship_ids=list(dict.fromkeys(int(ship_id) for ship_id in body["ship_ids"])) if body.get("ship_ids") else None,
+        )
+    except (TypeError, ValueError):
+        raise ValueError("Invalid parameter value: year and ship_ids must be numbers")
+
+    if request.format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid parameter value: format must be one of {', '.join(EXPORT_FORMATS)}")
+    if request.ship_ids and len(request.ship_ids) > MAX_EXPORT_SHIPS:
+        raise ValueError(f"At most {MAX_EXPORT_SHIPS} ship ids can be exported at once")
+
+    fields = body.get("fields")
+    if fields is not None:
+        fields = ",".join(map(str, fields)) if isinstance(fields, list) else str(fields)
+        request.fields = parse_fields(fields, get_query_backend().columns(TABLE) + ["latest_version"])
+
+    return request
+
+
+def submit_lambda_handler(event, context):
+    """Handler of POST /exports: starts an export and returns its job id at once"""
+    from botocore.exceptions import ClientError
+
+    try:
+        job_id = get_exports().submit(parse_export_request(event))
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
+    except ClientError as e:
+        if e.response["Error"]["Code"] in AdmissionBackend.THROTTLING_ERRORS:
+            return overloaded_response(QueueFullError(1, "Athena is throttling the queries"))
+        raise
+
+    status_url = f"{API_URL}/exports/{job_id}"
+    return json_response(
+        event,
+        {"job_id": job_id, "status": "QUEUED", "status_url": status_url},
+        status=202,
+        headers={"Location": status_url},
+    )
+
+
+def status_lambda_handler(event, context):
+    """Handler of GET /exports/{job_id}: the progress of an export, and the presigned URLs of
+    its files once it is done"""
+    job = get_exports().status(event["pathParameters"]["job_id"])
+    if job is None:
+        return {"statusCode": 404, "body": json.dumps({"error": "Export not found"})}
+
+    # the progress changes and the URLs expire
+    return json_response(event, job, headers={"Cache-Control": "no-store"})
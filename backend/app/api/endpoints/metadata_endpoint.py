@@ -1,128 +1,83 @@
-import json
-import boto3
-import time
 import os
 
 from datetime import datetime
 
+from app.api.admission import QueueFullError, overloaded_response
+from app.api.caching import cache_headers, is_not_modified, not_modified_response
+from app.api.metadata_summary import get_metadata_summary_reader
+from app.api.query_backend import athena_string, execute_query, latest_data_cte
+from app.api.responses import json_response, random_string
 
-# Initialize the Athena client
-athena_client = boto3.client("athena")
-
-# Athena configuration
 DATABASE = os.environ["DATABASE"]
 TABLE = os.environ["TABLE"]
-OUTPUT_LOCATION = os.environ["OUTPUT_LOCATION"]
-
-import random, string
-
 
-def random_string(length):
-    return "".join(
-        random.choice(string.ascii_lowercase + string.digits) for _ in range(length)
-    )
-
-
-def lambda_handler(event, context):
-    print(event)
 
-    # Query for ship types
+def query_metadata() -> dict:
+    """The metadata summary computed by Athena, when the ETL summary is not deployed"""
     ship_types_query = f"""
-    WITH latest_versions AS (
-        SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-        FROM "{DATABASE}"."{TABLE}"
-        GROUP BY CAST(year AS INTEGER)
-    ),
-    
-    latest_data AS (
-        SELECT *
-        FROM "{DATABASE}"."{TABLE}" se
-        JOIN latest_versions lv
-          ON CAST(se.year AS INT) = lv.year
-          AND CAST(se.version AS INT) = lv.latest_version
-    )
-    
+{latest_data_cte(DATABASE, TABLE)}
     SELECT DISTINCT ship_type
-    FROM clean_emissions
+    FROM latest_data
+    WHERE ship_type IS NOT NULL
     ORDER BY ship_type
     """
 
-    # Query for other metadata
     metadata_query = f"""
-    WITH latest_versions AS (
-        SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-        FROM "{DATABASE}"."{TABLE}"
-        GROUP BY CAST(year AS INTEGER)
-    ),
-    
-    latest_data AS (
-        SELECT *
-        FROM "{DATABASE}"."{TABLE}" se
-        JOIN latest_versions lv
-          ON CAST(se.year AS INT) = lv.year
-          AND CAST(se.version AS INT) = lv.latest_version
-    )
-    
+{latest_data_cte(DATABASE, TABLE)}
     SELECT 
-        COUNT(*) as total_ships,
+        COUNT(DISTINCT imo_number) as total_ships,
         MIN(reporting_period) as earliest_period,
         MAX(reporting_period) as latest_period
     FROM latest_data
     """
 
-    ship_types = execute_athena_query(ship_types_query)
-    metadata = execute_athena_query(metadata_query)[0]
+    ships_per_year_query = f"""
+{latest_data_cte(DATABASE, TABLE)}
+    SELECT reporting_period, COUNT(DISTINCT imo_number) as ships
+    FROM latest_data
+    GROUP BY reporting_period
+    ORDER BY reporting_period
+    """
 
-    current_datetime = datetime.now()
+    ship_types = execute_query(ship_types_query)
+    metadata = execute_query(metadata_query)[0]
+    ships_per_year = execute_query(ships_per_year_query)
+    return {
+        "ship_types": [row["ship_type"] for row in ship_types],
+        "total_ships": metadata["total_ships"],
+        "ships_per_year": {row["reporting_period"]: row["ships"] for row in ships_per_year},
+        "earliest_period": metadata["earliest_period"],
+        "latest_period": metadata["latest_period"],
+    }
+
+
+def lambda_handler(event, context):
+    print(event)
+    caching = cache_headers(event, "metadata")
+    if is_not_modified(event, caching):
+        return not_modified_response(caching)
+
+    # the summary published by the ETL, kept in memory, answers without any query
+    reader = get_metadata_summary_reader()
+    summary = reader.get() if reader is not None else None
+    if summary is None:
+        try:
+            summary = query_metadata()
+        except QueueFullError as e:
+            return overloaded_response(e)
 
     response_body = {
         "results": [
             {
-                "ship_types": [row["ship_type"] for row in ship_types],
-                "total_ships": metadata["total_ships"],
-                "earliest_period": metadata["earliest_period"],
-                "latest_period": metadata["latest_period"],
+                "ship_types": summary["ship_types"],
+                "total_ships": athena_string(summary["total_ships"]),
+                "ships_per_year": {year: athena_string(ships) for year, ships in summary["ships_per_year"].items()},
+                "earliest_period": athena_string(summary["earliest_period"]),
+                "latest_period": athena_string(summary["latest_period"]),
             }
         ],
-        "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
+        "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
         "request_id": random_string(10),
     }
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps(response_body),
-        "headers": {"Content-Type": "application/json"},
-    }
-
-
-def execute_athena_query(query):
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={"Database": DATABASE},
-        ResultConfiguration={"OutputLocation": OUTPUT_LOCATION},
-    )
-
-    query_execution_id = response["QueryExecutionId"]
-
-    # Wait for the query to complete (simplified for brevity)
-    while True:
-        query_status = athena_client.get_query_execution(
-            QueryExecutionId=query_execution_id
-        )
-        status = query_status["QueryExecution"]["Status"]["State"]
-        if status in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            break
-
-    if status == "SUCCEEDED":
-        results = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-        columns = [
-            col["Label"]
-            for col in results["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
-        ]
-        rows = results["ResultSet"]["Rows"][1:]  # Skip the header row
-        return [
-            dict(zip(columns, [field.get("VarCharValue", "") for field in row["Data"]]))
-            for row in rows
-        ]
-    else:
-        raise Exception(f"Query failed with status: {status}")
+    return json_response(event, response_body, headers=caching)
@@ -0,0 +1,111 @@
+import json
+import os
+from datetime import datetime
+from dataclasses import dataclass
+
+from app.api.admission import INTERACTIVE, QueueFullError, overloaded_response, query_priority
+from app.api.caching import cache_headers, is_not_modified, not_modified_response
+from app.api.leaderboards import get_leaderboard_reader
+from app.api.query_backend import execute_query, latest_data_cte
+from app.api.responses import format_rows, json_response, parse_format, random_string
+
+DATABASE = os.environ["DATABASE"]
+TABLE = os.environ["TABLE"]
+
+# the metrics that can be ranked, and their column: the LEADERBOARD_METRICS of the ETL, which
+# does not ship the API (tests/test_rankings.py checks the copies are the same)
+RANKING_METRICS = {
+    "total_co2": "total_co2_emissions",
+    "co2_per_distance": "annual_average_co2_emissions_per_distance",
+    "fuel": "total_fuel_consumption",
+}
+
+# the types of the columns in the typed and columnar formats
+RANKING_TYPES = {"rank": int, "imo_number": int, "name": str, "value": float}
+
+
+@dataclass
+class RankingParams:
+    metric: str
+    year: int
+    ship_type: str
+    limit: int = 50
+    format: str = "json"
+
+
+def parse_ranking_params(event) -> RankingParams:
+    """
+    Parse and validate the query parameters of a ranking request:
+    metric (total_co2 by default), year and ship_type (required), limit (50 by default, at most 100)
+    """
+    query_params = event.get("queryStringParameters") or {}
+    if not query_params.get("year") or not query_params.get("ship_type"):
+        raise ValueError("Invalid parameter value: year and ship_type are required")
+
+    try:
+        params = RankingParams(
+            metric=query_params.get("metric", "total_co2"),
+            year=int(query_params["year"]),
+            ship_type=query_params["ship_type"],
+            limit=int(query_params.get("limit", 50)),
+        )
+        if params.metric not in RANKING_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(RANKING_METRICS)}")
+        if params.limit < 1 or params.limit > 100:
+            raise ValueError("Limit must be between 1 and 100")
+    except ValueError as e:
+        raise ValueError(f"Invalid parameter value: {str(e)}")
+
+    params.format = parse_format(query_params.get("format"))
+    return params
+
+
+def query_ranking(params: RankingParams):
+    """The top ships queried, when the leaderboards of the ETL are not deployed"""
+    column = RANKING_METRICS[params.metric]
+    query = f"""
+{latest_data_cte(DATABASE, TABLE)}
+        SELECT imo_number, name, {column} AS value
+        FROM latest_data
+        WHERE reporting_period = ? AND ship_type = ? AND {column} IS NOT NULL
+        ORDER BY {column} DESC, imo_number
+        LIMIT {params.limit};
+    """
+
+    rows = execute_query(query=query, parameters=[params.year, params.ship_type])
+    return [{"rank": str(rank), **row} for rank, row in enumerate(rows, start=1)]
+
+
+def lambda_handler(event, context):
+    print(event)
+    try:
+        params = parse_ranking_params(event)
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
+
+    caching = cache_headers(event, "rankings")
+    if is_not_modified(event, caching):
+        return not_modified_response(caching)
+
+    # the leaderboards precomputed by the ETL answer without any query
+    reader = get_leaderboard_reader()
+    results = reader.top(params.metric, params.year, params.ship_type, params.limit) if reader is not None else None
+    if results is None:
+        try:
+            with query_priority(INTERACTIVE):
+                results = query_ranking(params)
+        except QueueFullError as e:
+            return overloaded_response(e)
+
+    response = {
+        "metadata": {
+            "metric": params.metric,
+            "year": params.year,
+            "ship_type": params.ship_type,
+            "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
+            "request_id": random_string(10),
+        },
+        "results": format_rows(results, params.format, RANKING_TYPES),
+    }
+
+    return json_response(event, response, headers=caching)
@@ -1,84 +1,76 @@
 import json
-import boto3
 import time
 import os
-import random, string
 from datetime import datetime
 
-# Initialize the Athena client
-athena_client = boto3.client("athena")
+from app.api.admission import INTERACTIVE, QueueFullError, overloaded_response, query_priority
+from app.api.caching import cache_headers, is_not_modified, not_modified_response
+from app.api.query_backend import execute_query, get_query_backend, latest_data_cte, parse_fields
+from app.api.responses import format_rows, json_response, parse_format, random_string
+from app.api.ship_snapshot import get_ship_snapshot_reader
+
 
-# Athena configuration
 DATABASE = os.environ["DATABASE"]
 TABLE = os.environ["TABLE"]
-OUTPUT_LOCATION = os.environ["OUTPUT_LOCATION"]
-
-
-def random_string(length):
-    return "".join(
-        random.choice(string.ascii_lowercase + string.digits) for _ in range(length)
-    )
-
-
-def execute_athena_query(query):
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={"Database": DATABASE},
-        ResultConfiguration={"OutputLocation": OUTPUT_LOCATION},
-    )
-
-    query_execution_id = response["QueryExecutionId"]
-
-    # Wait for the query to complete (simplified for brevity)
-    while True:
-        query_status = athena_client.get_query_execution(
-            QueryExecutionId=query_execution_id
-        )
-        status = query_status["QueryExecution"]["Status"]["State"]
-        if status in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            break
-
-    if status == "SUCCEEDED":
-        results = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-        columns = [
-            col["Label"]
-            for col in results["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
-        ]
-        rows = results["ResultSet"]["Rows"][1:]  # Skip the header row
-        return [
-            dict(zip(columns, [field.get("VarCharValue", "") for field in row["Data"]]))
-            for row in rows
-        ]
-    else:
-        raise Exception(f"Query failed with status: {status}")
 
 
-def lambda_handler(event, context):
-    print(event)
-    ship_id = event["pathParameters"]["ship_id"]
+def lookup_snapshot(ship_id, fields=None):
+    """Returns the rows of the ship from the snapshot published by the ETL, or None if they
+    have to be queried"""
+    reader = get_ship_snapshot_reader()
+    return reader.lookup(ship_id, fields) if reader is not None else None
+
+
+def ship_data_columns():
+    """The columns that can be requested: the ones of the snapshot, or else the ones of the
+    table with the latest_version of the query"""
+    reader = get_ship_snapshot_reader()
+    columns = reader.columns() if reader is not None else None
+    if columns is None:
+        columns = get_query_backend().columns(TABLE) + ["latest_version"]
+    return columns
+
 
+def query_ship_data(ship_id, fields=None):
+    # only the requested columns are read from the Parquet files
+    columns = ", ".join(f'"{field}"' for field in fields) if fields else "*"
     query = f"""
-        WITH latest_versions AS (
-            SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-            FROM "{DATABASE}"."{TABLE}"
-            GROUP BY CAST(year AS INTEGER)
-        ),
-
-        latest_data AS (
-            SELECT *
-            FROM "{DATABASE}"."{TABLE}" se
-            JOIN latest_versions lv
-              ON CAST(se.year AS INT) = lv.year
-              AND CAST(se.version AS INT) = lv.latest_version
-        )
-
-        SELECT *
+{latest_data_cte(DATABASE, TABLE)}
+        SELECT {columns}
         FROM latest_data
-        WHERE imo_number={ship_id}
+        WHERE imo_number = ?
         ORDER BY reporting_period DESC;
     """
 
-    result_data = execute_athena_query(query=query)
+    return execute_query(query=query, parameters=[ship_id])
+
+
+def lambda_handler(event, context):
+    print(event)
+    try:
+        ship_id = int(event["pathParameters"]["ship_id"])
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "ship_id must be an IMO number"})}
+
+    caching = cache_headers(event, "ship_data")
+    if is_not_modified(event, caching):
+        return not_modified_response(caching)
+
+    try:
+        query_params = event.get("queryStringParameters") or {}
+        layout = parse_format(query_params.get("format"))
+        with query_priority(INTERACTIVE):
+            fields = query_params.get("fields")
+            if fields is not None:
+                fields = parse_fields(fields, ship_data_columns())
+
+            result_data = lookup_snapshot(ship_id, fields)
+            if result_data is None:
+                result_data = query_ship_data(ship_id, fields)
+    except QueueFullError as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
     current_datetime = datetime.now()
 
     response = {
@@ -86,11 +78,8 @@ def lambda_handler(event, context):
             "timestamp": current_datetime.strftime("%d-%m-%Y %H:%M:%S"),
             "request_id": random_string(10),
         },
-        "results": result_data,
+        # any column can be requested, their types are inferred
+        "results": format_rows(result_data, layout),
     }
 
-    return {
-        "statusCode": 200,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(response),
-    }
+    return json_response(event, response, headers=caching)
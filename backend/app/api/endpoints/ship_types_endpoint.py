@@ -1,124 +1,87 @@
 import json
-import boto3
 import time
 import os
 import math
 from datetime import datetime
 
-# Initialize the Athena client
-athena_client = boto3.client("athena")
+from app.api.admission import QueueFullError, overloaded_response
+from app.api.caching import cache_headers, is_not_modified, not_modified_response
+from app.api.query_backend import execute_query, latest_data_cte, page_clause
+from app.api.responses import format_rows, json_response, parse_format, random_string
+
 
-# Athena configuration
 DATABASE = os.environ["DATABASE"]
 TABLE = os.environ["TABLE"]
-OUTPUT_LOCATION = os.environ["OUTPUT_LOCATION"]
-
-import random, string
-
-
-def random_string(length):
-    return "".join(
-        random.choice(string.ascii_lowercase + string.digits) for _ in range(length)
-    )
-
-
-def execute_athena_query(query):
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={"Database": DATABASE},
-        ResultConfiguration={"OutputLocation": OUTPUT_LOCATION},
-    )
-
-    query_execution_id = response["QueryExecutionId"]
-
-    # Wait for the query to complete (simplified for brevity)
-    while True:
-        query_status = athena_client.get_query_execution(
-            QueryExecutionId=query_execution_id
-        )
-        status = query_status["QueryExecution"]["Status"]["State"]
-        if status in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            break
-
-    if status == "SUCCEEDED":
-        results = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-        columns = [
-            col["Label"]
-            for col in results["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
-        ]
-        rows = results["ResultSet"]["Rows"][1:]  # Skip the header row
-        return [
-            dict(zip(columns, [field.get("VarCharValue", "") for field in row["Data"]]))
-            for row in rows
-        ]
-    else:
-        raise Exception(f"Query failed with status: {status}")
 
 
 def get_total_results(ship_type):
     query = f"""
-        WITH latest_versions AS (
-            SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-            FROM "{DATABASE}"."{TABLE}"
-            GROUP BY CAST(year AS INTEGER)
-        ),
-
-        latest_data AS (
-            SELECT *
-            FROM "{DATABASE}"."{TABLE}" se
-            JOIN latest_versions lv
-              ON CAST(se.year AS INT) = lv.year
-              AND CAST(se.version AS INT) = lv.latest_version
-        )
-
+{latest_data_cte(DATABASE, TABLE)}
         SELECT COUNT(*) AS total_results
         FROM latest_data
-        WHERE ship_type='{ship_type}';
+        WHERE ship_type = ?;
     """
 
-    total_results_value = execute_athena_query(query=query)
+    total_results_value = execute_query(query=query, parameters=[ship_type])
     return total_results_value
 
 
-def get_ship_info(ship_type, page, limit):
-    offset = (page - 1) * limit
+# the types of the columns in the typed and columnar formats
+SHIP_INFO_TYPES = {
+    "imo_number": int,
+    "name": str,
+    "ship_type": str,
+    "reporting_period": int,
+    "port_of_registry": str,
+    "home_port": str,
+    "ice_class": str,
+    "doc_issue_date": str,
+    "doc_expiry_date": str,
+    "verifier_number": str,
+    "technical_efficiency_value": str,
+}
+
 
+def get_ship_info(ship_type, page, limit):
     query = f"""
-        WITH latest_versions AS (
-            SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-            FROM "{DATABASE}"."{TABLE}"
-            GROUP BY CAST(year AS INTEGER)
-        ),
-
-        latest_data AS (
-            SELECT *
-            FROM "{DATABASE}"."{TABLE}" se
-            JOIN latest_versions lv
-              ON CAST(se.year AS INT) = lv.year
-              AND CAST(se.version AS INT) = lv.latest_version
-        )
-
-
-        SELECT imo_number, name, ship_type, reporting_period, port_of_registry, home_port, ice_class, doc_issue_date, doc_expiry_date, verifier_number, technical_efficiency_value
+{latest_data_cte(DATABASE, TABLE)}
+
+        SELECT {", ".join(SHIP_INFO_TYPES)}
         FROM latest_data
-        WHERE ship_type='{ship_type}'
-        ORDER BY imo_number
-        OFFSET {offset}
-        LIMIT {limit};
+        WHERE ship_type = ?
+        ORDER BY imo_number{page_clause(page, limit)};
     """
 
-    ship_info = execute_athena_query(query=query)
+    ship_info = execute_query(query=query, parameters=[ship_type])
     return ship_info
 
 
 def lambda_handler(event, context):
     print(event)
-    ship_type = event["queryStringParameters"]["ship_type"]
-    page = int(event["queryStringParameters"]["page"])
-    limit = event["queryStringParameters"]["limit"]
-
-    total_results = int(get_total_results(ship_type=ship_type)[0]["total_results"])
-    ship_info = get_ship_info(ship_type=ship_type, page=page, limit=limit)
+    query_params = event.get("queryStringParameters") or {}
+    try:
+        if not query_params.get("ship_type"):
+            raise ValueError("ship_type is required")
+        ship_type = query_params["ship_type"]
+        page = int(query_params.get("page", ""))
+        limit = int(query_params.get("limit", ""))
+        if limit < 1 or limit > 100:
+            raise ValueError("Limit must be between 1 and 100")
+        if page < 1:
+            raise ValueError("Page must be greater than 0")
+        layout = parse_format(query_params.get("format"))
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": f"Invalid parameter value: {str(e)}"})}
+
+    caching = cache_headers(event, "ship_types")
+    if is_not_modified(event, caching):
+        return not_modified_response(caching)
+
+    try:
+        total_results = int(get_total_results(ship_type=ship_type)[0]["total_results"])
+        ship_info = get_ship_info(ship_type=ship_type, page=page, limit=limit)
+    except QueueFullError as e:
+        return overloaded_response(e)
     total_pages = math.ceil(total_results / page)
 
     if page < total_pages:
@@ -144,11 +107,7 @@ def lambda_handler(event, context):
             "next_page_url": next_page_url,
             "prev_page_url": prev_page_url,
         },
-        "results": ship_info,
+        "results": format_rows(ship_info, layout, SHIP_INFO_TYPES),
     }
 
-    return {
-        "statusCode": 200,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(response),
-    }
+    return json_response(event, response, headers=caching)
@@ -0,0 +1,159 @@
+import re
+import time
+import uuid
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.api.query_backend import latest_data_cte, sql_literal
+
+# The options of the UNLOAD of every export format. Text files are written without a header
+# and gzip compressed by Athena. Athena does not quote the fields of text files either, so
+# they are tab separated: a comma is common in the names and the ports, a tab is not.
+EXPORT_FORMATS = {
+    "parquet": "format = 'PARQUET', compression = 'SNAPPY'",
+    "tsv": "format = 'TEXTFILE', field_delimiter = '\\t'",
+}
+
+QUERY_EXECUTION_ID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+@dataclass
+class ExportRequest:
+    format: str = "parquet"
+    fields: Optional[List[str]] = None  # Default every column
+    ship_type: Optional[str] = None
+    year: Optional[int] = None
+    ship_ids: Optional[List[int]] = None
+
+
+def export_select(database: str, table: str, request: ExportRequest) -> Tuple[str, List]:
+    """The query of the latest version rows matching the filters of an export, with its
+    parameters"""
+    conditions, parameters = [], []
+    if request.ship_type is not None:
+        conditions.append("ship_type = ?")
+        parameters.append(request.ship_type)
+    if request.year is not None:
+        conditions.append("reporting_period = ?")
+        parameters.append(request.year)
+    if request.ship_ids:
+        conditions.append(f"imo_number IN ({', '.join(['?'] * len(request.ship_ids))})")
+        parameters.extend(request.ship_ids)
+
+    columns = ", ".join(f'"{field}"' for field in request.fields) if request.fields else "*"
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""{latest_data_cte(database, table)}
+    SELECT {columns}
+    FROM latest_data
+    {where}
+"""
+    return query, parameters
+
+
+class AthenaExports:
+    """Runs the exports of the API as asynchronous Athena UNLOAD queries: a single scan of the
+    table writes the matching rows to Parquet or tab separated files under a new prefix of
+    `export_location`. The job id is the id of the query execution, so the jobs need no
+    state of their own: their progress is the one of the query, and the files written are
+    listed by the manifest Athena writes next to the query results."""
+
+    def __init__(
+        self,
+        database: str,
+        table: str,
+        output_location: str,
+        export_location: str,
+        url_expires_seconds: int = 3600,
+        athena_client=None,
+        s3_client=None,
+    ):
+        self.database = database
+        self.table = table
+        self.output_location = output_location.rstrip("/")
+        self.export_location = export_location.rstrip("/")
+        self.url_expires_seconds = url_expires_seconds
+        self._athena_client = athena_client
+        self._s3_client = s3_client
+
+    @property
+    def athena_client(self):
+        if self._athena_client is None:
+            import boto3
+
+            self._athena_client = boto3.client("athena")
+        return self._athena_client
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            import boto3
+
+            self._s3_client = boto3.client("s3")
+        return self._s3_client
+
+    def submit(self, request: ExportRequest) -> str:
+        """Starts the UNLOAD of an export and returns the job id, without waiting for it"""
+        select, parameters = export_select(self.database, self.table, request)
+        # UNLOAD fails if the location has files, every export gets its own
+        location = f"{self.export_location}/{uuid.uuid4().hex}/"
+        query = f"UNLOAD ({select}) TO '{location}' WITH ({EXPORT_FORMATS[request.format]})"
+
+        kwargs = {
+            "QueryString": query,
+            "QueryExecutionContext": {"Database": self.database},
+            "ResultConfiguration": {"OutputLocation": self.output_location + "/"},
+        }
+        if parameters:
+            kwargs["ExecutionParameters"] = [sql_literal(value) for value in parameters]
+        return self.athena_client.start_query_execution(**kwargs)["QueryExecutionId"]
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """The progress of an export, with the presigned URLs of its files once it succeeded,
+        or None if there is no such export"""
+        if not QUERY_EXECUTION_ID.match(job_id):
+            return None
+
+        from botocore.exceptions import ClientError
+
+        try:
+            execution = self.athena_client.get_query_execution(QueryExecutionId=job_id)["QueryExecution"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "InvalidRequestException":
+                return None
+            raise
+        # only the UNLOADs of the exports are jobs, not the other queries of the workgroup
+        if not execution["Query"].startswith("UNLOAD (") or f"TO '{self.export_location}/" not in execution["Query"]:
+            return None
+
+        status = execution["Status"]
+        statistics = execution.get("Statistics", {})
+        job = {
+            "job_id": job_id,
+            "status": status["State"],
+            "bytes_scanned": statistics.get("DataScannedInBytes", 0),
+            "elapsed_seconds": statistics.get("TotalExecutionTimeInMillis", 0) / 1000,
+        }
+        if status["State"] == "FAILED":
+            job["error"] = status.get("StateChangeReason", "The export failed")
+        if status["State"] == "SUCCEEDED":
+            job["files"] = [self.presigned_url(uri) for uri in self.exported_files(job_id)]
+            job["expires_at"] = int(time.time()) + self.url_expires_seconds
+        return job
+
+    def exported_files(self, job_id: str) -> List[str]:
+        """The S3 URIs of the files written by an UNLOAD, read from its manifest"""
+        bucket, key = split_s3_uri(f"{self.output_location}/{job_id}-manifest.csv")
+        manifest = self.s3_client.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+        return [line.strip() for line in manifest.splitlines() if line.strip()]
+
+    def presigned_url(self, uri: str) -> str:
+        bucket, key = split_s3_uri(uri)
+        return self.s3_client.generate_presigned_url(
+            "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=self.url_expires_seconds
+        )
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    bucket, _, key = uri.removeprefix("s3://").partition("/")
+    return bucket, key
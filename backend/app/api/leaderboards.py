@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+from typing import Callable, Dict, List, Optional
+
+from app.api.query_backend import athena_string
+from app.api.serving_sync import serving_directory, sync_serving_artifact
+
+# the manifest written by the ETL (tests/test_rankings.py checks the names are the same)
+LEADERBOARDS_MANIFEST = "leaderboards.json"
+
+
+class Leaderboards:
+    """The leaderboards published by the ETL (src/serving_artifacts.py), memory-mapped. The
+    ships of a leaderboard are consecutive rows of the Arrow table, ranked by the ETL, so the
+    top ships are a dictionary lookup in the index and a zero-copy slice of the table."""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.dataset_version = manifest["dataset_version"]
+        self.published_at = manifest["published_at"]
+        self.size = manifest["size"]
+        self.metrics = manifest["metrics"]
+
+        import pyarrow as pa
+
+        self._source = pa.memory_map(os.path.join(directory, manifest["leaderboards"]), "r")
+        self.table = pa.ipc.open_file(self._source).read_all()
+        self.index = {
+            (entry["metric"], entry["reporting_period"], entry["ship_type"]): (entry["start"], entry["count"])
+            for entry in manifest["index"]
+        }
+
+    def top(self, metric: str, reporting_period: int, ship_type: str, limit: int) -> List[Dict[str, str]]:
+        """The `limit` first ships of a leaderboard, formatted like the Athena results. A
+        leaderboard missing from the index has no ships."""
+        start, count = self.index.get((metric, reporting_period, ship_type), (0, 0))
+        rows = self.table.slice(start, min(count, limit)).to_pylist()
+        return [{column: athena_string(value) for column, value in row.items()} for row in rows]
+
+
+class LeaderboardReader:
+    """Serves the rankings from the leaderboards of a directory, kept open between the
+    invocations of a warm container. The manifest is checked on every request (a stat call)
+    and the leaderboards are mapped again when the ETL publishes new ones. Leaderboards older
+    than `max_age_seconds` are not used."""
+
+    def __init__(self, directory: str, max_age_seconds: float = 7 * 24 * 3600, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self._leaderboards: Optional[Leaderboards] = None
+        self._manifest_mtime: Optional[int] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, LEADERBOARDS_MANIFEST)
+
+    def get(self) -> Optional[Leaderboards]:
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self._manifest_mtime:
+            try:
+                with open(self.manifest_path, "r") as f:
+                    manifest = json.load(f)
+                leaderboards = Leaderboards(self.directory, manifest)
+            except OSError:
+                # the file was removed by the publications that followed the manifest read,
+                # the rankings are queried until the next request maps the current manifest
+                return None
+            self._leaderboards, self._manifest_mtime = leaderboards, mtime
+
+        if self.clock() - self._leaderboards.published_at > self.max_age_seconds:
+            return None
+        return self._leaderboards
+
+    def top(self, metric: str, reporting_period: int, ship_type: str, limit: int) -> Optional[List[Dict[str, str]]]:
+        """The top ships of a leaderboard, or None if they have to be queried: the leaderboards
+        are stale or missing, do not rank the metric, or are shorter than `limit`"""
+        leaderboards = self.get()
+        if leaderboards is None or metric not in leaderboards.metrics or limit > leaderboards.size:
+            return None
+        return leaderboards.top(metric, reporting_period, ship_type, limit)
+
+
+_default_reader: Optional[LeaderboardReader] = None
+
+
+def get_leaderboard_reader() -> Optional[LeaderboardReader]:
+    """Returns the reader of the leaderboards published with the ship snapshot to the serving
+    directory, or None if the serving artifacts are not deployed with the endpoints"""
+    global _default_reader
+    directory = serving_directory()
+    if _default_reader is None and directory:
+        _default_reader = LeaderboardReader(
+            directory,
+            max_age_seconds=float(os.environ.get("SHIP_SNAPSHOT_MAX_AGE_SECONDS", 7 * 24 * 3600)),
+        )
+    sync_serving_artifact(LEADERBOARDS_MANIFEST, "leaderboards")
+    return _default_reader
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+
+from typing import Callable, Optional
+
+from app.api.serving_sync import serving_directory, sync_serving_artifact
+
+METADATA_SUMMARY = "metadata_summary.json"
+
+
+class MetadataSummaryReader:
+    """Serves the metadata summary published by the ETL (src/serving_artifacts.py) from
+    memory. The file is checked on every request (a stat call) and read again when the ETL
+    publishes a new one. A summary older than `max_age_seconds` is not used."""
+
+    def __init__(self, directory: str, max_age_seconds: float = 7 * 24 * 3600, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self._summary: Optional[dict] = None
+        self._mtime: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, METADATA_SUMMARY)
+
+    def get(self) -> Optional[dict]:
+        """The latest published summary, or None if it is stale or missing"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self._mtime:
+            with open(self.path, "r") as f:
+                self._summary, self._mtime = json.load(f), mtime
+
+        if self.clock() - self._summary["published_at"] > self.max_age_seconds:
+            return None
+        return self._summary
+
+
+_default_reader: Optional[MetadataSummaryReader] = None
+
+
+def get_metadata_summary_reader() -> Optional[MetadataSummaryReader]:
+    """Returns the reader of the summary published with the ship snapshot to the serving
+    directory, or None if the serving artifacts are not deployed with the endpoints"""
+    global _default_reader
+    directory = serving_directory()
+    if _default_reader is None and directory:
+        _default_reader = MetadataSummaryReader(
+            directory,
+            max_age_seconds=float(os.environ.get("SHIP_SNAPSHOT_MAX_AGE_SECONDS", 7 * 24 * 3600)),
+        )
+    sync_serving_artifact(METADATA_SUMMARY)
+    return _default_reader
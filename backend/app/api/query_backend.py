@@ -0,0 +1,337 @@
+import datetime
+import os
+import re
+import threading
+import time
+
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+def latest_data_cte(database: str, table: str) -> str:
+    """The common table expressions of the rows of the latest version of every year. The
+    clean table is partitioned by year and version, and a year is published again with a
+    new version when the reports are updated."""
+    return f"""
+    WITH latest_versions AS (
+        SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
+        FROM "{database}"."{table}"
+        GROUP BY CAST(year AS INTEGER)
+    ),
+
+    latest_data AS (
+        SELECT se.*, lv.latest_version
+        FROM "{database}"."{table}" se
+        JOIN latest_versions lv
+          ON CAST(se.year AS INT) = lv.year
+          AND CAST(se.version AS INT) = lv.latest_version
+    )
+"""
+
+
+class QueryBackend:
+    """Runs the SQL of the API endpoints. The values of the requests are passed as
+    parameters, bound to the `?` placeholders of the query in order, never formatted into
+    the SQL. The rows are returned the way Athena returns them: dictionaries of strings
+    keyed by column name, with empty strings for nulls."""
+
+    def execute(self, query: str, parameters: Optional[Sequence] = None) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+    def columns(self, table: str) -> List[str]:
+        """The names of the columns of a table of the database, partition columns included"""
+        raise NotImplementedError
+
+
+FIELD_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def parse_fields(value: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """Parses the `fields` parameter of a request: the comma separated columns to return, in
+    the order requested. Returns None when it is not given, for the default columns. The
+    names go into the SQL, so only the columns in `allowed` are accepted."""
+    if value is None:
+        return None
+
+    fields = list(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+    if not fields:
+        raise ValueError("Invalid parameter value: fields must name at least one column")
+    unknown = [field for field in fields if not FIELD_NAME.match(field) or field not in allowed]
+    if unknown:
+        raise ValueError(f"Invalid parameter value: unknown fields {', '.join(unknown)}")
+    return fields
+
+
+def page_clause(page: int, limit: int) -> str:
+    """The OFFSET and LIMIT of a page of results. They are formatted into the SQL, not bound
+    as parameters, so only integers are accepted."""
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (page, limit)):
+        raise TypeError("page and limit must be integers")
+    return f"""
+        OFFSET {(page - 1) * limit}
+        LIMIT {limit}"""
+
+
+def sql_literal(value) -> str:
+    """Formats a parameter as the SQL literal expected by the Athena ExecutionParameters"""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    raise TypeError(f"Unsupported query parameter: {value!r}")
+
+
+class AthenaBackend(QueryBackend):
+    """Runs the queries on Athena. The client is created on the first query, so importing
+    the endpoints does not need AWS credentials.
+
+    The query text of an endpoint is the same for every request, with the values passed as
+    ExecutionParameters, so Athena can reuse the results of an identical query run in the
+    last `reuse_max_age_minutes` instead of scanning the data again. The query is tagged
+    with the dataset version, so results computed on a previous version are never reused.
+    Without a dataset version (no snapshot and no DATASET_VERSION) the results are not
+    reused, a new load could not be told apart.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        output_location: str,
+        client=None,
+        poll_interval: float = 0.2,
+        reuse_max_age_minutes: int = 0,
+        dataset_version: Optional[Callable[[], Optional[str]]] = None,
+    ):
+        self.database = database
+        self.output_location = output_location
+        self.poll_interval = poll_interval
+        self.reuse_max_age_minutes = reuse_max_age_minutes
+        self.dataset_version = dataset_version
+        self._client = client
+        self._lock = threading.Lock()
+        self._columns: Dict[str, List[str]] = {}
+        self.metrics = {"executions": 0, "reused_results": 0, "bytes_scanned": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("athena")
+        return self._client
+
+    def _start_query_execution(self, query: str, parameters: Optional[Sequence]) -> str:
+        version = self.dataset_version() if self.dataset_version else None
+        if version:
+            query = f"/* dataset_version: {version} */\n{query}"
+
+        kwargs = {
+            "QueryString": query,
+            "QueryExecutionContext": {"Database": self.database},
+            "ResultConfiguration": {"OutputLocation": self.output_location},
+        }
+        if parameters:
+            kwargs["ExecutionParameters"] = [sql_literal(value) for value in parameters]
+        if version and self.reuse_max_age_minutes > 0:
+            kwargs["ResultReuseConfiguration"] = {
+                "ResultReuseByAgeConfiguration": {"Enabled": True, "MaxAgeInMinutes": self.reuse_max_age_minutes}
+            }
+
+        return self.client.start_query_execution(**kwargs)["QueryExecutionId"]
+
+    def _record_statistics(self, query_execution: dict):
+        statistics = query_execution.get("Statistics", {})
+        with self._lock:
+            self.metrics["executions"] += 1
+            self.metrics["bytes_scanned"] += statistics.get("DataScannedInBytes", 0)
+            if statistics.get("ResultReuseInformation", {}).get("ReusedPreviousResult"):
+                self.metrics["reused_results"] += 1
+
+    def columns(self, table: str) -> List[str]:
+        """The columns of the table in the Glue catalog, read once per container"""
+        if table not in self._columns:
+            metadata = self.client.get_table_metadata(
+                CatalogName="AwsDataCatalog", DatabaseName=self.database, TableName=table
+            )["TableMetadata"]
+            self._columns[table] = [
+                column["Name"] for column in metadata["Columns"] + metadata.get("PartitionKeys", [])
+            ]
+        return self._columns[table]
+
+    def execute(self, query: str, parameters: Optional[Sequence] = None) -> List[Dict[str, str]]:
+        query_execution_id = self._start_query_execution(query, parameters)
+
+        while True:
+            query_status = self.client.get_query_execution(QueryExecutionId=query_execution_id)
+            status = query_status["QueryExecution"]["Status"]["State"]
+            if status in ["SUCCEEDED", "FAILED", "CANCELLED"]:
+                break
+            time.sleep(self.poll_interval)
+
+        self._record_statistics(query_status["QueryExecution"])
+        if status != "SUCCEEDED":
+            raise Exception(f"Query failed with status: {status}")
+
+        rows, columns, next_token = [], None, None
+        while True:
+            kwargs = {"QueryExecutionId": query_execution_id}
+            if next_token:
+                kwargs["NextToken"] = next_token
+            results = self.client.get_query_results(**kwargs)
+
+            page = results["ResultSet"]["Rows"]
+            if columns is None:
+                columns = [col["Label"] for col in results["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]]
+                page = page[1:]  # Skip the header row
+            rows.extend(dict(zip(columns, [field.get("VarCharValue", "") for field in row["Data"]])) for row in page)
+
+            next_token = results.get("NextToken")
+            if not next_token:
+                return rows
+
+
+def athena_string(value) -> str:
+    """Formats a value the way Athena returns it in the query results"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return str(value)
+
+
+class DuckDBBackend(QueryBackend):
+    """Runs the queries on an embedded DuckDB over the Parquet files of the clean table.
+
+    The files are read where the ETL wrote them, partitioned by year and version
+    (`<data_path>/year=2018/version=5/*.parquet`), from a local directory or from S3. A view
+    named like the Athena table is created in a schema named like the Glue database, so the
+    queries of the endpoints run unchanged.
+    """
+
+    def __init__(self, database: str, table: str, data_path: str, connection=None):
+        self.database = database
+        self.table = table
+        self.data_path = data_path.rstrip("/")
+        self._connection = connection
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        with self._lock:
+            if self._connection is None:
+                import duckdb
+
+                connection = duckdb.connect()
+                if "://" in self.data_path:
+                    connection.execute("INSTALL httpfs; LOAD httpfs;")
+                    connection.execute("CREATE SECRET (TYPE s3, PROVIDER credential_chain);")
+                connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.database}"')
+                connection.execute(
+                    f'CREATE OR REPLACE VIEW "{self.database}"."{self.table}" AS '
+                    f"SELECT * FROM read_parquet('{self.data_path}/**/*.parquet', "
+                    "hive_partitioning = true, union_by_name = true)"
+                )
+                self._connection = connection
+        return self._connection
+
+    def execute(self, query: str, parameters: Optional[Sequence] = None) -> List[Dict[str, str]]:
+        # a cursor per query, so the backend can be shared by threads
+        cursor = self.connection.cursor()
+        try:
+            # unqualified table names resolve in the database, as in Athena
+            cursor.execute(f'USE "{self.database}"')
+            result = cursor.execute(query, list(parameters or []))
+            columns = [column[0] for column in result.description]
+            return [dict(zip(columns, map(athena_string, row))) for row in result.fetchall()]
+        finally:
+            cursor.close()
+
+    def columns(self, table: str) -> List[str]:
+        cursor = self.connection.cursor()
+        try:
+            result = cursor.execute(f'DESCRIBE "{self.database}"."{table}"')
+            return [row[0] for row in result.fetchall()]
+        finally:
+            cursor.close()
+
+
+def current_dataset_version() -> Optional[str]:
+    """The version of the data served: the one of the snapshot published by the ETL, or the
+    DATASET_VERSION environment variable when the snapshots are not deployed"""
+    from app.api.ship_snapshot import get_ship_snapshot_reader
+
+    reader = get_ship_snapshot_reader()
+    version = reader.dataset_version() if reader is not None else None
+    return version or os.environ.get("DATASET_VERSION")
+
+
+def create_query_backend(kind: Optional[str] = None) -> QueryBackend:
+    """Creates the backend selected by the QUERY_BACKEND environment variable ("athena" by
+    default, or "duckdb" with the Parquet files in DUCKDB_DATA_PATH), with at most
+    QUERY_MAX_IN_FLIGHT queries running at once (0 for no limit)"""
+    kind = (kind or os.environ.get("QUERY_BACKEND", "athena")).lower()
+    if kind == "athena":
+        backend = AthenaBackend(
+            database=os.environ["DATABASE"],
+            output_location=os.environ["OUTPUT_LOCATION"],
+            reuse_max_age_minutes=int(os.environ.get("ATHENA_RESULT_REUSE_MAX_AGE_MINUTES", 24 * 60)),
+            dataset_version=current_dataset_version,
+        )
+    elif kind == "duckdb":
+        backend = DuckDBBackend(
+            database=os.environ["DATABASE"], table=os.environ["TABLE"], data_path=os.environ["DUCKDB_DATA_PATH"]
+        )
+    else:
+        raise ValueError(f"Unknown query backend: {kind}")
+
+    max_in_flight = int(os.environ.get("QUERY_MAX_IN_FLIGHT", 20))
+    if max_in_flight > 0:
+        from app.api.admission import AdmissionBackend, AdmissionController
+
+        backend = AdmissionBackend(backend, AdmissionController(
+            max_in_flight,
+            max_queue=int(os.environ.get("QUERY_MAX_QUEUE", 50)),
+            max_wait_seconds=float(os.environ.get("QUERY_MAX_WAIT_SECONDS", 10)),
+        ))
+
+    # the coalesced queries take a single slot
+    return with_single_flight(backend, os.environ.get("SINGLE_FLIGHT", "local"))
+
+
+def with_single_flight(backend: QueryBackend, mode: str) -> QueryBackend:
+    """Coalesces the identical concurrent queries of the backend. The mode is "local" (within
+    the process), "dynamodb" (also across instances, through the SINGLE_FLIGHT_TABLE table)
+    or "off"."""
+    from app.api.single_flight import DynamoDBSingleFlight, SingleFlight, SingleFlightBackend
+
+    mode = mode.lower()
+    if mode == "off":
+        return backend
+    if mode == "local":
+        return SingleFlightBackend(backend, SingleFlight())
+    if mode == "dynamodb":
+        return SingleFlightBackend(backend, DynamoDBSingleFlight(os.environ["SINGLE_FLIGHT_TABLE"]))
+    raise ValueError(f"Unknown single flight mode: {mode}")
+
+
+_default_backend: Optional[QueryBackend] = None
+
+
+def get_query_backend() -> QueryBackend:
+    """Returns the backend shared by the endpoints of the process. It is kept between the
+    invocations of a warm Lambda container."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = create_query_backend()
+    return _default_backend
+
+
+def execute_query(query: str, parameters: Optional[Sequence] = None) -> List[Dict[str, str]]:
+    """Runs a query of the endpoints on the shared backend"""
+    return get_query_backend().execute(query, parameters)
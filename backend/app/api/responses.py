@@ -0,0 +1,133 @@
+import base64
+import gzip
+import random
+import re
+import string
+
+import brotli
+import orjson
+
+from typing import Callable, Dict, List, Optional
+
+# The layouts of the results of a response, selected by the format parameter:
+#   json      rows of strings, as returned by Athena (the default)
+#   typed     rows with the numeric columns as numbers
+#   columnar  {"columns": [...], "data": [[...], ...]} with the numeric columns as numbers
+FORMATS = ("json", "typed", "columnar")
+
+# smaller bodies are not worth the base64 encoding
+MIN_COMPRESSED_BYTES = 1024
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    "br": lambda data: brotli.compress(data, quality=5),
+    "gzip": lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+}
+
+INTEGER = re.compile(r"^-?(0|[1-9][0-9]*)$")
+FLOAT = re.compile(r"^-?(0|[1-9][0-9]*)?(\.[0-9]+)?([eE][-+]?[0-9]+)?$")
+NON_FINITE = {"NaN", "Infinity", "-Infinity"}
+
+
+def random_string(length: int) -> str:
+    """The request_id of the responses"""
+    return "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(length))
+
+
+def parse_format(value: Optional[str]) -> str:
+    layout = (value or "json").lower()
+    if layout not in FORMATS:
+        raise ValueError(f"Invalid parameter value: format must be one of {', '.join(FORMATS)}")
+    return layout
+
+
+def infer_type(values: List[str]) -> type:
+    """The type of a column of Athena strings: int or float if every value is a number
+    (nulls are empty strings), else str. Numbers with leading zeros are codes and stay str."""
+    values = [value for value in values if value != ""]
+    if not values:
+        return str
+    if all(INTEGER.match(value) for value in values):
+        return int
+    if all(value in NON_FINITE or (FLOAT.match(value) and any(c.isdigit() for c in value)) for value in values):
+        return float
+    return str
+
+
+def typed_rows(rows: List[Dict[str, str]], types: Optional[Dict[str, type]] = None) -> List[Dict]:
+    """Converts the numeric columns of the rows to numbers and the empty strings to nulls.
+    The types of the columns missing from `types` are inferred from the values."""
+    if not rows:
+        return []
+
+    types = dict(types or {})
+    for column in rows[0]:
+        if column not in types:
+            types[column] = infer_type([row[column] for row in rows])
+
+    def convert(column, value):
+        if value == "":
+            return None
+        return value if types[column] is str else types[column](value)
+
+    return [{column: convert(column, value) for column, value in row.items()} for row in rows]
+
+
+def format_rows(rows: List[Dict[str, str]], layout: str, types: Optional[Dict[str, type]] = None):
+    """Lays out the result rows in one of the FORMATS"""
+    if layout == "json":
+        return rows
+
+    rows = typed_rows(rows, types)
+    if layout == "columnar":
+        # the column names are sent once instead of on every row
+        return {"columns": list(rows[0]) if rows else [], "data": [list(row.values()) for row in rows]}
+    return rows
+
+
+def request_header(event: Dict, name: str) -> Optional[str]:
+    """A header of the request. REST APIs keep the case of the client, HTTP APIs lowercase."""
+    for header, value in (event.get("headers") or {}).items():
+        if header.lower() == name.lower():
+            return value
+    return None
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The content encoding for an Accept-Encoding header: br or gzip, the one with the highest
+    q-value (br on a tie), or None for the identity"""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, parameters = part.strip().partition(";")
+        weight = 1.0
+        match = re.search(r"q=([0-9.]+)", parameters)
+        if match:
+            try:
+                weight = float(match.group(1))
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0.0)), encoding) for encoding in COMPRESSORS
+    ]
+    weight, encoding = max(candidates, key=lambda candidate: candidate[0])
+    return encoding if weight > 0 else None
+
+
+def json_response(event: Dict, body, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Dict:
+    """The API Gateway response of a JSON body, compressed with the encoding accepted by the
+    client. Compressed bodies are binary, so they are returned base64 encoded."""
+    data = orjson.dumps(body)
+    headers = {"Content-Type": "application/json", "Vary": "Accept-Encoding", **(headers or {})}
+
+    encoding = negotiate_encoding(request_header(event, "Accept-Encoding"))
+    if encoding is None or len(data) < MIN_COMPRESSED_BYTES:
+        return {"statusCode": status, "headers": headers, "body": data.decode("utf-8")}
+
+    headers["Content-Encoding"] = encoding
+    return {
+        "statusCode": status,
+        "headers": headers,
+        "body": base64.b64encode(COMPRESSORS[encoding](data)).decode("ascii"),
+        "isBase64Encoded": True,
+    }
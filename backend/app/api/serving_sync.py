@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from typing import Callable, Dict, Optional, Set
+
+
+def serving_directory() -> Optional[str]:
+    """The directory the endpoints read the serving artifacts from: SHIP_SNAPSHOT_DIR, or a
+    temporary directory the artifacts published to SERVING_ARTIFACTS_URL are synced to. None
+    if the serving artifacts are not deployed with the endpoints."""
+    if os.environ.get("SHIP_SNAPSHOT_DIR"):
+        return os.environ["SHIP_SNAPSHOT_DIR"]
+    if os.environ.get("SERVING_ARTIFACTS_URL"):
+        return os.path.join(tempfile.gettempdir(), "serving-artifacts")
+    return None
+
+
+class ServingArtifactSync:
+    """Copies the serving artifacts the ETL uploads to an object store (src/serving_artifacts.py)
+    to the local directory of the readers, which memory-map them. A manifest is checked at
+    most every `interval_seconds` (a HEAD request); when it changed, the files it points to
+    are downloaded and the manifest is renamed into place last, like on the ETL side. The
+    files of the previous manifest are kept until the next change, the readers that read it
+    may not have mapped them yet.
+
+    The location is an S3 prefix, s3://<bucket>/<prefix>, or a directory (file://<directory>)."""
+
+    def __init__(self, url: str, directory: str, interval_seconds: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.bucket, self.prefix, self.root = None, "", None
+        if url.startswith("s3://"):
+            self.bucket, _, prefix = url[len("s3://"):].partition("/")
+            self.prefix = f"{prefix.strip('/')}/" if prefix.strip("/") else ""
+        else:
+            self.root = url[len("file://"):] if url.startswith("file://") else url
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self._client = None
+        self._checked: Dict[str, float] = {}
+        self._versions: Dict[str, str] = {}
+        self._retired: Dict[str, Set[str]] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("s3")
+        return self._client
+
+    def _version(self, name: str) -> Optional[str]:
+        """The version of an object (its ETag, or its mtime in a directory), None if it does not exist"""
+        if self.bucket is None:
+            try:
+                return str(os.stat(os.path.join(self.root, name)).st_mtime_ns)
+            except FileNotFoundError:
+                return None
+
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + name)["ETag"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+
+    def _read(self, name: str) -> bytes:
+        if self.bucket is None:
+            with open(os.path.join(self.root, name), "rb") as f:
+                return f.read()
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + name)["Body"].read()
+
+    def _write(self, name: str, contents: bytes):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "wb") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+
+    def _files(self, manifest: dict, keys) -> Set[str]:
+        return {manifest[key] for key in keys if key in manifest}
+
+    def sync(self, manifest_name: str, *keys: str):
+        """Copies a manifest and the files named by its `keys`, if the manifest changed since
+        the last copy. Failures are logged and the local copies are served until the next check."""
+        now = self.clock()
+        if now - self._checked.get(manifest_name, -self.interval_seconds) < self.interval_seconds:
+            return
+        self._checked[manifest_name] = now
+
+        try:
+            self._sync(manifest_name, keys)
+        except Exception as e:
+            print(f"Could not sync {manifest_name} from the serving artifacts: {e}")
+
+    def _sync(self, manifest_name: str, keys):
+        version = self._version(manifest_name)
+        if version is None or version == self._versions.get(manifest_name):
+            return
+
+        contents = self._read(manifest_name)
+        manifest = json.loads(contents)
+        os.makedirs(self.directory, exist_ok=True)
+        for file_name in self._files(manifest, keys):
+            if not os.path.exists(os.path.join(self.directory, file_name)):
+                self._write(file_name, self._read(file_name))
+
+        manifest_path = os.path.join(self.directory, manifest_name)
+        try:
+            with open(manifest_path, "r") as f:
+                previous = self._files(json.load(f), keys)
+        except (OSError, ValueError):
+            previous = set()
+        self._write(manifest_name, contents)
+        self._versions[manifest_name] = version
+
+        current = self._files(manifest, keys)
+        for file_name in self._retired.get(manifest_name, set()) - current - previous:
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+        self._retired[manifest_name] = previous - current
+
+
+_default_sync: Optional[ServingArtifactSync] = None
+
+
+def sync_serving_artifact(manifest_name: str, *keys: str):
+    """Syncs a serving artifact from SERVING_ARTIFACTS_URL to the serving directory, checked
+    at most every SERVING_ARTIFACTS_SYNC_SECONDS. Nothing is done when the artifacts are
+    deployed with the endpoints (SERVING_ARTIFACTS_URL is not set)."""
+    global _default_sync
+    if _default_sync is None and os.environ.get("SERVING_ARTIFACTS_URL"):
+        _default_sync = ServingArtifactSync(
+            os.environ["SERVING_ARTIFACTS_URL"],
+            serving_directory(),
+            interval_seconds=float(os.environ.get("SERVING_ARTIFACTS_SYNC_SECONDS", 60)),
+        )
+    if _default_sync is not None:
+        _default_sync.sync(manifest_name, *keys)
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.api.query_backend import athena_string
+from app.api.serving_sync import serving_directory, sync_serving_artifact
+
+SHIP_SNAPSHOT_MANIFEST = "ship_snapshot.json"
+
+
+class ShipSnapshot:
+    """The latest version rows published by the ETL (src/serving_artifacts.py), memory-mapped.
+    The rows are sorted by IMO number and the sidecar index gives the rows of every ship, so
+    a lookup is a binary search in the index and a zero-copy slice of the Arrow table."""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.dataset_version = manifest["dataset_version"]
+        self.published_at = manifest["published_at"]
+
+        # numpy and pyarrow are only imported by the containers serving a snapshot
+        import numpy as np
+        import pyarrow as pa
+
+        # the buffers of the table point into the mapped file, nothing is read up front
+        self._source = pa.memory_map(os.path.join(directory, manifest["snapshot"]), "r")
+        self.table = pa.ipc.open_file(self._source).read_all()
+        self.index = np.load(os.path.join(directory, manifest["index"]), mmap_mode="r")
+        self.imo_numbers = self.index["imo_number"]
+
+    def lookup(self, imo_number: int, fields: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, str]]]:
+        """Returns the rows of a ship, latest reporting period first, formatted like the
+        Athena results, or None if the ship is not in the snapshot. Only the `fields`
+        columns are read when they are given."""
+        position = int(self.imo_numbers.searchsorted(imo_number))
+        if position == len(self.imo_numbers) or self.imo_numbers[position] != imo_number:
+            return None
+
+        entry = self.index[position]
+        rows = self.table.slice(int(entry["start"]), int(entry["count"]))
+        rows = (rows.select(list(fields)) if fields else rows).to_pylist()
+        return [{column: athena_string(value) for column, value in row.items()} for row in rows]
+
+
+class ShipSnapshotReader:
+    """Serves the point lookups from the snapshot of a directory, kept open between the
+    invocations of a warm container. The manifest is checked on every lookup (a stat call)
+    and the snapshot is mapped again when the ETL publishes a new one. A snapshot older than
+    `max_age_seconds` is not used."""
+
+    def __init__(self, directory: str, max_age_seconds: float = 7 * 24 * 3600, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self._snapshot: Optional[ShipSnapshot] = None
+        self._manifest_mtime: Optional[int] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, SHIP_SNAPSHOT_MANIFEST)
+
+    def _load(self) -> Optional[ShipSnapshot]:
+        """Returns the latest published snapshot, stale or not"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self._manifest_mtime:
+            try:
+                with open(self.manifest_path, "r") as f:
+                    manifest = json.load(f)
+                snapshot = ShipSnapshot(self.directory, manifest)
+            except OSError:
+                # the files were removed by the publications that followed the manifest read,
+                # the lookups are queried until the next one maps the current manifest
+                return None
+            self._snapshot, self._manifest_mtime = snapshot, mtime
+        return self._snapshot
+
+    def get(self) -> Optional[ShipSnapshot]:
+        snapshot = self._load()
+        if snapshot is None or self.clock() - snapshot.published_at > self.max_age_seconds:
+            return None
+        return snapshot
+
+    def dataset_version(self) -> Optional[str]:
+        """The version of the data of the latest published snapshot"""
+        snapshot = self._load()
+        return snapshot.dataset_version if snapshot is not None else None
+
+    def published_at(self) -> Optional[float]:
+        """The time the latest snapshot was published by the ETL"""
+        snapshot = self._load()
+        return snapshot.published_at if snapshot is not None else None
+
+    def columns(self) -> Optional[List[str]]:
+        """The columns of the snapshot, or None if it is stale or missing"""
+        snapshot = self.get()
+        return snapshot.table.column_names if snapshot is not None else None
+
+    def lookup(self, ship_id, fields: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, str]]]:
+        """Returns the rows of a ship, or None if they have to be queried: the ship is not
+        in the snapshot, the snapshot is stale or missing, or the id is not an IMO number"""
+        try:
+            imo_number = int(ship_id)
+        except (TypeError, ValueError):
+            return None
+
+        snapshot = self.get()
+        return snapshot.lookup(imo_number, fields) if snapshot is not None else None
+
+
+_default_reader: Optional[ShipSnapshotReader] = None
+
+
+def get_ship_snapshot_reader() -> Optional[ShipSnapshotReader]:
+    """Returns the reader of the serving directory (SHIP_SNAPSHOT_DIR, or the copy of
+    SERVING_ARTIFACTS_URL), or None if the snapshots are not deployed with the endpoints"""
+    global _default_reader
+    directory = serving_directory()
+    if _default_reader is None and directory:
+        _default_reader = ShipSnapshotReader(
+            directory,
+            max_age_seconds=float(os.environ.get("SHIP_SNAPSHOT_MAX_AGE_SECONDS", 7 * 24 * 3600)),
+        )
+    sync_serving_artifact(SHIP_SNAPSHOT_MANIFEST, "snapshot", "index")
+    return _default_reader
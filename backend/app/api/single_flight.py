@@ -0,0 +1,186 @@
+import hashlib
+import json
+import threading
+import time
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.api.query_backend import QueryBackend
+
+
+def query_key(query: str, parameters: Optional[Sequence] = None) -> str:
+    """Identifies a query by its text, with the whitespace normalized, and its parameters"""
+    normalized = json.dumps([" ".join(query.split()), list(parameters or [])], default=str)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls in the process: the first caller of a key runs
+    the function, and the callers that arrive while it runs wait for it and get its result
+    (or its exception) instead of running it again."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.metrics = {"executions": 0, "shared": 0}
+
+    def do(self, key: str, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.metrics["executions"] += 1
+            else:
+                self.metrics["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class DynamoDBSingleFlight:
+    """Coalesces identical concurrent calls across instances (e.g. Lambda containers, which
+    serve one request at a time) through a DynamoDB table with a `query_key` string key.
+
+    The first instance puts a lock item for the key and runs the function. The others find
+    the lock, poll the item until the leader writes the result into it, and return that
+    result. The result is kept `result_seconds`, only for the calls that were waiting. If
+    the leader fails, dies (the lock expires after `lock_seconds`) or its result is too
+    large for an item, the waiting callers run the function themselves. Calls of the same
+    instance are first coalesced by the local SingleFlight, so only one of them polls.
+    """
+
+    MAX_RESULT_BYTES = 350 * 1024  # DynamoDB items are limited to 400 KB
+
+    def __init__(
+        self,
+        table: str,
+        client=None,
+        local: Optional[SingleFlight] = None,
+        lock_seconds: float = 60,
+        result_seconds: float = 5,
+        poll_interval: float = 0.1,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.table = table
+        self.local = local if local is not None else SingleFlight()
+        self.lock_seconds = lock_seconds
+        self.result_seconds = result_seconds
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sleep = sleep
+        self._client = client
+        self._lock = threading.Lock()
+        self.metrics = {"executions": 0, "shared": 0, "fallbacks": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("dynamodb")
+        return self._client
+
+    def _count(self, metric: str):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def do(self, key: str, fn: Callable):
+        return self.local.do(key, lambda: self._do_shared(key, fn))
+
+    def _do_shared(self, key: str, fn: Callable):
+        from botocore.exceptions import ClientError
+
+        now = self.clock()
+        try:
+            self.client.put_item(
+                TableName=self.table,
+                Item={"query_key": {"S": key}, "status": {"S": "running"}, "expires_at": {"N": str(now + self.lock_seconds)}},
+                ConditionExpression="attribute_not_exists(query_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return self._wait(key, fn)
+
+        self._count("executions")
+        try:
+            result = fn()
+        except Exception:
+            self.client.delete_item(TableName=self.table, Key={"query_key": {"S": key}})
+            raise
+
+        self._publish(key, result)
+        return result
+
+    def _publish(self, key: str, result):
+        body = json.dumps(result)
+        if len(body.encode("utf-8")) > self.MAX_RESULT_BYTES:
+            self.client.delete_item(TableName=self.table, Key={"query_key": {"S": key}})
+            return
+
+        self.client.put_item(
+            TableName=self.table,
+            Item={
+                "query_key": {"S": key},
+                "status": {"S": "done"},
+                "result": {"S": body},
+                "expires_at": {"N": str(self.clock() + self.result_seconds)},
+            },
+        )
+
+    def _wait(self, key: str, fn: Callable):
+        deadline = self.clock() + self.lock_seconds
+        while self.clock() < deadline:
+            self.sleep(self.poll_interval)
+            item = self.client.get_item(
+                TableName=self.table, Key={"query_key": {"S": key}}, ConsistentRead=True
+            ).get("Item")
+            if item is None or float(item["expires_at"]["N"]) < self.clock():
+                break
+            if item["status"]["S"] == "done":
+                self._count("shared")
+                return json.loads(item["result"]["S"])
+
+        self._count("fallbacks")
+        return fn()
+
+
+class SingleFlightBackend(QueryBackend):
+    """Runs the queries of a backend through a single flight, keyed by the query and its
+    parameters, so identical concurrent requests share one execution"""
+
+    def __init__(self, backend: QueryBackend, single_flight):
+        self.backend = backend
+        self.single_flight = single_flight
+
+    def execute(self, query: str, parameters: Optional[Sequence] = None) -> List[Dict[str, str]]:
+        rows = self.single_flight.do(query_key(query, parameters), lambda: self.backend.execute(query, parameters))
+        # the callers share the rows, every one gets its own copy
+        return [dict(row) for row in rows]
+
+    def columns(self, table: str) -> List[str]:
+        return self.backend.columns(table)
@@ -0,0 +1,59 @@
+"""Measures the cold start of the API: the time a fresh interpreter takes to import the
+handler of a request, for the endpoint modules each deployed as their own Lambda and for the
+single application of app/api/app.py routing its first request.
+
+Usage (from the backend directory, or --root another checkout of it to compare):
+    python -m benchmarks.cold_start_benchmark --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ENDPOINTS = ["emissions_endpoint", "ship_types_endpoint", "ship_data_endpoint", "metadata_endpoint"]
+
+MODULE = """
+import time
+start = time.perf_counter()
+import app.api.endpoints.{name}
+print(time.perf_counter() - start)
+"""
+
+APPLICATION = """
+import time
+start = time.perf_counter()
+import app.api.app
+app.api.app.resolve("GET", "/metadata")
+print(time.perf_counter() - start)
+"""
+
+
+def import_seconds(code: str, root: str, repeat: int) -> float:
+    env = {
+        **os.environ,
+        "DATABASE": "emissions", "TABLE": "clean_emissions", "API_URL": "https://api.example.com",
+        "AWS_DEFAULT_REGION": "eu-west-1", "AWS_ACCESS_KEY_ID": "benchmark", "AWS_SECRET_ACCESS_KEY": "benchmark",
+    }
+    times = [
+        float(subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeat)
+    ]
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'handler':<24}{'import ms':>10}")
+    for name in ENDPOINTS:
+        print(f"{name:<24}{import_seconds(MODULE.format(name=name), args.root, args.repeat) * 1000:>10.1f}")
+    if os.path.exists(os.path.join(args.root, "app", "api", "app.py")):
+        print(f"{'app (GET /metadata)':<24}{import_seconds(APPLICATION, args.root, args.repeat) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
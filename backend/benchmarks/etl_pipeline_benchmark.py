@@ -0,0 +1,173 @@
+"""Benchmarks the ETL pipeline offline on a local object store.
+
+Synthetic EU-MRV reports are written as excel files in a temporary LocalObjectStore. Every
+transfer can be delayed to simulate the latency and bandwidth of a cloud bucket.
+
+Usage (from the backend directory):
+    python -m benchmarks.etl_pipeline_benchmark --reports 8 --rows 5000 --latency-ms 200
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from io import BytesIO
+from typing import Dict, List, Optional
+from src.etl_pipeline import ETLPipeline
+from src.object_store import LocalObjectStore, ObjectInfo, ObjectStore
+
+METRIC_COLUMNS = [
+    'Total fuel consumption [m tonnes]',
+    'Fuel consumptions assigned to On laden [m tonnes]',
+    'Total CO₂ emissions [m tonnes]',
+    'CO₂ emissions from all voyages between ports under a MS jurisdiction [m tonnes]',
+    'CO₂ emissions from all voyages which departed from ports under a MS jurisdiction [m tonnes]',
+    'CO₂ emissions from all voyages to ports under a MS jurisdiction [m tonnes]',
+    'CO₂ emissions which occurred within ports under a MS jurisdiction at berth [m tonnes]',
+    'Annual Time spent at sea [hours]',
+    'Annual average Fuel consumption per distance [kg / n mile]',
+    'Annual average CO₂ emissions per distance [kg CO₂ / n mile]',
+]
+
+
+class LatencyObjectStore(ObjectStore):
+    """Wraps a store and delays every transfer by a fixed latency plus the transfer time"""
+
+    def __init__(self, store: ObjectStore, latency_ms: float, bandwidth_mb_s: float):
+        self.store = store
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_mb_s * 1024 * 1024
+
+    async def _delay(self, size: int = 0):
+        await asyncio.sleep(self.latency + size / self.bandwidth)
+
+    async def get(self, name: str) -> bytes:
+        contents = await self.store.get(name)
+        await self._delay(len(contents))
+        return contents
+
+    async def get_range(self, name: str, start: int, end: int) -> bytes:
+        await self._delay(end - start)
+        return await self.store.get_range(name, start, end)
+
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, str]] = None):
+        await self._delay(len(data))
+        await self.store.put(name, data, content_type=content_type, metadata=metadata)
+
+    async def list(self, prefix: str = "") -> List[ObjectInfo]:
+        await self._delay()
+        return await self.store.list(prefix)
+
+    async def stat(self, name: str) -> ObjectInfo:
+        await self._delay()
+        return await self.store.stat(name)
+
+    async def patch_metadata(self, name: str, metadata: Dict[str, str]):
+        await self._delay()
+        await self.store.patch_metadata(name, metadata)
+
+
+def make_raw_report(rows: int, year: int, seed: int) -> pd.DataFrame:
+    """Creates a report with the columns of the excel files published by EU-MRV"""
+    rng = np.random.default_rng(seed)
+    yes_no = np.array(['Yes', 'No'])
+
+    report = pd.DataFrame({
+        'IMO Number': rng.integers(9000000, 9999999, rows),
+        'Name': [f"Ship {i}" for i in range(rows)],
+        'Ship type': rng.choice(['Bulk carrier', 'Oil tanker', 'Container ship'], rows),
+        'Technical efficiency': [f"EEDI ({value:.2f} gCO₂/t·nm)" for value in rng.uniform(2, 20, rows)],
+        'Reporting Period': year,
+        'Port of Registry': 'Valletta',
+        'Home Port': 'Piraeus',
+        'Ice Class': 'Missing',
+        'DoC issue date': '15/03/2024',
+        'DoC expiry date': '30/06/2025',
+        'Verifier Number': 'V123',
+        'Verifier Address': 'Address',
+        'Verifier Name': 'Verifier',
+        'Verifier NAB': 'NAB',
+        'Verifier City': 'City',
+        'Verifier Accreditation number': 'ACC123',
+        'Verifier Country': 'Country',
+        'A': rng.choice(yes_no, rows),
+        'B': rng.choice(yes_no, rows),
+        'C': rng.choice(yes_no, rows),
+        'D': rng.choice(yes_no, rows),
+        'D.1': 'x',
+        'Additional information to facilitate the understanding of the reported average operational energy efficiency indicators': '',
+    })
+    for column in METRIC_COLUMNS:
+        report[column] = rng.uniform(0, 50000, rows).round(2)
+
+    return report
+
+
+def to_excel_bytes(report: pd.DataFrame) -> bytes:
+    buffer = BytesIO()
+    # The published files have two title rows above the header
+    report.to_excel(buffer, index=False, startrow=2, engine="openpyxl")
+    return buffer.getvalue()
+
+
+async def seed_store(store: ObjectStore, reports: List[bytes]):
+    for i, contents in enumerate(reports):
+        year = 2018 + i
+        await store.put(
+            f"bronze-bucket/{year}/{year}-v{i + 1}-01012025-EU MRV Publication of information.xlsx",
+            contents,
+            metadata={'processed_by_ETL': False},
+        )
+
+
+def run_mode(label: str, reports: List[bytes], args, run):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_store = LocalObjectStore(tmp_dir)
+        asyncio.run(seed_store(local_store, reports))
+        store = LatencyObjectStore(local_store, args.latency_ms, args.bandwidth_mb_s)
+
+        start = time.perf_counter()
+        run(store)
+        print(f"{label:<40} {time.perf_counter() - start:8.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--bandwidth-mb-s", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--transform-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    logging.getLogger("mylogger").setLevel(logging.WARNING)
+    reports = [to_excel_bytes(make_raw_report(args.rows, 2018 + i, seed=i)) for i in range(args.reports)]
+    print(f"{args.reports} reports x {args.rows} rows, {args.latency_ms} ms latency, {args.bandwidth_mb_s} MB/s")
+
+    run_mode(
+        "run_async, one transfer at a time",
+        reports, args,
+        lambda store: asyncio.run(ETLPipeline(object_store=store, max_concurrency=1).run_async()),
+    )
+    run_mode(
+        f"run_async, {args.concurrency} concurrent transfers",
+        reports, args,
+        lambda store: asyncio.run(ETLPipeline(object_store=store, max_concurrency=args.concurrency).run_async()),
+    )
+    run_mode(
+        f"run_pipelined, {args.transform_workers} transform processes",
+        reports, args,
+        lambda store: ETLPipeline(object_store=store, max_concurrency=args.concurrency).run_pipelined(
+            transform_workers=args.transform_workers
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmarks single-stream against parallel transfers in GoogleCloudStorageManager.
+
+It runs against a local fake-gcs-server, started for example with:
+    docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http -public-host localhost:4443
+
+Usage (from the backend directory):
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python -m benchmarks.gcs_transfer_benchmark --size-mb 256
+"""
+import argparse
+import os
+import time
+
+from io import BytesIO
+from src.google_cloud_storage_manager import GoogleCloudStorageManager, MB
+
+BUCKET = "benchmark-bucket"
+
+
+def timed(label, func, total_bytes):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.2f} s {total_bytes / MB / elapsed:10.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    args = parser.parse_args()
+
+    if "STORAGE_EMULATOR_HOST" not in os.environ:
+        raise SystemExit("Set STORAGE_EMULATOR_HOST to the address of the fake-gcs-server")
+
+    os.environ.setdefault("GCP_PROJECT_ID", "benchmark")
+    os.environ["BUCKET_NAME"] = BUCKET
+
+    payload = os.urandom(args.size_mb * MB)
+    name = "silver-bucket/benchmark/large.parquet"
+
+    baseline = GoogleCloudStorageManager()
+    if not baseline.bucket.exists():
+        baseline.client.create_bucket(BUCKET)
+
+    print(f"Object of {args.size_mb} MB, chunks of {args.chunk_mb} MB")
+    timed(
+        "upload: single stream",
+        lambda: baseline.bucket.blob(name).upload_from_file(BytesIO(payload)),
+        len(payload),
+    )
+    timed("download: single stream", lambda: baseline.bucket.blob(name).download_as_bytes(), len(payload))
+
+    for workers in args.workers:
+        manager = GoogleCloudStorageManager(
+            max_workers=workers, parallel_threshold=args.chunk_mb * MB, chunk_size=args.chunk_mb * MB
+        )
+        timed(f"upload: composite, {workers} workers", lambda: manager.upload_bytes(name, payload), len(payload))
+        timed(f"download: sliced, {workers} workers", lambda: manager.download_bytes(name), len(payload))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmarks the leaderboards of the ranking endpoint: building them with partial sorts
+against full sorts of every reporting period and ship type, and serving a top 50 from the
+memory-mapped leaderboards against the ORDER BY ... LIMIT query on DuckDB (the local
+stand-in for Athena).
+
+Usage (from the backend directory):
+    python -m benchmarks.leaderboard_benchmark --ships 100000 --years 6
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.api.leaderboards import LeaderboardReader
+from app.api.query_backend import DuckDBBackend, latest_data_cte
+from benchmarks.ship_snapshot_benchmark import write_clean_table
+from src import serving_artifacts
+from src.serving_artifacts import LEADERBOARD_METRICS, build_leaderboards, publish_leaderboards, read_latest_clean_data
+
+SHIP_TYPES = ["Container ship", "Oil tanker", "Bulk carrier"]
+
+
+def full_sort_positions(values: np.ndarray, imo_numbers: np.ndarray, size: int) -> np.ndarray:
+    candidates = np.flatnonzero(~np.isnan(values))
+    return candidates[np.lexsort((imo_numbers[candidates], -values[candidates]))][:size]
+
+
+def build_seconds(table, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        build_leaderboards(table)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ships", type=int, default=100000)
+    parser.add_argument("--years", type=int, default=6)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--builds", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clean_path, serving_path = os.path.join(tmp_dir, "clean"), os.path.join(tmp_dir, "serving")
+        write_clean_table(clean_path, args.ships, args.years, rng)
+        table, _ = read_latest_clean_data(clean_path)
+
+        partial_time = build_seconds(table, args.builds)
+        top_positions = serving_artifacts.top_positions
+        serving_artifacts.top_positions = full_sort_positions
+        try:
+            full_time = build_seconds(table, args.builds)
+        finally:
+            serving_artifacts.top_positions = top_positions
+
+        publish_leaderboards(table, serving_path, "benchmark")
+        reader = LeaderboardReader(serving_path)
+        requests = [
+            (rng.choice(list(LEADERBOARD_METRICS)), int(rng.integers(2018, 2018 + args.years)), rng.choice(SHIP_TYPES))
+            for _ in range(args.requests)
+        ]
+        reader.top(*requests[0], args.limit)
+        start = time.perf_counter()
+        for metric, year, ship_type in requests:
+            reader.top(metric, year, ship_type, args.limit)
+        request_time = (time.perf_counter() - start) / args.requests
+
+        backend = DuckDBBackend("ship-emissions-database", "clean_emissions", clean_path)
+        cte = latest_data_cte("ship-emissions-database", "clean_emissions")
+        start = time.perf_counter()
+        for metric, year, ship_type in requests[:args.queries]:
+            column = LEADERBOARD_METRICS[metric]
+            backend.execute(
+                cte + f"SELECT imo_number, name, {column} AS value FROM latest_data "
+                f"WHERE reporting_period = ? AND ship_type = ? AND {column} IS NOT NULL "
+                f"ORDER BY {column} DESC, imo_number LIMIT {args.limit}",
+                [year, ship_type],
+            )
+        query_time = (time.perf_counter() - start) / args.queries
+
+    print(f"{table.num_rows:,} latest version rows, {len(LEADERBOARD_METRICS) * args.years * len(SHIP_TYPES)} leaderboards")
+    print(f"build, partial sorts: {partial_time * 1e3:10.1f} ms")
+    print(f"build, full sorts:    {full_time * 1e3:10.1f} ms")
+    print(f"top {args.limit}, leaderboard: {request_time * 1e6:10.1f} us")
+    print(f"top {args.limit}, duckdb query: {query_time * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmarks the trigram NameIndex against pairwise SequenceMatcher comparisons.
+
+Ship names are made of frequent words (SEA, STAR, ...) and words of random syllables. The queries are indexed names with a
+typo, a vessel prefix or a different case, plus names that are not in the index.
+
+With --calibrate, prints for every threshold the share of the perturbed names matched back and the share of the
+queries whose best wrong name (the index without their own name) would be accepted, which is how NAME_MATCH_THRESHOLD
+was chosen.
+
+Usage (from the backend directory):
+    python -m benchmarks.name_matching_benchmark --names 50000 --queries 20000
+    python -m benchmarks.name_matching_benchmark --names 50000 --queries 5000 --calibrate
+"""
+import argparse
+import time
+
+import numpy as np
+
+from difflib import SequenceMatcher
+from src.utils.data.name_matching import NAME_MATCH_THRESHOLD, NameIndex
+
+# Frequent words of ship names, the other words are made of random syllables
+COMMON_WORDS = ["SEA", "STAR", "OCEAN", "NORDIC", "MAERSK", "MSC", "PACIFIC", "ATLANTIC", "SPIRIT", "EXPRESS",
+                "TRADER", "GLORY", "PRIDE", "QUEEN", "KING", "BALTIC", "GLOBAL", "HIGHWAY", "LEADER", "ACE"]
+CONSONANTS = list("BCDFGHKLMNPRSTVZ")
+VOWELS = list("AEIOU")
+
+
+def make_names(count: int, rng: np.random.Generator):
+    def word():
+        syllables = rng.integers(2, 4)
+        letters = zip(rng.choice(CONSONANTS, syllables), rng.choice(VOWELS, syllables), rng.choice(CONSONANTS + [""] * 16, syllables))
+        return "".join(a + b + c for a, b, c in letters)
+
+    words = [word() for _ in range(max(count // 5, 100))] + COMMON_WORDS * max(count // 2000, 1)
+    names = set()
+    while len(names) < count:
+        name = " ".join(rng.choice(words, rng.integers(1, 4)))
+        if rng.random() < 0.3:
+            name += f" {rng.integers(1, 30)}"
+        names.add(name)
+
+    return sorted(names)
+
+
+def perturb(name: str, rng: np.random.Generator) -> str:
+    kind = rng.integers(0, 3)
+    if kind == 0:
+        position = rng.integers(0, len(name))
+        return name[:position] + rng.choice(list("AEIOU")) + name[position + 1:]
+    elif kind == 1:
+        return f"M/V {name}"
+    return name.title()
+
+
+def calibrate(names, queries, known, thresholds=(0.6, 0.65, 0.7, 0.75, 0.8, 0.85)):
+    """Scores the perturbed names against the index, and against the index without their own names (the hard negatives)"""
+    own = NameIndex(names).match(queries[:len(known)])
+    others = np.setdiff1d(np.arange(len(names)), known)
+    wrong = NameIndex([names[i] for i in others]).match(queries[:len(known)])
+
+    for threshold in thresholds:
+        recall = ((own["index"].to_numpy() == known) & (own["score"].to_numpy() >= threshold)).mean()
+        accepted = (wrong["score"].to_numpy() >= threshold).mean()
+        print(f"threshold {threshold:.2f}: {recall:.1%} of the perturbed names matched back, "
+              f"{accepted:.1%} of their nearest wrong names accepted")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--pairwise-sample", type=int, default=20)
+    parser.add_argument("--calibrate", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = make_names(args.names, rng)
+    known = rng.choice(len(names), int(args.queries * 0.8), replace=False)
+    queries = [perturb(names[i], rng) for i in known] + make_names(args.queries - len(known), rng)
+    if args.calibrate:
+        calibrate(names, queries, known)
+        return
+
+    start = time.perf_counter()
+    index = NameIndex(names)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = index.match(queries, threshold=NAME_MATCH_THRESHOLD)
+    match_time = time.perf_counter() - start
+
+    recovered = (matches["index"].to_numpy()[:len(known)] == known).mean()
+    print(f"{args.queries:,} queries against {args.names:,} names")
+    print(f"NameIndex: build {build_time:6.2f} s, match {match_time:6.2f} s, "
+          f"{recovered:.1%} of the perturbed names matched back")
+
+    start = time.perf_counter()
+    for query in queries[:args.pairwise_sample]:
+        max(names, key=lambda name: SequenceMatcher(None, query.lower(), name.lower()).ratio())
+    per_query = (time.perf_counter() - start) / args.pairwise_sample
+    print(f"SequenceMatcher: {per_query:6.2f} s per query, "
+          f"about {per_query * args.queries / 3600:.1f} h for all the queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Measures what the `fields=` projection saves on the emissions and ship data endpoints:
+the bytes scanned and the size of the JSON payload, with and without a projection.
+
+The bytes scanned are estimated the way Athena bills them on Parquet: the compressed size
+of the column chunks of the columns read by the query (selected, filtered or sorted). The
+payloads are the bodies returned by the handlers, run on DuckDB over the generated table.
+
+Usage (from the backend directory):
+    python -m benchmarks.projection_benchmark --ships 20000 --years 6
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+DATABASE, TABLE = "ship-emissions-database", "clean_emissions"
+
+# the columns of the clean table read by every query: the filter of latest_data and the sort
+KEY_COLUMNS = ["imo_number", "reporting_period"]
+
+SCENARIOS = [
+    # endpoint, request parameters, columns filtered on, projection
+    ("emissions", {"limit": "100"}, [], "imo_number,total_co2_emissions"),
+    ("emissions", {"ship_type": "Oil tanker", "limit": "100"}, ["ship_type"], "imo_number,name,total_co2_emissions"),
+    ("emissions", {"ship_id": "9000042"}, [], "reporting_period,total_co2_emissions"),
+    ("ship_data", {}, [], "name,ship_type,total_co2_emissions,total_fuel_consumption"),
+]
+
+
+def write_clean_table(directory: str, ships: int, years: int, rng: np.random.Generator):
+    """The clean table with the ~60 columns of the published reports"""
+    imo_numbers = np.arange(9000000, 9000000 + ships)
+    for year in range(2018, 2018 + years):
+        report = {
+            "imo_number": imo_numbers,
+            "name": [f"SHIP {imo_number}" for imo_number in imo_numbers],
+            "ship_type": rng.choice(["Container ship", "Oil tanker", "Bulk carrier"], ships),
+            "reporting_period": year,
+            "port_of_registry": rng.choice(["Valletta", "Monrovia", "Majuro", "Panama"], ships),
+            "home_port": rng.choice(["Piraeus", "Hamburg", None], ships),
+            "ice_class": rng.choice(["IA", "IB", None], ships),
+            "doc_issue_date": "2019-03-01",
+            "doc_expiry_date": "2024-06-30",
+            "verifier_number": rng.integers(1000, 9999, ships).astype(str),
+            "technical_efficiency_value": rng.uniform(5, 20, ships).round(2).astype(str),
+            "total_fuel_consumption": rng.uniform(300, 30000, ships),
+        }
+        for metric in ["co2", "ch4", "n2o", "co2eq"]:
+            report[f"total_{metric}_emissions"] = rng.uniform(1000, 100000, ships)
+            for scope in [
+                "from_all_voyages_between_ports_under_a_ms_jurisdiction",
+                "from_all_voyages_which_departed_from_ports_under_a_ms_jurisdiction",
+                "from_all_voyages_to_ports_under_a_ms_jurisdiction",
+                "which_occurred_within_ports_under_a_ms_jurisdiction_at_berth",
+                "assigned_to_passenger_transport",
+                "assigned_to_freight_transport",
+                "assigned_to_on_laden",
+                "per_distance",
+                "per_transport_work_mass",
+                "per_time",
+                "per_transport_work_volume",
+            ]:
+                report[f"{metric}_emissions_{scope}"] = rng.uniform(0, 50000, ships)
+
+        partition = os.path.join(directory, f"year={year}", "version=1")
+        os.makedirs(partition)
+        pd.DataFrame(report).to_parquet(os.path.join(partition, "part-00000.snappy.parquet"), index=False)
+
+    return len(report)
+
+
+def column_chunk_bytes(directory: str) -> dict:
+    """The compressed size of every column over the Parquet files of the table"""
+    sizes = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            metadata = pq.ParquetFile(os.path.join(root, name)).metadata
+            for row_group in range(metadata.num_row_groups):
+                for column in range(metadata.num_columns):
+                    chunk = metadata.row_group(row_group).column(column)
+                    sizes[chunk.path_in_schema] = sizes.get(chunk.path_in_schema, 0) + chunk.total_compressed_size
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ships", type=int, default=20000)
+    parser.add_argument("--years", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clean_path = os.path.join(tmp_dir, "clean")
+        columns = write_clean_table(clean_path, args.ships, args.years, np.random.default_rng(0))
+        sizes = column_chunk_bytes(clean_path)
+
+        os.environ.update({
+            "DATABASE": DATABASE, "TABLE": TABLE, "API_URL": "https://api.example.com",
+            "QUERY_BACKEND": "duckdb", "DUCKDB_DATA_PATH": clean_path,
+        })
+        emissions = importlib.import_module("app.api.endpoints.emissions_endpoint")
+        ship_data = importlib.import_module("app.api.endpoints.ship_data_endpoint")
+
+        print(f"{columns} columns, {args.ships:,} ships, {args.years} years, {sum(sizes.values()) / 1e6:.1f} MB of Parquet\n")
+        print(f"| {'request':<40} | {'scanned before':>14} | {'scanned after':>13} | {'payload before':>14} | {'payload after':>13} |")
+        print(f"|{'-' * 42}|{'-' * 15}:|{'-' * 14}:|{'-' * 15}:|{'-' * 14}:|")
+
+        def run_emissions(params):
+            return emissions.lambda_handler({"queryStringParameters": params}, None)
+
+        def run_ship_data(params):
+            return ship_data.lambda_handler({"pathParameters": {"ship_id": "9000042"}, "queryStringParameters": params}, None)
+
+        for endpoint, parameters, filtered, fields in SCENARIOS:
+            if endpoint == "emissions":
+                selected, run = emissions.EMISSIONS_COLUMNS, run_emissions
+            else:
+                selected, run = list(sizes), run_ship_data
+
+            scanned = []
+            payloads = []
+            for columns_read, params in [
+                (selected, parameters),
+                (fields.split(","), {**parameters, "fields": fields}),
+            ]:
+                scanned.append(sum(sizes.get(column, 0) for column in set(columns_read + KEY_COLUMNS + filtered)))
+                # the handlers log their queries and results
+                with contextlib.redirect_stdout(io.StringIO()):
+                    response = run(params)
+                assert response["statusCode"] == 200, response
+                payloads.append(len(response["body"]))
+
+            request = f"{endpoint} {'&'.join(f'{k}={v}' for k, v in parameters.items())}".strip()
+            print(
+                f"| {request:<40} | {scanned[0] / 1e6:11.2f} MB | {scanned[1] / 1e6:10.2f} MB "
+                f"| {payloads[0] / 1e3:11.1f} kB | {payloads[1] / 1e3:10.1f} kB |"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measures the size on the wire of a 100-row page of the emissions endpoint in the formats
+and content encodings of app/api/responses.py, against the uncompressed rows of strings
+returned before.
+
+Usage (from the backend directory):
+    python -m benchmarks.response_encoding_benchmark --limit 100
+"""
+import argparse
+import base64
+import contextlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.projection_benchmark import DATABASE, TABLE, write_clean_table
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ships", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clean_path = os.path.join(tmp_dir, "clean")
+        write_clean_table(clean_path, args.ships, 2, np.random.default_rng(0))
+        os.environ.update({
+            "DATABASE": DATABASE, "TABLE": TABLE, "API_URL": "https://api.example.com",
+            "QUERY_BACKEND": "duckdb", "DUCKDB_DATA_PATH": clean_path,
+        })
+        emissions = importlib.import_module("app.api.endpoints.emissions_endpoint")
+        responses = importlib.import_module("app.api.responses")
+
+        # the handlers log their queries and results
+        with contextlib.redirect_stdout(io.StringIO()):
+            page = emissions.determine_query_type(emissions.QueryParams(limit=args.limit))
+        before = len(json.dumps(page))
+
+        print(f"| {'format':<9} | {'encoding':<8} | {'bytes':>7} | {'smaller':>7} | {'encode':>8} |")
+        print(f"|{'-' * 11}|{'-' * 10}|{'-' * 8}:|{'-' * 8}:|{'-' * 9}:|")
+        print(f"| {'before':<9} | {'identity':<8} | {before:>7,} | {1:>6.1f}x | {'':>8} |")
+        for layout in ["json", "typed", "columnar"]:
+            for encoding in [None, "gzip", "br"]:
+                event = {"headers": {"Accept-Encoding": encoding} if encoding else {}}
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    body = {**page, "results": responses.format_rows(page["results"], layout, emissions.EMISSIONS_TYPES)}
+                    response = responses.json_response(event, body)
+                elapsed = (time.perf_counter() - start) / args.repeat
+
+                # the bytes sent once API Gateway decodes the base64 body
+                size = len(base64.b64decode(response["body"]) if response.get("isBase64Encoded") else response["body"])
+                print(
+                    f"| {layout:<9} | {encoding or 'identity':<8} | {size:>7,} | {before / size:>6.1f}x "
+                    f"| {elapsed * 1e3:5.2f} ms |"
+                )
+
+
+if __name__ == "__main__":
+    main()
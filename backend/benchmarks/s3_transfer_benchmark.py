@@ -0,0 +1,105 @@
+"""Benchmarks the S3 transfer layer against a local S3 stand-in.
+
+The benchmark talks to the endpoint in S3_ENDPOINT_URL (e.g. a MinIO container). When it is
+not set, a moto server is started in the background, so moto[server] has to be installed.
+
+Usage (from the backend directory):
+    python -m benchmarks.s3_transfer_benchmark --objects 50 --size-mb 4
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import boto3
+
+from botocore.config import Config
+from src.AWSStorageManager import AWSStorageManager, MB
+
+BUCKET = "benchmark-bucket"
+
+
+def start_local_s3():
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ["S3_ENDPOINT_URL"] = f"http://{host}:{port}"
+
+    return server
+
+
+def new_client():
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.environ["AWS_ACCESS_KEY"],
+        aws_secret_access_key=os.environ["AWS_SECRET_KEY"],
+        region_name=os.environ["REGION_NAME"],
+        endpoint_url=os.environ["S3_ENDPOINT_URL"],
+        config=Config(max_pool_connections=10),
+    )
+
+
+def timed(label, func, total_bytes):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed:8.2f} s {total_bytes / MB / elapsed:10.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=50)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--workers", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_SECRET_KEY", "testing")
+    os.environ.setdefault("REGION_NAME", "us-east-1")
+    os.environ["BUCKET_NAME"] = BUCKET
+
+    server = None if os.environ.get("S3_ENDPOINT_URL") else start_local_s3()
+    new_client().create_bucket(Bucket=BUCKET)
+
+    manager = AWSStorageManager(max_workers=args.workers)
+    payload = os.urandom(int(args.size_mb * MB))
+    total_bytes = len(payload) * args.objects
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = []
+        for i in range(args.objects):
+            path = os.path.join(tmp_dir, f"object_{i}.bin")
+            with open(path, "wb") as f:
+                f.write(payload)
+            files.append((path, f"benchmark/object_{i}.bin"))
+
+        def upload_with_new_client_per_call():
+            for path, key in files:
+                new_client().upload_file(path, BUCKET, key)
+
+        def download_to_disk_and_read():
+            client = new_client()
+            for _, key in files:
+                local_file = os.path.join(tmp_dir, "download.bin")
+                client.download_file(BUCKET, key, local_file)
+                with open(local_file, "rb") as f:
+                    f.read()
+
+        keys = [key for _, key in files]
+
+        print(f"{args.objects} objects x {args.size_mb} MB, {args.workers} workers")
+        timed("upload: new client per call, sequential", upload_with_new_client_per_call, total_bytes)
+        timed("upload: pooled client, upload_many", lambda: manager.upload_many(files), total_bytes)
+        timed("download: temp file per object, sequential", download_to_disk_and_read, total_bytes)
+        timed("download: pooled client, download_many", lambda: manager.download_many(keys), total_bytes)
+
+    if server:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmarks the columnar ship particulars parser against the per-record regex parsing.
+
+Synthetic infobox records are written as JSON sources shaped like the wikipedia and
+fleet list scrapes.
+
+Usage (from the backend directory):
+    python -m benchmarks.ship_particulars_benchmark --records 100000
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_generation.ship_particulars_parser import (
+    extraction_coverage,
+    load_ship_particulars,
+    parse_ship_particulars,
+)
+
+
+def make_sources(records: int, directory: str, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    imo_numbers = rng.choice(np.arange(9000000, 9999999), records, replace=False)
+    wikipedia, fleet = {}, {}
+
+    for i, imo_number in enumerate(imo_numbers):
+        length, beam = rng.uniform(80, 400), rng.uniform(12, 60)
+        if i % 2:
+            fleet[str(imo_number)] = {
+                "Length (m)": f"{length:.1f}",
+                "Breadth (m)": f"{beam:.1f} m",
+                "grossTonnage": int(rng.integers(1000, 200000)),
+                "deadweight": "Missing" if i % 7 == 0 else int(rng.integers(1000, 300000)),
+                "Built year": str(rng.integers(1980, 2024)),
+            }
+        else:
+            wikipedia[str(imo_number)] = {
+                "Identification": f"IMO number: {imo_number}; Call sign: 9HA{i % 10000}",
+                "Tonnage": f"{rng.integers(1000, 200000):,} GT; {rng.integers(500, 90000):,} NT; "
+                           f"{rng.integers(1000, 300000):,} t DWT",
+                "Length": f"{length / 0.3048:.0f} ft ({length:.1f} m)",
+                "Beam": "" if i % 10 == 0 else f"{beam:.1f} m ({beam / 0.3048:.0f} ft)",
+                "Completed": f"{rng.integers(1, 28)} May {rng.integers(1980, 2024)}",
+            }
+
+    paths = []
+    for name, data in [("wikipedia_ship_data", wikipedia), ("pleiades_fleet", fleet)]:
+        path = os.path.join(directory, f"{name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        paths.append(path)
+
+    return paths
+
+
+def per_record(paths):
+    """The previous parsing: uncompiled re.search calls record by record, then the
+    strings are parsed again into numbers as in fix_column_values_and_types"""
+    tonnage_patterns = {
+        "GT": r"(\d{1,3}(?:,\d{3})*(?:\.\d+)?)[\s ]*(?:GT|GRT)",
+        "DWT": r"(\d{1,3}(?:,\d{3})*(?:\.\d+)?)[\s ]*(?:t[\s ]*)?DWT",
+    }
+
+    def similar_values(details, name1, name2):
+        value = details.get(name1, "")
+        if value:
+            match = re.search(r"\d+\.?\d*\s*m", value, re.IGNORECASE)
+            if match:
+                return match.group(0)
+        return details.get(name2, "Missing")
+
+    def tonnage(details, backup_field, pattern):
+        direct_value = details.get(backup_field)
+        if direct_value and direct_value != "Missing":
+            return str(direct_value)
+        match = re.search(tonnage_patterns[pattern], details.get("Tonnage", ""), re.IGNORECASE)
+        return match.group(1).replace(",", "") if match else "Missing"
+
+    rows = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for imo_number, details in data.items():
+            rows.append({
+                "IMO_number": imo_number,
+                "built_year": details.get("Completed") or details.get("Built year", "Missing"),
+                "length": similar_values(details, "Length", "Length (m)"),
+                "beam": similar_values(details, "Beam", "Breadth (m)"),
+                "gross_tonnage": tonnage(details, "grossTonnage", "GT"),
+                "dwt": tonnage(details, "deadweight", "DWT"),
+            })
+
+    df = pd.DataFrame(rows)
+    regex_pattern = r"(\d+(\.\d+)?)\s*m"
+    df["length (m)"] = df["length"].str.extract(regex_pattern)[0].astype(float)
+    df["beam (m)"] = df["beam"].str.extract(regex_pattern)[0].astype(float)
+    df["built_year"] = pd.to_datetime(df["built_year"], format="mixed", errors="coerce").dt.year
+
+    return df.drop(["length", "beam"], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = make_sources(args.records, tmp_dir)
+
+        start = time.perf_counter()
+        per_record(paths)
+        per_record_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed = parse_ship_particulars(load_ship_particulars(paths))
+        columnar_time = time.perf_counter() - start
+
+    print(f"{args.records:,} records")
+    print(f"per record: {per_record_time:8.3f} s")
+    print(f"columnar:   {columnar_time:8.3f} s")
+    print(f"speed-up:   {per_record_time / columnar_time:8.1f}x")
+    print(extraction_coverage(parsed))
+
+
+if __name__ == "__main__":
+    main()
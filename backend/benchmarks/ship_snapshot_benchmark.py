@@ -0,0 +1,85 @@
+"""Benchmarks the point lookups of the ship data endpoint: the memory-mapped Arrow snapshot
+against the latest-version query on DuckDB (the local stand-in for Athena).
+
+Usage (from the backend directory):
+    python -m benchmarks.ship_snapshot_benchmark --ships 20000 --years 6
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.api.query_backend import DuckDBBackend, latest_data_cte
+from app.api.ship_snapshot import ShipSnapshotReader
+from src.serving_artifacts import publish_ship_snapshot, read_latest_clean_data
+from src.utils.data.ship_registry import format_dataset_version
+
+
+def write_clean_table(directory: str, ships: int, years: int, rng: np.random.Generator):
+    imo_numbers = np.arange(9000000, 9000000 + ships)
+    for year in range(2018, 2018 + years):
+        for version in (1, 2):
+            report = pd.DataFrame({
+                "imo_number": imo_numbers,
+                "name": [f"SHIP {imo_number}" for imo_number in imo_numbers],
+                "ship_type": rng.choice(["Container ship", "Oil tanker", "Bulk carrier"], ships),
+                "reporting_period": year,
+                "total_co2_emissions": rng.uniform(1000, 100000, ships),
+                "total_fuel_consumption": rng.uniform(300, 30000, ships),
+                "annual_average_co2_emissions_per_distance": rng.uniform(50, 2000, ships),
+            })
+            partition = os.path.join(directory, f"year={year}", f"version={version}")
+            os.makedirs(partition)
+            report.to_parquet(os.path.join(partition, "part-00000.snappy.parquet"), index=False)
+
+    return imo_numbers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ships", type=int, default=20000)
+    parser.add_argument("--years", type=int, default=6)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clean_path, serving_path = os.path.join(tmp_dir, "clean"), os.path.join(tmp_dir, "serving")
+        imo_numbers = write_clean_table(clean_path, args.ships, args.years, rng)
+
+        start = time.perf_counter()
+        table, latest = read_latest_clean_data(clean_path)
+        publish_ship_snapshot(table, serving_path, format_dataset_version(latest))
+        publish_time = time.perf_counter() - start
+
+        reader = ShipSnapshotReader(serving_path)
+        start = time.perf_counter()
+        reader.lookup(imo_numbers[0])
+        open_time = time.perf_counter() - start
+
+        sample = rng.choice(imo_numbers, args.lookups)
+        start = time.perf_counter()
+        for imo_number in sample:
+            reader.lookup(imo_number)
+        lookup_time = (time.perf_counter() - start) / args.lookups
+
+        backend = DuckDBBackend("ship-emissions-database", "clean_emissions", clean_path)
+        cte = latest_data_cte("ship-emissions-database", "clean_emissions")
+        start = time.perf_counter()
+        for imo_number in sample[:args.queries]:
+            backend.execute(cte + f"SELECT * FROM latest_data WHERE imo_number={imo_number} ORDER BY reporting_period DESC")
+        query_time = (time.perf_counter() - start) / args.queries
+
+    print(f"{table.num_rows:,} latest version rows of {args.ships:,} ships")
+    print(f"publish:         {publish_time * 1e3:10.1f} ms")
+    print(f"first lookup:    {open_time * 1e6:10.1f} us (maps the snapshot)")
+    print(f"snapshot lookup: {lookup_time * 1e6:10.1f} us")
+    print(f"duckdb query:    {query_time * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmarks the per-row and the vectorized synthetic voyage generation.
+
+Usage (from the backend directory):
+    python -m benchmarks.voyage_generation_benchmark --ships 15000 --years 6
+    python -m benchmarks.voyage_generation_benchmark --ships 2000000 --sharded-output /tmp/voyages
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_generation.generate_voyage_data import VoyageDataGenerator
+
+
+def make_vessels(ships: int, generator: VoyageDataGenerator) -> pd.DataFrame:
+    ship_types = np.array(list(generator.vessel_types))
+    return pd.DataFrame({
+        "imo_number": np.arange(9000000, 9000000 + ships),
+        "ship_type": ship_types[np.arange(ships) % len(ship_types)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ships", type=int, default=15000)
+    parser.add_argument("--years", type=int, default=6)
+    parser.add_argument("--skip-per-row", action="store_true")
+    parser.add_argument("--sharded-output", help="generate sharded Parquet files in this directory instead")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    generator = VoyageDataGenerator()
+    vessels = make_vessels(args.ships, generator)
+    years = range(2018, 2018 + args.years)
+
+    if args.sharded_output:
+        start = time.perf_counter()
+        paths = generator.generate_fleet_data_sharded(vessels, years, args.sharded_output, seed=0, workers=args.workers)
+        print(f"sharded:    {len(vessels) * args.years:>11,} rows in {time.perf_counter() - start:8.3f} s ({len(paths)} files)")
+        return
+
+    start = time.perf_counter()
+    vectorized = generator.generate_fleet_data_vectorized(vessels, years, seed=0)
+    vectorized_time = time.perf_counter() - start
+    print(f"vectorized: {len(vectorized):>11,} rows in {vectorized_time:8.3f} s")
+
+    if not args.skip_per_row:
+        start = time.perf_counter()
+        per_row = generator.generate_fleet_data(vessels, years)
+        per_row_time = time.perf_counter() - start
+        print(f"per row:    {len(per_row):>11,} rows in {per_row_time:8.3f} s")
+        print(f"speed-up:   {per_row_time / vectorized_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,27 +2,85 @@ import os
 import boto3
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from typing import Dict, List, Optional, Tuple
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
 load_dotenv()
 
+MB = 1024 * 1024
+
+
 class AWSStorageManager():
-    def __init__(self):
+    """Transfer layer for the S3 bucket. A single client is created per manager and shared
+    by all the transfers (boto3 clients are thread safe), so the connections are pooled.
+    Objects bigger than the multipart threshold are moved with concurrent multipart
+    uploads and ranged downloads.
+    """
+
+    def __init__(
+        self,
+        max_pool_connections: int = 50,
+        max_workers: int = 10,
+        multipart_threshold: int = 8 * MB,
+        multipart_chunksize: int = 8 * MB,
+    ):
+        self.bucket_name = os.environ.get("BUCKET_NAME")
+        self.max_workers = max_workers
         self.client = boto3.client(
-            's3', 
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY'], 
-            aws_secret_access_key=os.environ['AWS_SECRET_KEY'], 
-            region_name=os.environ['REGION_NAME']
+            's3',
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY'],
+            aws_secret_access_key=os.environ['AWS_SECRET_KEY'],
+            region_name=os.environ['REGION_NAME'],
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+            config=Config(max_pool_connections=max_pool_connections),
         )
-    
-    def download_file_from_bucket(self, bucket_layer:str, blob_name: str):
-        self.client.download_file(
-            os.environ["BUCKET_NAME"], f"{bucket_layer}/{blob_name}", "reports_metadata.csv"
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_workers,
         )
-        reports_df_old = pd.read_csv("reports_metadata.csv")
-        return reports_df_old
-    
+
+    def download_bytes(self, key: str, bucket: Optional[str] = None) -> bytes:
+        """Downloads an object into memory
+
+        Args:
+            key (str): the key of the object
+            bucket (str, optional): the bucket, defaults to BUCKET_NAME
+
+        Returns:
+            bytes: the contents of the object
+        """
+        buffer = BytesIO()
+        self.client.download_fileobj(
+            bucket or self.bucket_name, key, buffer, Config=self.transfer_config
+        )
+        return buffer.getvalue()
+
+    def download_file_from_bucket(self, bucket_layer: str, blob_name: str) -> pd.DataFrame:
+        """Downloads a file into memory and creates a pandas dataframe, without writing
+        anything on the local disk
+
+        Args:
+            bucket_layer (str): the prefix of the file in the bucket
+            blob_name (str): the name of the file
+
+        Returns:
+            pd.DataFrame: a dataframe with the contents of the file
+        """
+        contents = self.download_bytes(f"{bucket_layer}/{blob_name}")
+
+        if blob_name.lower().endswith('.xlsx'):
+            return pd.read_excel(BytesIO(contents), engine="openpyxl", header=2)
+        elif blob_name.lower().endswith('.parquet'):
+            return pd.read_parquet(BytesIO(contents))
+
+        return pd.read_csv(BytesIO(contents))
+
     def upload_file(self, file_name, bucket, object_name=None):
         """
         Upload a file to an S3 bucket
@@ -33,39 +91,74 @@ class AWSStorageManager():
         :return: True if file was uploaded, else False
         """
 
-
         # If S3 object_name was not specified, use file_name
         if object_name is None:
             object_name = os.path.basename(file_name)
 
-        s3_client = boto3.client(
-            "s3", 
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY'], 
-            aws_secret_access_key=os.environ['AWS_SECRET_KEY'], 
-            region_name=os.environ['REGION_NAME']
-        )
-
         try:
-            # logger.info(
-            #     f"Uploading the file: {file_name} to the bucket: {bucket} with object name: {object_name}"
-            # )
-
-            s3_client.upload_file(file_name, bucket, object_name)
-        except ClientError as e:
-            # logger.error(e)
+            self.client.upload_file(file_name, bucket, object_name, Config=self.transfer_config)
+        except ClientError:
             return False
         return True
-    
-    
-    def upload_csv_to_s3(self):
-        reports_df_updated.to_csv("reports_metadata.csv", index=False)
 
+    def upload_bytes(self, data: bytes, key: str, bucket: Optional[str] = None, content_type: Optional[str] = None):
+        """Uploads the contents of an in-memory buffer to the bucket
+
+        Args:
+            data (bytes): the contents of the object
+            key (str): the key of the object
+            bucket (str, optional): the bucket, defaults to BUCKET_NAME
+            content_type (str, optional): the content type of the object
+        """
+        extra_args = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(
+            BytesIO(data),
+            bucket or self.bucket_name,
+            key,
+            ExtraArgs=extra_args,
+            Config=self.transfer_config,
+        )
+
+    def upload_csv_to_s3(self, dataframe: pd.DataFrame, key: str = "raw/reports_metadata.csv"):
+        """Uploads a dataframe as a CSV file to the bucket
+
+        Args:
+            dataframe (pd.DataFrame): the dataframe to upload
+            key (str): the key of the CSV file in the bucket
+        """
         csv_buffer = StringIO()
-        reports_df_updated.to_csv(csv_buffer, index=False)
-
-        # Upload the CSV to S3
-        s3.put_object(
-            Bucket=os.environ["BUCKET_NAME"],
-            Key=f"raw/reports_metadata.csv",
-            Body=csv_buffer.getvalue(),
-        )
\ No newline at end of file
+        dataframe.to_csv(csv_buffer, index=False)
+
+        self.upload_bytes(csv_buffer.getvalue().encode("utf-8"), key=key, content_type="text/csv")
+
+    def upload_many(self, files: List[Tuple[str, str]], bucket: Optional[str] = None) -> Dict[str, bool]:
+        """Uploads many local files concurrently through the shared client
+
+        Args:
+            files (List[Tuple[str, str]]): pairs of (local file path, object key)
+            bucket (str, optional): the bucket, defaults to BUCKET_NAME
+
+        Returns:
+            Dict[str, bool]: for every key, True if the file was uploaded
+        """
+        bucket = bucket or self.bucket_name
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(
+                lambda file_: self.upload_file(file_[0], bucket, file_[1]), files
+            )
+            return {key: uploaded for (_, key), uploaded in zip(files, results)}
+
+    def download_many(self, keys: List[str], bucket: Optional[str] = None) -> Dict[str, bytes]:
+        """Downloads many objects concurrently into memory through the shared client
+
+        Args:
+            keys (List[str]): the keys of the objects
+            bucket (str, optional): the bucket, defaults to BUCKET_NAME
+
+        Returns:
+            Dict[str, bytes]: the contents of every object keyed by the object key
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            contents = executor.map(lambda key: self.download_bytes(key, bucket), keys)
+            return dict(zip(keys, contents))
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import time
@@ -6,9 +7,13 @@ import traceback
 import boto3
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from io import BufferedIOBase
 from sys import stdout
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -17,6 +22,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 from dotenv import load_dotenv
 from src.google_cloud_storage_manager import GoogleCloudStorageManager
+from src.object_store import GCSObjectStore, ObjectStore
 
 
 load_dotenv()
@@ -31,6 +37,20 @@ consoleHandler = logging.StreamHandler(stdout)
 consoleHandler.setFormatter(logFormatter)
 logger.addHandler(consoleHandler)
 
+# Columns of the raw report that are kept as integers in the interim Parquet file.
+# Every column with a unit in brackets (e.g. "[m tonnes]") is a metric and is stored
+# as a double, the rest of the columns are stored as strings.
+INTERIM_INTEGER_COLUMNS = ["IMO Number", "Reporting Period"]
+
+S3_MAX_POOL_CONNECTIONS = 20
+# The interim Parquet file is written in row groups of INTERIM_ROW_GROUP_SIZE rows and sent
+# to S3 while it is written, in parts of INTERIM_PART_SIZE bytes (S3 needs at least 5 MiB)
+INTERIM_ROW_GROUP_SIZE = 10000
+INTERIM_PART_SIZE = 8 * 1024 * 1024
+INTERIM_MAX_CONCURRENCY = 10
+
+_s3_client = None
+
 
 def prepare_selenium_params():
     options = webdriver.ChromeOptions()
@@ -176,8 +196,173 @@ def fix_column_types(df):
 
     return df
 
+def get_s3_client():
+    """Returns the S3 client of the process. It is created on the first call and
+    reused afterwards so that all the uploads share the same connection pool.
+    """
+    global _s3_client
+
+    if _s3_client is None:
+        _s3_client = boto3.client(
+            "s3",
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY'],
+            aws_secret_access_key=os.environ['AWS_SECRET_KEY'],
+            region_name=os.environ['REGION_NAME'],
+            config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS),
+        )
+
+    return _s3_client
+
+
+class MultipartUploadStream(BufferedIOBase):
+    """Writable file object that sends what is written to it to S3 as a multipart upload,
+    so a file can be uploaded while it is written without keeping all of it in memory.
+
+    Every `part_size` bytes are uploaded as a part in a thread pool while the writing goes
+    on, with at most `max_concurrency` parts in memory. The upload is completed on close,
+    and aborted if the writing fails. A file smaller than a part is sent with a single PUT.
+    """
+
+    def __init__(self, client, bucket, key, content_type, part_size=INTERIM_PART_SIZE, max_concurrency=INTERIM_MAX_CONCURRENCY):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.upload_id = None
+        self._buffer = bytearray()
+        self._position = 0
+        self._parts = []
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+        return len(data)
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )["UploadId"]
+
+        # wait for the oldest part so that at most max_concurrency parts are in memory
+        if len(self._parts) >= self.max_concurrency:
+            self._parts[-self.max_concurrency].result()
+
+        number = len(self._parts) + 1
+        self._parts.append(self._executor.submit(
+            self.client.upload_part,
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=body,
+        ))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type
+                )
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                parts = [
+                    {"PartNumber": number, "ETag": part.result()["ETag"]}
+                    for number, part in enumerate(self._parts, start=1)
+                ]
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+    def abort(self):
+        """Drops the parts uploaded so far"""
+        if self.upload_id is not None:
+            for part in self._parts:
+                part.cancel()
+            self._executor.shutdown()
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
+        self._buffer.clear()
+        super().close()
+
+
+def build_interim_schema(columns):
+    """Builds the explicit Arrow schema of the interim report so that Glue
+    does not have to infer the column types.
+
+    Args:
+        columns (list): the column names of the raw report
+
+    Returns:
+        pa.Schema: integer columns for the IMO number and the reporting period, doubles for
+        the metrics and strings for everything else
+    """
+    fields = []
+    for column in columns:
+        if column in INTERIM_INTEGER_COLUMNS:
+            fields.append(pa.field(column, pa.int64()))
+        elif "[" in column:
+            fields.append(pa.field(column, pa.float64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+
+    return pa.schema(fields)
+
+
+def prepare_interim_table(df):
+    """Casts the raw report to the interim schema. Values that are not numbers in the
+    metric columns (e.g. "Division by zero!") become nulls.
+
+    Args:
+        df (DataFrame): the raw report as it was read from the excel file
+
+    Returns:
+        pa.Table: the report with the interim schema
+    """
+    schema = build_interim_schema(df.columns)
+    df = df.copy()
+
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype("float64")
+        else:
+            df[field.name] = df[field.name].astype("string")
+
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
 def change_format_and_upload_to_interim_bucket(filepath, bucket_name, s3_file_name):
-    logger.info("Change the file to CSV and upload it to S3")
+    """Converts the excel report to Parquet with an explicit schema and uploads it to
+    the interim location in S3. The report is converted in row groups, and the Parquet
+    file is sent as a multipart upload while it is written, so it is never held in memory
+    as a whole.
+
+    Args:
+        filepath (str): the path of the excel report on disk
+        bucket_name (str): the S3 bucket
+        s3_file_name (str): the key of the Parquet file in the bucket
+    """
+    logger.info("Change the file to Parquet and upload it to S3")
 
     df_raw = pd.read_excel(filepath, engine="openpyxl", header=2)
     df_raw.drop(["Verifier Address"], axis=1, inplace=True)
@@ -185,27 +370,74 @@ def change_format_and_upload_to_interim_bucket(filepath, bucket_name, s3_file_na
     logger.info(f"File size: {df_raw.shape}")
     logger.info(f"Header")
     logger.info(df_raw.head())
-    
-    s3_client = boto3.client(
-        "s3", 
-        aws_access_key_id=os.environ['AWS_ACCESS_KEY'], 
-        aws_secret_access_key=os.environ['AWS_SECRET_KEY'], 
-        region_name=os.environ['REGION_NAME']
-    )
-    
-    try:
-        # Convert dataframe to CSV
-        csv_buffer = StringIO()
-        df_raw.to_csv(csv_buffer, index=False)
 
-        # Upload the CSV to S3
-        s3_client.put_object(
-            Bucket=bucket_name, Key=s3_file_name, Body=csv_buffer.getvalue()
+    s3_client = get_s3_client()
+    schema = build_interim_schema(df_raw.columns)
+
+    try:
+        stream = MultipartUploadStream(
+            s3_client, bucket_name, s3_file_name, "application/vnd.apache.parquet",
+            part_size=INTERIM_PART_SIZE, max_concurrency=INTERIM_MAX_CONCURRENCY,
         )
+        try:
+            with pq.ParquetWriter(stream, schema, compression="snappy") as writer:
+                for start in range(0, len(df_raw), INTERIM_ROW_GROUP_SIZE):
+                    writer.write_table(prepare_interim_table(df_raw.iloc[start:start + INTERIM_ROW_GROUP_SIZE]))
+        except BaseException:
+            stream.abort()
+            raise
+        stream.close()
 
     except ClientError as e:
         logger.error(e)
 
+def read_local_file(filepath):
+    with open(filepath, "rb") as f:
+        return f.read()
+
+
+async def upload_report(store: ObjectStore, filepath: str, year: str, filename: str):
+    """Uploads a downloaded report to the bronze location, marked as not processed by the ETL,
+    and deletes the local copy"""
+    logger.info(f"Uploading {filename} to the bronze bucket")
+
+    contents = await asyncio.to_thread(read_local_file, filepath)
+    await store.put(
+        f"bronze-bucket/{year}/{filename}",
+        contents,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        metadata={'processed_by_ETL': False},
+    )
+
+    delete_file_from_local_directory(filepath=filepath)
+
+
+async def download_and_upload_new_reports(store: ObjectStore, new_files, download_directory):
+    """Downloads the new reports with the browser one at a time. The upload of every report
+    runs in the background while the browser downloads the next one.
+
+    Args:
+        store (ObjectStore): the store of the bronze location
+        new_files (list): the names of the new reports
+        download_directory (str): the directory where the browser saves the files
+    """
+    uploads = []
+
+    for new_file_name in new_files:
+        logger.info(f"Processing file {new_file_name}")
+
+        new_file_name = new_file_name.strip()
+        await asyncio.to_thread(download_new_file, report=new_file_name)
+
+        filepath = f"{download_directory}/{new_file_name}.xlsx"
+        year = new_file_name.split("-")[0]
+        filename = f"{new_file_name}.xlsx"
+
+        uploads.append(asyncio.create_task(upload_report(store, filepath, year, filename)))
+
+    await asyncio.gather(*uploads)
+
+
 def main():
     logger.info("Getting the new metadata from the reports table")
     reports_df_new = get_reporting_table_content()
@@ -229,30 +461,13 @@ def main():
         new_files = df_with_new_versions["File"].to_list()
         logger.info(f"Found {len(new_files)} new files that need to be downloaded")
 
-        for new_file_name in new_files:
-            logger.info(f"Processing file {new_file_name}")
-
-            new_file_name = new_file_name.strip()
-            download_new_file(report=new_file_name)
-
-            filepath = f"{download_directory}/{new_file_name}.xlsx"
-            year = new_file_name.split("-")[0]
-            filename = f"{new_file_name}.xlsx"
-            
-            cloud_storage.upload_file(
-                bucket_layer='bronze-bucket', 
-                source_file=filepath,
-                destination_blob_name=f"{year}/{filename}"
+        asyncio.run(
+            download_and_upload_new_reports(
+                store=GCSObjectStore(cloud_storage),
+                new_files=new_files,
+                download_directory=download_directory,
             )
-            
-            logger.info('Updating the metadata of the files')
-            blob = cloud_storage.bucket.get_blob(f"{'bronze-bucket'}/{year}/{filename}")
-            metageneration_match_precondition = None
-            metadata = {'processed_by_ETL': False}
-            blob.metadata = metadata
-            blob.patch(if_metageneration_match=metageneration_match_precondition)
-
-            delete_file_from_local_directory(filepath=filepath)
+        )
                     
     logger.info("Saving the updated reports metadata on GCS")
     
@@ -1,138 +1,216 @@
+import hashlib
+import importlib.metadata
 import json
-import re
+import os
+import numpy as np
 import pandas as pd
-
-from src.utils.data import fetch_ship_ids
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.data.fetch_ship_ids import fetch_ship_ids
+from src.data_generation.ship_particulars_parser import (
+    attach_imo_numbers,
+    extract_metres,
+    extract_year,
+    extraction_coverage,
+    load_ship_particulars,
+    parse_ship_particulars,
+)
 from dotenv import load_dotenv
-from dataclasses import dataclass
-
-from sdv.metadata import Metadata
-from sdv.single_table import GaussianCopulaSynthesizer
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
 
 load_dotenv()
 
+SYNTHESIZER_DIRECTORY = os.environ.get("SYNTHESIZER_DIRECTORY", "../data/models")
 
-@dataclass
-class ShipTechnicalSpecs:
-    IMO_number: str
-    built_year: str
-    length: str
-    beam: str
-    gross_tonnage: str
-    dwt: str
-
-
-def extract_field(value, field_name):
-    pattern = {
-        "IMO": r"IMO number:\s*(\d+)",
-        "Call Sign": r"Call\s?sign[:\s]*([A-Za-z0-9]+)",
-        "MMSI": r"MMSI number[:\s]*([A-Za-z0-9]+)",
-        "GT": r"(\d{1,3}(?:,\d{3})*(?:\.\d+)?)[\s\u00A0]*(?:GT|GRT)",
-        "NT": r"(\d{1,3}(?:,\d{3})*(?:\.\d+)?)[\s\u00A0]*NT",
-        "DWT": r"(\d{1,3}(?:,\d{3})*(?:\.\d+)?)[\s\u00A0]*(?:t[\s\u00A0]*)?DWT",
-    }
-    match = re.search(pattern.get(field_name, ""), value, re.IGNORECASE)
-    if match:
-        return match.group(1).replace(",", "")
-    return "N/A"
-
-
-def get_year(ship_details, name1: str, name2: str):
-    year_of_completion = ship_details.get(name1, "")
-    if year_of_completion:
-        return year_of_completion
-
-    return ship_details.get(name2, "Missing")
-
-
-def get_similar_values(ship_details, name1: str, name2: str):
-    beam = ship_details.get(name1, "")
-    if beam:
-        match = re.search(r"\d+\.?\d*\s*m", beam, re.IGNORECASE)
-        if match:
-            return match.group(0)
-
-    return ship_details.get(name2, "Missing")
-
-
-def get_tonnage_value(ship_details, primary_field, backup_field, regex_pattern):
-    direct_value = ship_details.get(backup_field)
-    if direct_value and direct_value != "Missing":
-        return str(direct_value)
-
-    tonnage = ship_details.get("Tonnage", "")
-    if tonnage:
-        extracted = extract_field(tonnage, regex_pattern)
-        if extracted != "N/A":
-            return extracted
-
-    return "Missing"
-
-
-def process_ship_data(ship_data):
-    processed_data = []
-
-    for imo_number, ship_details in ship_data.items():
-        imo_number = imo_number
-        built_year = get_year(ship_details, "Completed", "Built year")
-        length = get_similar_values(ship_details, "Length", "Length (m)")
-        beam = get_similar_values(ship_details, "Beam", "Breadth (m)")
-        gross_tonnage = get_tonnage_value(ship_details, "Tonnage", "grossTonnage", "GT")
-        deadweight = get_tonnage_value(ship_details, "DWT", "deadweight", "DWT")
-
-        ship = ShipTechnicalSpecs(
-            IMO_number=imo_number,
-            built_year=built_year,
-            length=length,
-            beam=beam,
-            gross_tonnage=gross_tonnage,
-            dwt=deadweight,
-        )
-        processed_data.append(ship)
-    return processed_data
+# the versions of sdv (major.minor) whose synthesizers seed_synthesizer was checked on
+SEEDABLE_SDV_VERSIONS = ("1.17",)
 
+# The synthesizer loaded by every sampling process
+_worker_synthesizer = None
 
-def fix_column_values_and_types(df):
-    regex_pattern = r"(\d+(\.\d+)?)\s*m"
-    df["length (m)"] = df["length"].str.extract(regex_pattern)[0]
-    df["beam (m)"] = df["beam"].str.extract(regex_pattern)[0]
 
-    df["built_year"] = pd.to_datetime(df["built_year"])
-    df["year"] = df["built_year"].dt.year
+def fix_column_values_and_types(df):
+    df["length (m)"] = extract_metres(df["length"])
+    df["beam (m)"] = extract_metres(df["beam"])
+    df["year"] = extract_year(df["built_year"])
 
     df.drop(["built_year", "length", "beam"], axis=1, inplace=True)
     df.rename(columns={"year": "built_year", "dwt": "dwt (tonnes)"}, inplace=True)
 
-    df["length (m)"] = df["length (m)"].astype(float)
-    df["beam (m)"] = df["beam (m)"].astype(float)
-
     return df
 
 
-def generate_synthetic_data(df):
+def training_data_fingerprint(df: pd.DataFrame) -> str:
+    """Hashes the contents, the column names and the types of the training data, so a
+    fitted synthesizer can be reused as long as the training data does not change
+
+    Args:
+        df (pd.DataFrame): the training data
+
+    Returns:
+        str: the sha256 hex digest of the data
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[column, str(dtype)] for column, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+
+    return digest.hexdigest()
+
+
+def synthesizer_path(df: pd.DataFrame, directory: str = SYNTHESIZER_DIRECTORY) -> str:
+    return os.path.join(directory, f"ship_specs_synthesizer_{training_data_fingerprint(df)[:16]}.pkl")
+
+
+def load_or_fit_synthesizer(df: pd.DataFrame, directory: str = SYNTHESIZER_DIRECTORY) -> str:
+    """Fits a GaussianCopulaSynthesizer on the training data and saves it, unless a
+    synthesizer fitted on the same data was already saved
+
+    Args:
+        df (pd.DataFrame): the training data
+        directory (str): the directory of the saved synthesizers
+
+    Returns:
+        str: the path of the saved synthesizer
+    """
+    path = synthesizer_path(df, directory)
+    if os.path.exists(path):
+        return path
+
+    # sdv is only installed with the data generation scripts (data_generation/requirements.txt)
+    from sdv.metadata import Metadata
+    from sdv.single_table import GaussianCopulaSynthesizer
+
     # create the metadata first
     metadata = Metadata.detect_from_dataframe(data=df, table_name="ship_specs")
 
     synthesizer = GaussianCopulaSynthesizer(metadata)
     synthesizer.fit(df)
 
-    synthetic_data = synthesizer.sample(num_rows=20795)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    synthesizer.save(tmp_path)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_synthesizer(path: str):
+    """Loads a synthesizer saved by load_or_fit_synthesizer"""
+    from sdv.single_table import GaussianCopulaSynthesizer
+
+    return GaussianCopulaSynthesizer.load(path)
+
+
+def seed_synthesizer(synthesizer, seed: int):
+    """Sets the random state of a synthesizer before sampling. The sdv synthesizers reseed
+    themselves with a fixed seed in sample() unless their random state was set, and only
+    the private _set_random_state sets it, so it is only called on the versions of sdv it
+    was checked on (SEEDABLE_SDV_VERSIONS). Other synthesizers have a set_random_state method.
+
+    Args:
+        synthesizer: the synthesizer to seed
+        seed (int): the seed
+    """
+    if type(synthesizer).__module__.split(".")[0] != "sdv":
+        synthesizer.set_random_state(seed)
+        return
+
+    sdv_version = importlib.metadata.version("sdv")
+    if ".".join(sdv_version.split(".")[:2]) not in SEEDABLE_SDV_VERSIONS:
+        raise RuntimeError(
+            f"The seeding of the synthesizers was not checked on sdv {sdv_version}, "
+            "see src/data_generation/requirements.txt"
+        )
+    synthesizer._set_random_state(seed)
+
+
+def _load_worker_synthesizer(path: str, loader: Callable[[str], object]):
+    global _worker_synthesizer
+    _worker_synthesizer = loader(path)
+
+
+def _sample_chunk(imo_numbers: np.ndarray, seed: int) -> pd.DataFrame:
+    """Samples the specs of a chunk of ships. The random state is reset with the seed of
+    the chunk, so a chunk is the same whatever the process that samples it."""
+    seed_synthesizer(_worker_synthesizer, seed)
+    chunk = _worker_synthesizer.sample(num_rows=len(imo_numbers))
+    chunk.insert(0, "imo_number", imo_numbers)
+
+    return chunk.drop(columns=["IMO_number"], errors="ignore")
+
+
+def sample_synthetic_specs(
+    path: str,
+    imo_numbers,
+    output_path: str,
+    seed: int = 0,
+    chunk_size: int = 5000,
+    workers: Optional[int] = None,
+    loader: Callable[[str], object] = load_synthesizer,
+) -> str:
+    """Samples synthetic specs for the IMO numbers in chunks, in parallel processes, and
+    streams the chunks into a Parquet file in the order of the IMO numbers
+
+    Args:
+        path (str): the path of the saved synthesizer
+        imo_numbers: the IMO numbers of the ships without specs
+        output_path (str): the Parquet file to write
+        seed (int): the seed from which the seed of every chunk is derived
+        chunk_size (int): the number of ships sampled at once
+        workers (int, optional): the number of processes, defaults to the number of CPUs
+        loader (Callable, optional): loads the synthesizer in every process, a module level
+            function so it can be sent to the processes
+
+    Returns:
+        str: the path of the Parquet file
+    """
+    imo_numbers = np.asarray(imo_numbers)
+    if len(imo_numbers) == 0:
+        # no chunk would be sampled, so no file would be written
+        raise ValueError("No IMO numbers to sample specs for")
+    chunks = [imo_numbers[start:start + chunk_size] for start in range(0, len(imo_numbers), chunk_size)]
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(len(chunks))]
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    writer = None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_load_worker_synthesizer, initargs=(path, loader)
+        ) as executor:
+            for chunk in executor.map(_sample_chunk, chunks, seeds):
+                chunk["synthetic"] = True
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(output_path, table.schema, compression="snappy")
+                else:
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return output_path
+
+
+def generate_synthetic_data(df, num_rows: int = 20795):
+    synthesizer = load_synthesizer(load_or_fit_synthesizer(df))
+    synthetic_data = synthesizer.sample(num_rows=num_rows)
 
     return synthetic_data
 
 
-def extract_data_from_sources():
+def extract_data_from_sources(ships: Optional[pd.DataFrame] = None):
     file_names = ["wikipedia_ship_data_v2", "pleiades_fleet_v2"]
-    dataframes = []
 
-    for name in file_names:
-        with open(f"../data/raw/ship_particulars/{name}.json", "r") as f:
-            data = json.load(f)
-            processed_data = process_ship_data(data)
-            output_data = [ship.__dict__ for ship in processed_data]
-            dataframes.append(pd.DataFrame(output_data))
+    raw = load_ship_particulars(f"../data/raw/ship_particulars/{name}.json" for name in file_names)
+    df = parse_ship_particulars(raw)
+    if ships is not None:
+        # the sources keyed by ship name are joined to the EU-MRV ships by name
+        df = attach_imo_numbers(df, ships)
+    print(extraction_coverage(df))
 
-    df = pd.concat(dataframes, ignore_index=True)
     df.to_csv("../../data/processed/ship_specs_sample.csv", index=False)
 
     return df
@@ -147,12 +225,21 @@ def main():
     imo_numbers_for_synthetic_data = unique_ship_ids[
         ~unique_ship_ids["imo_number"].isin(full_data["IMO_number"].to_list())
     ].reset_index(drop=True)
-    imo_numbers_for_synthetic_data.shape
 
-    synthetic_data = generate_synthetic_data(full_data)
-    synthetic_data = imo_numbers_for_synthetic_data.join(synthetic_data)
-    synthetic_data["synthetic"] = True
-    synthetic_data.drop(["IMO_number"], axis=1, inplace=True)
+    # every ship may have ground truth specs, then nothing is sampled (concat drops None)
+    synthetic_data = None
+    if not imo_numbers_for_synthetic_data.empty:
+        # the synthesizer is only refitted when the ground truth changes
+        path = load_or_fit_synthesizer(full_data)
+        synthetic_path = sample_synthetic_specs(
+            path,
+            imo_numbers_for_synthetic_data["imo_number"],
+            "../data/processed/ship_technical_specs_synthetic.parquet",
+            seed=int(os.environ.get("SHIP_SPECS_SEED", 0)),
+        )
+        synthetic_data = imo_numbers_for_synthetic_data.join(
+            pd.read_parquet(synthetic_path).drop(columns=["imo_number"])
+        )
 
     # prepare the ground truth dataset to combine it
     full_data = full_data.rename(columns={"IMO_number": "imo_number"})
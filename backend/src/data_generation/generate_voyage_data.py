@@ -1,14 +1,92 @@
 import os
-import boto3
 
 import pandas as pd
 import numpy as np
-import awswrangler as wr
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from concurrent.futures import ProcessPoolExecutor
 
 from dotenv import load_dotenv
+from src.utils.data.fetch_ship_ids import fetch_ship_ids_and_types
 
 load_dotenv()
 
+ROUTE_TYPES = np.array(["Short-haul", "Long-haul", "Transoceanic"])
+WEATHER_CONDITIONS = np.array(["Calm", "Moderate", "Rough"])
+
+# Number of uniform draws used to generate one vessel-year in the vectorized path
+DRAWS_PER_ROW = 9
+
+VOYAGE_SCHEMA = pa.schema([
+    ("imo_number", pa.int64()),
+    ("reporting_period", pa.int64()),
+    ("ship_type", pa.string()),
+    ("Total_Port_Calls", pa.int64()),
+    ("EU_Port_Calls", pa.int64()),
+    ("Non_EU_Port_Calls", pa.int64()),
+    ("Total_Distance", pa.float64()),
+    ("Distance_EU_Waters", pa.float64()),
+    ("Distance_Non_EU_Waters", pa.float64()),
+    ("Average_Trip_Distance", pa.float64()),
+    ("Laden_Voyages", pa.int64()),
+    ("Ballast_Voyages", pa.int64()),
+    ("Days_At_Sea", pa.float64()),
+    ("Average_Port_Stay", pa.float64()),
+    ("Route_Type", pa.string()),
+    ("Weather_Conditions", pa.string()),
+])
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(values):
+    """SplitMix64 finaliser, applied element-wise on uint64 arrays (the products wrap around)"""
+    z = values + _GOLDEN_GAMMA
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def counter_based_uniforms(seed, imo_numbers, years, draws=DRAWS_PER_ROW):
+    """Draws uniforms in [0, 1) from a random stream that is derived only from
+    (seed, imo_number, year). The values of a vessel-year are therefore the same
+    whichever process, shard or batch generates it.
+
+    Args:
+        seed (int): the seed of the run
+        imo_numbers (np.ndarray): the IMO number of every row
+        years (np.ndarray): the reporting period of every row
+        draws (int): the number of uniforms per row
+
+    Returns:
+        np.ndarray: a (rows, draws) matrix of uniforms
+    """
+    seed_key = _splitmix64(np.array([seed], dtype=np.uint64))
+    keys = _splitmix64(seed_key ^ np.asarray(imo_numbers, dtype=np.uint64))
+    keys = _splitmix64(keys ^ np.asarray(years, dtype=np.uint64))
+
+    counters = keys[:, None] + _GOLDEN_GAMMA * np.arange(1, draws + 1, dtype=np.uint64)
+    # the 53 high bits make a double in [0, 1)
+    return (_splitmix64(counters) >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+def _generate_shard(shard_vessels, years, seed, path, row_group_vessels):
+    """Generates the voyage data of a shard of vessels and streams it to a Parquet
+    file, one row group per `row_group_vessels` vessels."""
+    generator = VoyageDataGenerator()
+
+    with pq.ParquetWriter(path, VOYAGE_SCHEMA) as writer:
+        for start in range(0, len(shard_vessels), row_group_vessels):
+            vessels = shard_vessels.iloc[start:start + row_group_vessels]
+            imo_numbers, type_codes, row_years = generator._expand_vessel_years(vessels, years)
+            uniforms = counter_based_uniforms(seed, imo_numbers, row_years)
+
+            data = generator._generate_from_uniforms(imo_numbers, type_codes, row_years, uniforms)
+            writer.write_table(pa.Table.from_pandas(data, schema=VOYAGE_SCHEMA, preserve_index=False))
+
+    return path
+
 
 class VoyageDataGenerator:
     def __init__(self):
@@ -191,6 +269,150 @@ class VoyageDataGenerator:
             "Weather_Conditions": weather_conditions,
         }
 
+    def _spec_bounds(self, type_codes, spec_name):
+        """Returns the lower and upper bound of a spec for every row, given the index
+        of the vessel type of the row in self.vessel_types."""
+        bounds = np.array([specs[spec_name] for specs in self.vessel_types.values()], dtype=float)
+        return bounds[type_codes, 0], bounds[type_codes, 1]
+
+    def _uniform(self, type_codes, spec_name, draws):
+        low, high = self._spec_bounds(type_codes, spec_name)
+        return low + (high - low) * draws
+
+    def _generate_from_uniforms(self, imo_numbers, type_codes, years, uniforms):
+        """Generates the voyage data of many vessel-years at once, with the same relationships
+        as generate_vessel_data. Every row consumes one row of `uniforms`, a matrix of
+        uniform draws in [0, 1) with DRAWS_PER_ROW columns.
+
+        Args:
+            imo_numbers (np.ndarray): the IMO number of every row
+            type_codes (np.ndarray): the index of the vessel type of every row in self.vessel_types
+            years (np.ndarray): the reporting period of every row
+            uniforms (np.ndarray): the random draws, one row per vessel-year
+
+        Returns:
+            pd.DataFrame: the synthetic data with the columns of generate_vessel_data
+        """
+        vessel_type_names = np.array(list(self.vessel_types))
+
+        # Base calculations
+        port_calls = np.floor(self._uniform(type_codes, "port_calls", uniforms[:, 0])).astype(np.int64)
+        eu_ratio = self._uniform(type_codes, "eu_port_ratio", uniforms[:, 1])
+
+        # Calculate port calls maintaining relationship
+        eu_port_calls = np.floor(port_calls * eu_ratio).astype(np.int64)
+        non_eu_port_calls = port_calls - eu_port_calls
+
+        # Calculate distances and cap them to the realistic range of the vessel type
+        avg_trip_distance = self._uniform(type_codes, "trip_distance", uniforms[:, 2])
+        total_distance = port_calls * avg_trip_distance
+        _, max_total_distance = self._spec_bounds(type_codes, "total_distance")
+        over_the_cap = total_distance > max_total_distance
+        total_distance = np.where(over_the_cap, max_total_distance, total_distance)
+        avg_trip_distance = np.where(over_the_cap, total_distance / port_calls, avg_trip_distance)
+
+        eu_distance = total_distance * eu_ratio * (0.9 + 0.2 * uniforms[:, 3])
+        non_eu_distance = total_distance - eu_distance
+
+        # Calculate laden/ballast voyages
+        laden_ratio = self._uniform(type_codes, "laden_ratio", uniforms[:, 4])
+        laden_voyages = np.floor(port_calls * laden_ratio).astype(np.int64)
+        ballast_voyages = port_calls - laden_voyages
+
+        # Calculate time distributions
+        sea_days = self._uniform(type_codes, "sea_days", uniforms[:, 5])
+        avg_port_stay = self._uniform(type_codes, "port_stay", uniforms[:, 6])
+
+        return pd.DataFrame({
+            "imo_number": imo_numbers,
+            "reporting_period": years,
+            "ship_type": vessel_type_names[type_codes],
+            "Total_Port_Calls": port_calls,
+            "EU_Port_Calls": eu_port_calls,
+            "Non_EU_Port_Calls": non_eu_port_calls,
+            "Total_Distance": np.round(total_distance, 2),
+            "Distance_EU_Waters": np.round(eu_distance, 2),
+            "Distance_Non_EU_Waters": np.round(non_eu_distance, 2),
+            "Average_Trip_Distance": np.round(avg_trip_distance, 2),
+            "Laden_Voyages": laden_voyages,
+            "Ballast_Voyages": ballast_voyages,
+            "Days_At_Sea": np.round(sea_days, 2),
+            "Average_Port_Stay": np.round(avg_port_stay, 2),
+            "Route_Type": ROUTE_TYPES[(uniforms[:, 7] * len(ROUTE_TYPES)).astype(np.int64)],
+            "Weather_Conditions": WEATHER_CONDITIONS[(uniforms[:, 8] * len(WEATHER_CONDITIONS)).astype(np.int64)],
+        })
+
+    def _expand_vessel_years(self, vessel_data, years):
+        """Keeps the vessels of the supported types and repeats every vessel once per year,
+        in the order of generate_fleet_data (vessel by vessel, year by year)."""
+        years = np.asarray(list(years), dtype=np.int64)
+        type_codes = pd.Categorical(vessel_data["ship_type"], categories=list(self.vessel_types)).codes
+        supported = type_codes >= 0
+
+        imo_numbers = np.repeat(vessel_data["imo_number"].to_numpy()[supported], len(years))
+        type_codes = np.repeat(type_codes[supported], len(years))
+        row_years = np.tile(years, int(supported.sum()))
+
+        return imo_numbers, type_codes, row_years
+
+    def generate_fleet_data_vectorized(self, vessel_data, years, seed=None):
+        """Vectorized version of generate_fleet_data. All the values are drawn at once as
+        NumPy arrays from a seeded numpy.random.Generator and the dataframe is built from
+        the columns in one step.
+
+        Args:
+            vessel_data (pd.DataFrame): the vessels with the imo_number and ship_type columns
+            years (iterable): the reporting periods to generate
+            seed (int, optional): the seed of the random generator
+
+        Returns:
+            pd.DataFrame: one row per vessel of a supported type and year
+        """
+        imo_numbers, type_codes, row_years = self._expand_vessel_years(vessel_data, years)
+        uniforms = np.random.default_rng(seed).random((len(imo_numbers), DRAWS_PER_ROW))
+
+        return self._generate_from_uniforms(imo_numbers, type_codes, row_years, uniforms)
+
+    def generate_fleet_data_sharded(
+        self, vessel_data, years, output_dir, seed=0, workers=None,
+        vessels_per_shard=50_000, row_group_vessels=10_000,
+    ):
+        """Generates the voyage data in shards of vessels, in parallel processes, and streams
+        every shard to its own Parquet file (part-00000.parquet, part-00001.parquet, ...).
+        Each worker only holds one row group in memory. The random values of every row come
+        from counter_based_uniforms, and the shards depend only on vessels_per_shard, so the
+        output is identical for any number of workers.
+
+        Args:
+            vessel_data (pd.DataFrame): the vessels with the imo_number and ship_type columns
+            years (iterable): the reporting periods to generate
+            output_dir (str): the directory of the Parquet files
+            seed (int): the seed of the run
+            workers (int, optional): the number of processes, defaults to the number of CPUs
+            vessels_per_shard (int): the number of vessels in each file
+            row_group_vessels (int): the number of vessels in each row group
+
+        Returns:
+            list: the paths of the Parquet files
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        years = list(years)
+        shards = [
+            vessel_data.iloc[start:start + vessels_per_shard]
+            for start in range(0, len(vessel_data), vessels_per_shard)
+        ]
+        paths = [os.path.join(output_dir, f"part-{i:05d}.parquet") for i in range(len(shards))]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                _generate_shard,
+                shards,
+                [years] * len(shards),
+                [seed] * len(shards),
+                paths,
+                [row_group_vessels] * len(shards),
+            ))
+
     def generate_fleet_data(self, vessel_data, years):
         """Generate synthetic voyage data for multiple vessels over multiple years."""
         all_data = []
@@ -210,38 +432,6 @@ class VoyageDataGenerator:
         return pd.DataFrame(all_data)
 
 
-def fetch_ship_ids_and_types():
-    DATABASE = os.environ["DATABASE"]
-    TABLE = os.environ["TABLE"]
-    OUTPUT_LOCATION = os.environ["QUERY_LOCATION"]
-    my_session = boto3.session.Session(
-        region_name=os.environ["REGION"],
-        aws_access_key_id=os.environ["ACCESS_KEY"],
-        aws_secret_access_key=os.environ["SECRET_KEY"],
-    )
-    query = f"""
-        WITH latest_versions AS (
-            SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-            FROM "{DATABASE}"."{TABLE}"
-            GROUP BY CAST(year AS INTEGER)
-        ),
-
-        latest_data AS (
-            SELECT *
-            FROM "{DATABASE}"."{TABLE}" se
-            JOIN latest_versions lv
-            ON CAST(se.year AS INT) = lv.year
-            AND CAST(se.version AS INT) = lv.latest_version
-        )
-        
-        SELECT DISTINCT imo_number, ship_type FROM latest_data;
-    """
-    basic_vessels = wr.athena.read_sql_query(
-        query, database=DATABASE, boto3_session=my_session
-    )
-    return basic_vessels
-
-
 def main():
     # Initialize generator
     generator = VoyageDataGenerator()
@@ -249,7 +439,8 @@ def main():
 
     # Generate data for 2018-2023
     years = range(2018, 2024)
-    synthetic_data = generator.generate_fleet_data(basic_vessels, years)
+    seed = int(os.environ["VOYAGE_DATA_SEED"]) if "VOYAGE_DATA_SEED" in os.environ else None
+    synthetic_data = generator.generate_fleet_data_vectorized(basic_vessels, years, seed=seed)
 
     print("\nSample of generated data:")
     print(synthetic_data.head())
@@ -0,0 +1,190 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from typing import Iterable
+from src.utils.data.name_matching import NameIndex
+
+# The fields are parsed as Arrow strings, so every str.extract below runs its pattern over
+# the whole column in C++ (RE2) instead of calling re.search value by value. The patterns
+# have to be valid in both RE2 and Python (pandas validates them with re.compile): no
+# lookbehinds, and a named group around the extracted value.
+ARROW_STRING = pd.ArrowDtype(pa.string())
+ARROW_DOUBLE = pd.ArrowDtype(pa.float64())
+
+# A number starts after anything that is not a digit, so "94511 GT" is not read as "511"
+NUMBER = r"(?:^|[^\d.,])(?P<number>\d[\d,]*(?:\.\d+)?)"
+SPACE = "[\\s ]*"
+
+PATTERNS = {
+    "IMO": r"(?i)IMO(?:\s+number)?[:\s]*(?P<number>\d{7})",
+    "IMO_KEY": r"^(?P<number>\d{7})$",
+    "BARE_NUMBER": r"^(?P<number>\d[\d,]*(?:\.\d+)?)$",
+    "GT": "(?i)" + NUMBER + SPACE + r"(?:GT|GRT)\b",
+    "NT": "(?i)" + NUMBER + SPACE + r"NT\b",
+    "DWT": "(?i)" + NUMBER + SPACE + "(?:t" + SPACE + r")?DWT\b",
+    "METRES": "(?i)" + NUMBER + SPACE + r"(?:m|metres|meters)\b",
+    "FEET": "(?i)" + NUMBER + SPACE + r"(?:ft|feet)\b",
+    "YEAR": r"\b(?P<number>1[89]\d{2}|20\d{2})\b",
+}
+
+METRES_PER_FOOT = 0.3048
+
+PARSED_FIELDS = ["IMO_number", "name", "built_year", "length (m)", "beam (m)", "gross_tonnage", "net_tonnage", "dwt (tonnes)"]
+
+
+def load_ship_particulars(paths: Iterable[str]) -> pd.DataFrame:
+    """Loads the raw JSON sources (wikipedia infoboxes, fleet lists) into a single dataframe
+    with one row per ship and one column per infobox field. The sources are keyed by IMO
+    number, which becomes the `source_key` column.
+
+    Args:
+        paths (Iterable[str]): the paths of the JSON files
+
+    Returns:
+        pd.DataFrame: the raw fields of every ship
+    """
+    dataframes = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records = pd.DataFrame.from_records(list(data.values()))
+        records.insert(0, "source_key", list(data.keys()))
+        dataframes.append(records)
+
+    return pd.concat(dataframes, ignore_index=True) if dataframes else pd.DataFrame(columns=["source_key"])
+
+
+def _text(values: pd.Series) -> pd.Series:
+    """Converts values to Arrow strings, with empty and "Missing" values as NA"""
+    if values.dtype != ARROW_STRING:
+        # the fleet lists mix numbers and strings in the same field
+        values = values.map(str, na_action="ignore").astype(ARROW_STRING)
+
+    values = values.str.strip()
+    return values.mask(values.isin(["", "Missing", "N/A"]))
+
+
+def _field(raw: pd.DataFrame, column: str) -> pd.Series:
+    if column not in raw.columns:
+        return pd.Series(pd.NA, index=raw.index, dtype=ARROW_STRING)
+
+    return _text(raw[column])
+
+
+def _to_number(values: pd.Series) -> pd.Series:
+    """Casts extracted numbers, which are always well formed, to floats"""
+    return values.str.replace(",", "", regex=False).astype(ARROW_DOUBLE).astype(float)
+
+
+def _extract_number(values: pd.Series, pattern: str) -> pd.Series:
+    return _to_number(values.str.extract(PATTERNS[pattern], expand=False))
+
+
+def extract_metres(values: pd.Series, bare_numbers_in_metres: bool = False) -> pd.Series:
+    """Extracts the length of every value in metres. The metric value is used when both
+    units are given (e.g. "984 ft (299.9 m)"), otherwise feet are converted.
+
+    Args:
+        values (pd.Series): the text values
+        bare_numbers_in_metres (bool): read values without a unit as metres
+
+    Returns:
+        pd.Series: the lengths in metres, NaN where no length was found
+    """
+    values = _text(values)
+    metres = _extract_number(values, "METRES").fillna(_extract_number(values, "FEET") * METRES_PER_FOOT)
+
+    if bare_numbers_in_metres:
+        metres = metres.fillna(_extract_number(values, "BARE_NUMBER"))
+
+    return metres
+
+
+def extract_year(values: pd.Series) -> pd.Series:
+    """Extracts the year of dates such as "2007" or "7 December 2022" """
+    return _extract_number(_text(values), "YEAR").astype("Int64")
+
+
+def _direct_or_extracted(raw: pd.DataFrame, column: str, pattern: str) -> pd.Series:
+    """Uses the numeric field of the fleet lists and falls back to the wikipedia Tonnage text"""
+    return _extract_number(_field(raw, column), "BARE_NUMBER").fillna(_extract_number(_field(raw, "Tonnage"), pattern))
+
+
+def parse_ship_particulars(raw: pd.DataFrame) -> pd.DataFrame:
+    """Extracts the particulars of every ship from the raw infobox fields, column by column.
+    Lengths in feet are converted to metres.
+
+    Args:
+        raw (pd.DataFrame): the output of load_ship_particulars
+
+    Returns:
+        pd.DataFrame: the particulars with numeric types, NaN where a field was not found
+    """
+    imo_number = _extract_number(_field(raw, "Identification"), "IMO").fillna(
+        _extract_number(_field(raw, "source_key"), "IMO_KEY")
+    )
+
+    # older scrapes are keyed by ship name instead of IMO number
+    name = _field(raw, "Name").fillna(_field(raw, "source_key").mask(imo_number.notna()))
+
+    parsed = pd.DataFrame({
+        "IMO_number": imo_number.astype("Int64"),
+        "name": name.astype(object).where(name.notna(), None),
+        "built_year": extract_year(_field(raw, "Completed")).fillna(extract_year(_field(raw, "Built year"))),
+        "length (m)": extract_metres(_field(raw, "Length")).fillna(
+            extract_metres(_field(raw, "Length (m)"), bare_numbers_in_metres=True)
+        ),
+        "beam (m)": extract_metres(_field(raw, "Beam")).fillna(
+            extract_metres(_field(raw, "Breadth (m)"), bare_numbers_in_metres=True)
+        ),
+        "gross_tonnage": _direct_or_extracted(raw, "grossTonnage", "GT"),
+        "net_tonnage": _direct_or_extracted(raw, "netTonnage", "NT"),
+        "dwt (tonnes)": _direct_or_extracted(raw, "deadweight", "DWT"),
+    })
+
+    return parsed[PARSED_FIELDS]
+
+
+def attach_imo_numbers(parsed: pd.DataFrame, ships: pd.DataFrame, threshold: float = 0.8) -> pd.DataFrame:
+    """Fills the IMO numbers that the sources do not give by matching the ship names
+    against the names of the EU-MRV ships
+
+    Args:
+        parsed (pd.DataFrame): the output of parse_ship_particulars
+        ships (pd.DataFrame): the EU-MRV ships, with imo_number and name columns
+        threshold (float): the minimum similarity of two names of the same ship
+
+    Returns:
+        pd.DataFrame: the particulars with the matched IMO numbers
+    """
+    parsed = parsed.copy()
+    missing = parsed.index[parsed["IMO_number"].isna() & parsed["name"].notna()]
+    if len(missing) == 0:
+        return parsed
+
+    matches = NameIndex(ships["name"]).match(parsed.loc[missing, "name"], threshold=threshold)
+    matched = matches["index"].to_numpy() >= 0
+    parsed.loc[missing[matched], "IMO_number"] = ships["imo_number"].to_numpy()[matches["index"].to_numpy()[matched]]
+
+    return parsed
+
+
+def extraction_coverage(parsed: pd.DataFrame) -> pd.DataFrame:
+    """Reports how many ships have a value for every parsed field
+
+    Args:
+        parsed (pd.DataFrame): the output of parse_ship_particulars
+
+    Returns:
+        pd.DataFrame: the number and the share of ships with a value, per field
+    """
+    found = parsed.notna().sum()
+
+    return pd.DataFrame({
+        "found": found,
+        "missing": len(parsed) - found,
+        "coverage": (found / len(parsed)).round(4) if len(parsed) else np.nan,
+    })
@@ -81,6 +81,11 @@ spark_df.groupBy("monitoring_methods").count().show()
 
 def convert_columns_to_double(df, columns):
     for column in columns:
+        # The Parquet interim files already store the metrics as doubles (the values that
+        # were not numbers are nulls) so only the legacy CSV files need the string parsing
+        if dict(df.dtypes)[column] == "double":
+            continue
+
         # Check if the column type is string
         if dict(df.dtypes)[column] == "string":
             df = df.withColumn(
@@ -319,4 +324,15 @@ s3output.setCatalogInfo(
 )
 s3output.setFormat("glueparquet")
 s3output.writeFrame(DyF)
+
+# The serving artifacts of the API (the ship snapshot, the metadata summary and the
+# leaderboards) are published from the clean partitions just written, so they include this
+# load. The job is given the src package with --extra-py-files and the prefix the API syncs
+# the artifacts from with --SERVING_ARTIFACTS_URL (e.g. s3://eu-marv-ship-emissions/serving)
+if "--SERVING_ARTIFACTS_URL" in sys.argv:
+    from src.serving_artifacts import publish_serving_artifacts
+
+    serving_args = getResolvedOptions(sys.argv, ["SERVING_ARTIFACTS_URL"])
+    publish_serving_artifacts("s3://eu-marv-ship-emissions/clean", serving_args["SERVING_ARTIFACTS_URL"])
+
 job.commit()
@@ -1,12 +1,19 @@
+import asyncio
 import logging
 import datetime
+import os
 import re
+import time
 
 import pandas as pd
 import numpy as np
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
 from typing import List, Optional, Dict
 from sys import stdout
 from .google_cloud_storage_manager import GoogleCloudStorageManager
+from .object_store import ObjectStore, ObjectInfo, GCSObjectStore
 
 pd.set_option('future.no_silent_downcasting', True)
 
@@ -20,9 +27,100 @@ consoleHandler = logging.StreamHandler(stdout)
 consoleHandler.setFormatter(logFormatter)
 logger.addHandler(consoleHandler)
 
+def read_report(contents: bytes, blob_name: str) -> pd.DataFrame:
+    """Parses the contents of a report downloaded from the bronze location
+
+    Args:
+        contents (bytes): the contents of the excel file
+        blob_name (str): the name of the file
+
+    Returns:
+        pd.DataFrame: the report
+    """
+    if not blob_name.lower().endswith('.xlsx'):
+        raise ValueError(f"Unsupported file format for {blob_name}. The reports are xlsx files")
+
+    return pd.read_excel(BytesIO(contents), engine="openpyxl", header=2)
+
+
+def processed_metadata() -> Dict[str, str]:
+    return {'processed_by_ETL': 'True', 'processed_date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def transform_report(contents: bytes, report_name: str) -> bytes:
+    """Parses, transforms and serializes one report. It runs in the worker processes of
+    the pipelined mode, so it takes and returns bytes instead of dataframes.
+
+    Args:
+        contents (bytes): the contents of the excel report
+        report_name (str): the name of the report in the bronze location
+
+    Returns:
+        bytes: the clean report as a Parquet file
+    """
+    transformed_df = ETLPipeline.tranform(df=read_report(contents, report_name), file_=report_name)
+
+    parquet_buffer = BytesIO()
+    transformed_df.to_parquet(parquet_buffer, engine='pyarrow', index=False)
+    return parquet_buffer.getvalue()
+
+
+@dataclass
+class PipelineMetrics:
+    """Latencies of every stage of the pipelined mode (in seconds per report) and the
+    depth of the queues between the stages, sampled every time a report goes through them."""
+
+    stage_latencies: Dict[str, List[float]] = field(default_factory=dict)
+    queue_depths: Dict[str, List[int]] = field(default_factory=dict)
+    failed_reports: List[str] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    def record_latency(self, stage: str, seconds: float):
+        self.stage_latencies.setdefault(stage, []).append(seconds)
+
+    def record_queue_depth(self, queue_name: str, queue: asyncio.Queue):
+        self.queue_depths.setdefault(queue_name, []).append(queue.qsize())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {
+            stage: {
+                'count': len(latencies),
+                'total': float(np.sum(latencies)),
+                'mean': float(np.mean(latencies)),
+                'p95': float(np.percentile(latencies, 95)),
+            }
+            for stage, latencies in self.stage_latencies.items()
+        }
+        for queue_name, depths in self.queue_depths.items():
+            summary[f"{queue_name}_queue"] = {'mean_depth': float(np.mean(depths)), 'max_depth': int(np.max(depths))}
+
+        return summary
+
+
 class ETLPipeline():
-    def __init__(self):
-        self.storage_client = GoogleCloudStorageManager()
+    def __init__(self, object_store: Optional[ObjectStore] = None, max_concurrency: int = 4):
+        """
+        Args:
+            object_store (ObjectStore, optional): the store used by the async methods. Defaults to
+                the GCS bucket. The synchronous methods always use the GCS bucket (storage_client).
+            max_concurrency (int): the maximum number of transfers in flight in the async methods
+        """
+        if object_store is None:
+            object_store = GCSObjectStore(GoogleCloudStorageManager())
+        self.object_store = object_store
+        self.max_concurrency = max_concurrency
+        self._storage_client: Optional[GoogleCloudStorageManager] = None
+
+    @property
+    def storage_client(self) -> GoogleCloudStorageManager:
+        """The GCS manager of the synchronous methods: the manager of the store when it is the
+        GCS one, otherwise a manager created on first use"""
+        if self._storage_client is None:
+            if isinstance(self.object_store, GCSObjectStore):
+                self._storage_client = self.object_store.storage_manager
+            else:
+                self._storage_client = GoogleCloudStorageManager()
+        return self._storage_client
 
     def extract(self) -> Dict[str, pd.DataFrame]:
         """Downloads the new CO2 emission report from the bronze location in the bucket.
@@ -50,7 +148,8 @@ class ETLPipeline():
         
         return df_to_process
     
-    def _clean_column_name(self, text):
+    @staticmethod
+    def _clean_column_name(text):
         """Clean column names with special handling for common patterns"""
         if text == 'IMO Number.1':
             text = 'ship_company_imo_number'
@@ -83,7 +182,8 @@ class ETLPipeline():
         
         return text        
 
-    def tranform(self, df: pd.DataFrame, file_: str) -> pd.DataFrame:
+    @staticmethod
+    def tranform(df: pd.DataFrame, file_: str) -> pd.DataFrame:
         """Does all the transformations on the emission report to make it clean
 
         Args:
@@ -206,7 +306,7 @@ class ETLPipeline():
         column_difference.remove('technical_efficiency_type')
         
         logger.info("Renaming the new columns")
-        additional_column_name_mapping = {col:self._clean_column_name(col) for col in column_difference}
+        additional_column_name_mapping = {col:ETLPipeline._clean_column_name(col) for col in column_difference}
         
         logger.info("Combining the dictionaries with the column names")
         column_names = column_name_mapping | additional_column_name_mapping
@@ -264,9 +364,186 @@ class ETLPipeline():
             blob.metadata = metadata
             blob.patch(if_metageneration_match=metageneration_match_precondition)
 
+    @staticmethod
+    def _unprocessed_reports(objects: List[ObjectInfo]) -> List[str]:
+        return [
+            info.name for info in objects
+            if info.name.endswith('.xlsx') and info.metadata.get('processed_by_ETL') == 'False'
+        ]
+
+    async def extract_async(self) -> Dict[str, pd.DataFrame]:
+        """Async version of extract. The new reports are downloaded concurrently and
+        each one is parsed in a worker thread as soon as it arrives.
+
+        Returns:
+            Dict[str, pd.DataFrame]: the new reports keyed by their name in the bucket
+        """
+        logger.info('Extract function: Downloading the files concurrently')
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        report_names = self._unprocessed_reports(await self.object_store.list(prefix='bronze-bucket/'))
+
+        async def download(report_name: str) -> pd.DataFrame:
+            async with semaphore:
+                contents = await self.object_store.get(report_name)
+            return await asyncio.to_thread(read_report, contents, report_name)
+
+        dataframes = await asyncio.gather(*(download(report_name) for report_name in report_names))
+        logger.info('==> Extraction is done. <==')
+
+        return dict(zip(report_names, dataframes))
+
+    async def load_async(self, clean_dataframe: pd.DataFrame, report_name: str, bucket_layer: str):
+        """Async version of load. The Parquet file is uploaded together with its metadata."""
+        logger.info(f"uploading the clean file: {report_name} to the {bucket_layer}")
+        parquet_buffer = BytesIO()
+        await asyncio.to_thread(clean_dataframe.to_parquet, parquet_buffer, engine='pyarrow', index=False)
+
+        await self.object_store.put(
+            f"{bucket_layer}/{report_name}",
+            parquet_buffer.getvalue(),
+            content_type='application/vnd.apache.parquet',
+            metadata=processed_metadata(),
+        )
+
+    async def run_async(self):
+        """Runs the ETL on the object store, overlapping the transfers with the transformations.
+        Every new report is downloaded, transformed in a worker thread and uploaded as soon as
+        it is ready, while the other reports are still being transferred.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        report_names = self._unprocessed_reports(await self.object_store.list(prefix='bronze-bucket/'))
+        logger.info(f"Found {len(report_names)} reports to process")
+
+        async def process(report_name: str):
+            async with semaphore:
+                contents = await self.object_store.get(report_name)
+
+            df = await asyncio.to_thread(read_report, contents, report_name)
+            transformed_df = await asyncio.to_thread(self.tranform, df=df, file_=report_name)
+
+            bucket_layer, year, filename = report_name.split('/')
+            async with semaphore:
+                await self.load_async(
+                    clean_dataframe=transformed_df,
+                    report_name=f"{year}/{filename.replace('xlsx', 'parquet')}",
+                    bucket_layer='silver-bucket',
+                )
+                await self.object_store.patch_metadata(report_name, processed_metadata())
+
+        await asyncio.gather(*(process(report_name) for report_name in report_names))
+
+    def run_pipelined(self, transform_workers: int = 2, queue_size: int = 2,
+                      executor: Optional[Executor] = None) -> PipelineMetrics:
+        """Runs the ETL as three overlapping stages connected by bounded queues:
+        the downloads, the transformations in a process pool and the uploads together
+        with the metadata updates. While a report is transformed the next ones are
+        downloaded and the previous ones uploaded, so the wall time approaches the time
+        of the slowest stage instead of the sum of the stages. When a queue is full the
+        stage in front of it waits, so at most `queue_size` reports wait between stages.
+
+        Args:
+            transform_workers (int): the number of reports transformed in parallel
+            queue_size (int): the capacity of the queues between the stages
+            executor (Executor, optional): runs the transformations. Defaults to a process pool
+                with `transform_workers` processes.
+
+        Returns:
+            PipelineMetrics: the latency of the stages and the depth of the queues
+        """
+        if executor is not None:
+            return asyncio.run(self._run_pipelined(executor, transform_workers, queue_size))
+
+        with ProcessPoolExecutor(max_workers=transform_workers) as process_pool:
+            return asyncio.run(self._run_pipelined(process_pool, transform_workers, queue_size))
+
+    async def _run_pipelined(self, executor: Executor, transform_workers: int, queue_size: int) -> PipelineMetrics:
+        metrics = PipelineMetrics()
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        downloaded = asyncio.Queue(maxsize=queue_size)
+        transformed = asyncio.Queue(maxsize=queue_size)
+        done = object()
+
+        report_names = self._unprocessed_reports(await self.object_store.list(prefix='bronze-bucket/'))
+        logger.info(f"Found {len(report_names)} reports to process")
+        pending = iter(report_names)
+
+        def skip(report_name: str, stage: str):
+            # the report is not marked as processed, the next run tries it again
+            logger.exception(f"Skipping {report_name}: the {stage} failed")
+            metrics.failed_reports.append(report_name)
+
+        async def download_stage():
+            # the downloaders share the iterator of the pending reports
+            for report_name in pending:
+                stage_start = time.perf_counter()
+                try:
+                    contents = await self.object_store.get(report_name)
+                except Exception:
+                    skip(report_name, 'download')
+                    continue
+                metrics.record_latency('download', time.perf_counter() - stage_start)
+
+                await downloaded.put((report_name, contents))
+                metrics.record_queue_depth('downloaded', downloaded)
+
+        async def transform_stage():
+            while (item := await downloaded.get()) is not done:
+                report_name, contents = item
+                stage_start = time.perf_counter()
+                try:
+                    parquet_contents = await loop.run_in_executor(executor, transform_report, contents, report_name)
+                except Exception:
+                    skip(report_name, 'transform')
+                    continue
+                metrics.record_latency('transform', time.perf_counter() - stage_start)
+
+                await transformed.put((report_name, parquet_contents))
+                metrics.record_queue_depth('transformed', transformed)
+
+        async def upload_stage():
+            while (item := await transformed.get()) is not done:
+                report_name, parquet_contents = item
+                bucket_layer, year, filename = report_name.split('/')
+                stage_start = time.perf_counter()
+
+                try:
+                    await self.object_store.put(
+                        f"silver-bucket/{year}/{filename.replace('xlsx', 'parquet')}",
+                        parquet_contents,
+                        content_type='application/vnd.apache.parquet',
+                        metadata=processed_metadata(),
+                    )
+                    await self.object_store.patch_metadata(report_name, processed_metadata())
+                except Exception:
+                    skip(report_name, 'upload')
+                    continue
+                metrics.record_latency('upload', time.perf_counter() - stage_start)
+
+        async def run_stage(workers: int, stage, output_queue: Optional[asyncio.Queue], consumers: int):
+            await asyncio.gather(*(stage() for _ in range(workers)))
+            if output_queue is not None:
+                for _ in range(consumers):
+                    await output_queue.put(done)
+
+        await asyncio.gather(
+            run_stage(self.max_concurrency, download_stage, downloaded, transform_workers),
+            run_stage(transform_workers, transform_stage, transformed, self.max_concurrency),
+            run_stage(self.max_concurrency, upload_stage, None, 0),
+        )
+
+        metrics.wall_time = time.perf_counter() - start
+        logger.info(f"Pipelined run finished in {metrics.wall_time:.2f} s: {metrics.summary()}")
+
+        return metrics
+
+
 def main():
     etl = ETLPipeline()
-    etl.run()
+    if os.environ.get('ETL_MODE') == 'pipelined':
+        etl.run_pipelined(transform_workers=int(os.environ.get('ETL_TRANSFORM_WORKERS', 2)))
+    else:
+        etl.run()
 
 if __name__=='__main__':
     main()
\ No newline at end of file
@@ -1,19 +1,14 @@
 import wikipedia
 import json
-import time
+import os
 
-from bs4 import BeautifulSoup
-from difflib import SequenceMatcher
 from dotenv import load_dotenv
-from utils.data.fetch_ship_ids import fetch_ship_ids
+from src.utils.data.fetch_ship_ids import fetch_ship_ids
+from src.wikipedia_crawler import WikipediaCrawler, parse_infobox
 
 load_dotenv()
 
 
-def similar(a, b):
-    return SequenceMatcher(None, a, b).ratio()
-
-
 def get_wikipedia_page(page_title: str):
     print("Page title: ", page_title)
     page_object = wikipedia.page(page_title, auto_suggest=False)
@@ -23,47 +18,30 @@ def get_wikipedia_page(page_title: str):
 
 
 def get_info_box_from_article(html_page):
-    soup = BeautifulSoup(html_page, "html.parser")
-    table = soup.find("table", attrs={"class": "infobox"})
-    table_body = table.find("tbody")
-
-    ship_info_dict = {}
-    rows = table_body.find_all("tr", attrs={"style": "vertical-align:top;"})
-    for row in rows:
-        cols = row.find_all("td")
-        cols = [ele.text.strip() for ele in cols]
-
-        if len(cols) == 2:
-            ship_info_dict[cols[0]] = cols[1]
-
-    return ship_info_dict
+    return parse_infobox(html_page)
 
 
 def main():
-    ships_not_found = []
-    ship_info_json = {}
     print("Getting the unique ship IDs")
     distinct_imo_numbers = fetch_ship_ids()
 
     print(distinct_imo_numbers.head())
 
-    for index, row in distinct_imo_numbers[["imo_number", "name"]].iterrows():
-        print(index, " ", row["imo_number"], " ", row["name"])
-        result = wikipedia.search(f"IMO number: {row['imo_number']}", results=1)
-
-        if not result:
-            ships_not_found.append(row["imo_number"])
-            time.sleep(10)
-            continue
-
-        if similar(row["name"].lower(), result[0].lower()) > 0.6:
-            print(result)
-            time.sleep(5)
-            article_html_page = get_wikipedia_page(result[0])
-            ship_info = get_info_box_from_article(html_page=article_html_page)
-            ship_info_json[row["imo_number"]] = ship_info
-        print()
-        time.sleep(10)
+    # the crawl can be interrupted and started again, it resumes from the checkpoint
+    crawler = WikipediaCrawler(
+        cache_dir="../data/raw/wikipedia_cache",
+        checkpoint_path="../data/raw/wikipedia_ship_data.jsonl",
+        client=wikipedia,
+        requests_per_second=float(os.environ.get("WIKIPEDIA_REQUESTS_PER_SECOND", 1)),
+        max_workers=int(os.environ.get("WIKIPEDIA_CRAWLER_WORKERS", 4)),
+    )
+    records = crawler.run(distinct_imo_numbers)
+
+    ship_info_json = {
+        imo_number: record["infobox"] for imo_number, record in records.items() if record["status"] == "found"
+    }
+    ships_not_found = [imo_number for imo_number, record in records.items() if record["status"] == "not_found"]
+    print(f"Articles found for {len(ship_info_json)} ships, no article for {len(ships_not_found)} ships")
 
     with open("../data/raw/wikipedia_ship_data.json", "w", encoding="utf-8") as f:
         json.dump(ship_info_json, f, ensure_ascii=False, indent=4)
@@ -2,19 +2,119 @@ import os
 import warnings
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from google.api_core.exceptions import NotFound
+from google.auth import default as default_credentials
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
 from io import StringIO, BytesIO
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
 
+MB = 1024 * 1024
+# A compose request accepts at most 32 source objects
+MAX_COMPOSE_COMPONENTS = 32
+
+
 class GoogleCloudStorageManager():
-    """Contains functions and data to manage the storage and management of files in the buckets."""
+    """Contains functions and data to manage the storage and management of files in the buckets.
+
+    Objects bigger than `parallel_threshold` are downloaded as byte ranges and uploaded as
+    parts that are composed in the bucket, using `max_workers` threads that share the
+    authorized HTTP session of the client.
+    """
     
-    def __init__(self):
-        self.client = storage.Client(project=os.environ['GCP_PROJECT_ID'])
+    def __init__(self, max_workers: int = 8, parallel_threshold: int = 32 * MB, chunk_size: int = 8 * MB):
+        # The default pool of a session keeps 10 connections, the session given to the client
+        # has a pool sized to the number of workers
+        credentials, _ = default_credentials(scopes=storage.Client.SCOPE)
+        session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        self.client = storage.Client(project=os.environ['GCP_PROJECT_ID'], credentials=credentials, _http=session)
         self.bucket = self.client.bucket(bucket_name=os.environ['BUCKET_NAME'])
+        self.max_workers = max_workers
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+
+    def download_bytes(self, cloud_file: str) -> bytearray:
+        """Downloads the contents of an object. Objects bigger than the parallel threshold
+        are downloaded as concurrent byte ranges that are written into a preallocated buffer.
+
+        Args:
+            cloud_file (str): the full name of the object in the bucket
+
+        Returns:
+            bytearray: the contents of the object
+        """
+        blob = self.bucket.get_blob(cloud_file)
+        if blob is None:
+            raise FileNotFoundError(f"gs://{self.bucket.name}/{cloud_file} does not exist")
+
+        if blob.size < self.parallel_threshold:
+            return bytearray(blob.download_as_bytes(if_generation_match=blob.generation))
+
+        buffer = bytearray(blob.size)
+        view = memoryview(buffer)
+
+        def download_range(start: int):
+            end = min(start + self.chunk_size, blob.size) - 1
+            # The range end is inclusive. The generation is pinned so that all the ranges
+            # come from the same version of the object.
+            view[start:end + 1] = blob.download_as_bytes(
+                start=start, end=end, checksum=None, if_generation_match=blob.generation
+            )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(download_range, range(0, blob.size, self.chunk_size)))
+
+        return buffer
+
+    def upload_bytes(self, cloud_file: str, data: bytes, content_type: str = None):
+        """Uploads the contents of a buffer to an object. Buffers bigger than the parallel
+        threshold are uploaded concurrently as temporary parts which are then composed
+        into the final object and deleted.
+
+        Args:
+            cloud_file (str): the full name of the object in the bucket
+            data (bytes): the contents of the object
+            content_type (str, optional): the content type of the object
+        """
+        blob = self.bucket.blob(cloud_file)
+
+        if len(data) < self.parallel_threshold:
+            blob.upload_from_file(BytesIO(data), content_type=content_type)
+            return
+
+        chunk_size = max(self.chunk_size, -(-len(data) // MAX_COMPOSE_COMPONENTS))
+        view = memoryview(data)
+        parts = [self.bucket.blob(f"{cloud_file}.parts/{index:02d}") for index in range(-(-len(data) // chunk_size))]
+
+        def upload_part(index: int):
+            start = index * chunk_size
+            parts[index].upload_from_file(BytesIO(view[start:start + chunk_size]), content_type=content_type)
+
+        def delete_part(part):
+            try:
+                part.delete()
+            except NotFound:
+                # the upload of the part failed or did not start
+                pass
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # the parts are deleted even if an upload or the composition fails
+            try:
+                list(executor.map(upload_part, range(len(parts))))
+
+                blob.content_type = content_type
+                blob.compose(parts)
+            finally:
+                list(executor.map(delete_part, parts))
         
     def download_file_into_memory(self, blob_name:str, bucket_layer:str) -> pd.DataFrame:
         """Downloads a file into memory and creates a pandas dataframe
@@ -29,12 +129,11 @@ class GoogleCloudStorageManager():
         
         try:
             cloud_file = f"{bucket_layer}/{blob_name}"
-            blob = self.bucket.blob(blob_name=cloud_file)
-            contents = blob.download_as_bytes()
+            contents = self.download_bytes(cloud_file)
             
             # Determine file format based on extension
             if blob_name.lower().endswith('.csv'):
-                df = pd.read_csv(StringIO(contents.decode('utf-8')))
+                df = pd.read_csv(BytesIO(contents))
             elif blob_name.lower().endswith('.xlsx'):
                 df = pd.read_excel(BytesIO(contents), engine="openpyxl", header=2)
             elif blob_name.lower().endswith('.parquet'):
@@ -57,8 +156,12 @@ class GoogleCloudStorageManager():
         """
         
         try:
-            blob = self.bucket.blob(f"{bucket_layer}/{destination_blob_name}")
-            blob.upload_from_filename(source_file)
+            cloud_file = f"{bucket_layer}/{destination_blob_name}"
+            if os.path.getsize(source_file) < self.parallel_threshold:
+                self.bucket.blob(cloud_file).upload_from_filename(source_file)
+            else:
+                with open(source_file, "rb") as f:
+                    self.upload_bytes(cloud_file, f.read())
             
             print(f"Uploaded {source_file} to gs://{self.bucket}/{destination_blob_name}")
         except Exception as e:
@@ -89,11 +192,13 @@ class GoogleCloudStorageManager():
             destination_blob_name (str): the name of the file in the bucket
         """
         try:
-            blob = self.bucket.blob(f"{bucket_layer}/{destination_blob_name}")
             parquet_buffer = BytesIO()
             dataframe.to_parquet(parquet_buffer, engine='pyarrow', index=False)
-            parquet_buffer.seek(0)
-            blob.upload_from_file(parquet_buffer, content_type='application/vnd.apache.parquet')
+            self.upload_bytes(
+                f"{bucket_layer}/{destination_blob_name}",
+                parquet_buffer.getbuffer(),
+                content_type='application/vnd.apache.parquet',
+            )
         except Exception as e:
             print(e)
         
\ No newline at end of file
@@ -0,0 +1,352 @@
+import asyncio
+import datetime
+import json
+import os
+import uuid
+
+from abc import ABC, abstractmethod
+from botocore.exceptions import ClientError
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class ObjectInfo:
+    """Describes an object in a store. The name is the full path of the object
+    (e.g. bronze-bucket/2023/report.xlsx)."""
+
+    name: str
+    size: int
+    updated: Optional[datetime.datetime] = None
+    content_type: Optional[str] = None
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+
+class ObjectStore(ABC):
+    """Asyncio interface shared by the object stores of the pipeline.
+
+    The storage SDKs are blocking, so the implementations run every call in a worker
+    thread. Many transfers can then be awaited concurrently and the event loop is free
+    to schedule CPU work while they are in flight.
+    """
+
+    @abstractmethod
+    async def get(self, name: str) -> bytes:
+        """Returns the contents of an object"""
+
+    @abstractmethod
+    async def get_range(self, name: str, start: int, end: int) -> bytes:
+        """Returns the bytes [start, end) of an object"""
+
+    @abstractmethod
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, str]] = None):
+        """Creates or replaces an object"""
+
+    @abstractmethod
+    async def list(self, prefix: str = "") -> List[ObjectInfo]:
+        """Lists the objects whose name starts with the prefix, including their metadata"""
+
+    @abstractmethod
+    async def stat(self, name: str) -> ObjectInfo:
+        """Returns the description of an object. Raises FileNotFoundError if it does not exist."""
+
+    @abstractmethod
+    async def patch_metadata(self, name: str, metadata: Dict[str, str]):
+        """Merges the metadata into the metadata of an object"""
+
+    async def get_many(self, names: List[str]) -> Dict[str, bytes]:
+        """Downloads many objects concurrently"""
+        contents = await asyncio.gather(*(self.get(name) for name in names))
+        return dict(zip(names, contents))
+
+
+def _stringify(metadata: Optional[Dict]) -> Dict[str, str]:
+    """Object metadata values are strings in every store (e.g. True is stored as "True")"""
+    return {key: str(value) for key, value in (metadata or {}).items()}
+
+
+class LocalObjectStore(ObjectStore):
+    """Object store on the local filesystem, used for tests and offline benchmarks.
+    The metadata of every object is kept in a JSON file under `<root>/.metadata`."""
+
+    METADATA_DIRECTORY = ".metadata"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def _metadata_path(self, name: str) -> str:
+        return os.path.join(self.root, self.METADATA_DIRECTORY, *name.split("/")) + ".json"
+
+    def _read_attributes(self, name: str) -> Dict:
+        try:
+            with open(self._metadata_path(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"content_type": None, "metadata": {}}
+
+    def _write_atomically(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _write_attributes(self, name: str, attributes: Dict):
+        self._write_atomically(self._metadata_path(name), json.dumps(attributes).encode("utf-8"))
+
+    def _stat(self, name: str) -> ObjectInfo:
+        stat_result = os.stat(self._path(name))
+        attributes = self._read_attributes(name)
+
+        return ObjectInfo(
+            name=name,
+            size=stat_result.st_size,
+            updated=datetime.datetime.fromtimestamp(stat_result.st_mtime, tz=datetime.timezone.utc),
+            content_type=attributes["content_type"],
+            metadata=attributes["metadata"],
+        )
+
+    def _get(self, name: str) -> bytes:
+        with open(self._path(name), "rb") as f:
+            return f.read()
+
+    def _get_range(self, name: str, start: int, end: int) -> bytes:
+        with open(self._path(name), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _put(self, name: str, data: bytes, content_type: Optional[str], metadata: Optional[Dict]):
+        self._write_atomically(self._path(name), bytes(data))
+        self._write_attributes(name, {"content_type": content_type, "metadata": _stringify(metadata)})
+
+    def _list(self, prefix: str) -> List[ObjectInfo]:
+        objects = []
+        for directory, subdirectories, files in os.walk(self.root):
+            if directory == self.root and self.METADATA_DIRECTORY in subdirectories:
+                subdirectories.remove(self.METADATA_DIRECTORY)
+            for file_name in files:
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if name.startswith(prefix) and ".tmp-" not in name:
+                    objects.append(self._stat(name))
+
+        return sorted(objects, key=lambda info: info.name)
+
+    def _patch_metadata(self, name: str, metadata: Dict):
+        if not os.path.exists(self._path(name)):
+            raise FileNotFoundError(name)
+        attributes = self._read_attributes(name)
+        attributes["metadata"].update(_stringify(metadata))
+        self._write_attributes(name, attributes)
+
+    async def get(self, name: str) -> bytes:
+        return await asyncio.to_thread(self._get, name)
+
+    async def get_range(self, name: str, start: int, end: int) -> bytes:
+        return await asyncio.to_thread(self._get_range, name, start, end)
+
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, str]] = None):
+        await asyncio.to_thread(self._put, name, data, content_type, metadata)
+
+    async def list(self, prefix: str = "") -> List[ObjectInfo]:
+        return await asyncio.to_thread(self._list, prefix)
+
+    async def stat(self, name: str) -> ObjectInfo:
+        return await asyncio.to_thread(self._stat, name)
+
+    async def patch_metadata(self, name: str, metadata: Dict[str, str]):
+        await asyncio.to_thread(self._patch_metadata, name, metadata)
+
+
+class GCSObjectStore(ObjectStore):
+    """Object store on the bucket of a GoogleCloudStorageManager. Large objects use the
+    parallel sliced downloads and composite uploads of the manager."""
+
+    def __init__(self, storage_manager=None):
+        if storage_manager is None:
+            from .google_cloud_storage_manager import GoogleCloudStorageManager
+
+            storage_manager = GoogleCloudStorageManager()
+        self.storage_manager = storage_manager
+        self.bucket = storage_manager.bucket
+
+    @staticmethod
+    def _object_info(blob) -> ObjectInfo:
+        return ObjectInfo(
+            name=blob.name,
+            size=blob.size,
+            updated=blob.updated,
+            content_type=blob.content_type,
+            metadata=dict(blob.metadata or {}),
+        )
+
+    def _stat(self, name: str) -> ObjectInfo:
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            raise FileNotFoundError(name)
+        return self._object_info(blob)
+
+    def _put(self, name: str, data: bytes, content_type: Optional[str], metadata: Optional[Dict]):
+        self.storage_manager.upload_bytes(name, data, content_type=content_type)
+        if metadata:
+            self._patch_metadata(name, metadata)
+
+    def _list(self, prefix: str) -> List[ObjectInfo]:
+        blobs = self.storage_manager.client.list_blobs(self.bucket, prefix=prefix)
+        return [self._object_info(blob) for blob in blobs]
+
+    def _patch_metadata(self, name: str, metadata: Dict):
+        blob = self.bucket.blob(name)
+        blob.metadata = _stringify(metadata)
+        blob.patch()
+
+    async def get(self, name: str) -> bytes:
+        return bytes(await asyncio.to_thread(self.storage_manager.download_bytes, name))
+
+    async def get_range(self, name: str, start: int, end: int) -> bytes:
+        blob = self.bucket.blob(name)
+        return await asyncio.to_thread(blob.download_as_bytes, start=start, end=end - 1, checksum=None)
+
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, str]] = None):
+        await asyncio.to_thread(self._put, name, data, content_type, metadata)
+
+    async def list(self, prefix: str = "") -> List[ObjectInfo]:
+        return await asyncio.to_thread(self._list, prefix)
+
+    async def stat(self, name: str) -> ObjectInfo:
+        return await asyncio.to_thread(self._stat, name)
+
+    async def patch_metadata(self, name: str, metadata: Dict[str, str]):
+        await asyncio.to_thread(self._patch_metadata, name, metadata)
+
+
+class S3ObjectStore(ObjectStore):
+    """Object store on a bucket of an AWSStorageManager. S3 does not support updating the
+    metadata in place, so patching copies the object onto itself with the merged metadata."""
+
+    def __init__(self, storage_manager=None, bucket: Optional[str] = None):
+        if storage_manager is None:
+            from .AWSStorageManager import AWSStorageManager
+
+            storage_manager = AWSStorageManager()
+        self.storage_manager = storage_manager
+        self.client = storage_manager.client
+        self.bucket = bucket or storage_manager.bucket_name
+
+    def _stat(self, name: str) -> ObjectInfo:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                raise FileNotFoundError(name) from e
+            raise
+
+        return ObjectInfo(
+            name=name,
+            size=response["ContentLength"],
+            updated=response["LastModified"],
+            content_type=response.get("ContentType"),
+            metadata=response.get("Metadata", {}),
+        )
+
+    def _get_range(self, name: str, start: int, end: int) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=name, Range=f"bytes={start}-{end - 1}")
+        return response["Body"].read()
+
+    def _put(self, name: str, data: bytes, content_type: Optional[str], metadata: Optional[Dict]):
+        extra_args = {"Metadata": _stringify(metadata)}
+        if content_type:
+            extra_args["ContentType"] = content_type
+
+        self.client.upload_fileobj(
+            BytesIO(data), self.bucket, name, ExtraArgs=extra_args, Config=self.storage_manager.transfer_config
+        )
+
+    def _list_names(self, prefix: str) -> List[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [
+            item["Key"]
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+            for item in page.get("Contents", [])
+        ]
+
+    def _patch_metadata(self, name: str, metadata: Dict):
+        current = self._stat(name)
+        extra_args = {"ContentType": current.content_type} if current.content_type else {}
+
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=name,
+            CopySource={"Bucket": self.bucket, "Key": name},
+            Metadata={**current.metadata, **_stringify(metadata)},
+            MetadataDirective="REPLACE",
+            **extra_args,
+        )
+
+    async def get(self, name: str) -> bytes:
+        return await asyncio.to_thread(self.storage_manager.download_bytes, name, self.bucket)
+
+    async def get_range(self, name: str, start: int, end: int) -> bytes:
+        return await asyncio.to_thread(self._get_range, name, start, end)
+
+    async def put(self, name: str, data: bytes, content_type: Optional[str] = None,
+                  metadata: Optional[Dict[str, str]] = None):
+        await asyncio.to_thread(self._put, name, data, content_type, metadata)
+
+    async def list(self, prefix: str = "") -> List[ObjectInfo]:
+        # The listing does not return the metadata, so every object is described concurrently
+        names = await asyncio.to_thread(self._list_names, prefix)
+        return list(await asyncio.gather(*(self.stat(name) for name in names)))
+
+    async def stat(self, name: str) -> ObjectInfo:
+        return await asyncio.to_thread(self._stat, name)
+
+    async def patch_metadata(self, name: str, metadata: Dict[str, str]):
+        await asyncio.to_thread(self._patch_metadata, name, metadata)
+
+
+def get_object_store(url: str) -> ObjectStore:
+    """Creates the object store for a URL: gs://<bucket>, s3://<bucket> or a local directory
+    (with or without the file:// scheme).
+
+    Args:
+        url (str): the location of the store
+
+    Returns:
+        ObjectStore: the store
+    """
+    if url.startswith("gs://"):
+        store = GCSObjectStore()
+        store.bucket = store.storage_manager.bucket = store.storage_manager.client.bucket(url[len("gs://"):])
+        return store
+    elif url.startswith("s3://"):
+        return S3ObjectStore(bucket=url[len("s3://"):])
+
+    return LocalObjectStore(url[len("file://"):] if url.startswith("file://") else url)
+
+
+def split_object_url(url: str) -> Tuple[str, str]:
+    """Splits the location of objects in a store, e.g. s3://<bucket>/<prefix>, into the URL
+    of the store (get_object_store) and the prefix of the object names, "" or ending with /.
+    A local directory is a store of its own, without prefix.
+
+    Args:
+        url (str): the location of the objects
+
+    Returns:
+        Tuple[str, str]: the URL of the store and the prefix
+    """
+    for scheme in ("gs://", "s3://"):
+        if url.startswith(scheme):
+            bucket, _, prefix = url[len(scheme):].partition("/")
+            prefix = prefix.strip("/")
+            return f"{scheme}{bucket}", f"{prefix}/" if prefix else ""
+
+    return url, ""
@@ -0,0 +1,382 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from typing import Callable, Dict, Tuple
+from .object_store import ObjectStore, get_object_store, split_object_url
+from .utils.data.ship_registry import format_dataset_version
+
+logger = logging.getLogger(__name__)
+
+SHIP_SNAPSHOT_MANIFEST = "ship_snapshot.json"
+METADATA_SUMMARY = "metadata_summary.json"
+LEADERBOARDS_MANIFEST = "leaderboards.json"
+# the files read by the API to find the others, in their order of publication
+SERVING_MANIFESTS = [METADATA_SUMMARY, LEADERBOARDS_MANIFEST, SHIP_SNAPSHOT_MANIFEST]
+
+# the metrics ranked by the leaderboards, and their column
+LEADERBOARD_METRICS = {
+    "total_co2": "total_co2_emissions",
+    "co2_per_distance": "annual_average_co2_emissions_per_distance",
+    "fuel": "total_fuel_consumption",
+}
+# the number of ships of every leaderboard, the largest limit served from them
+LEADERBOARD_SIZE = 100
+
+# one entry per ship: the rows of the ship are snapshot[start:start + count]
+IMO_INDEX_DTYPE = np.dtype([("imo_number", "<i8"), ("start", "<i8"), ("count", "<i8")])
+
+
+def write_atomically(path: str, write: Callable[[str], None]):
+    """Writes a file under a temporary name and renames it into place, so readers never
+    see a half written file"""
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def manifest_files(path: str, *keys: str) -> set:
+    """The files named by the `keys` of the manifest in place, none if there is no manifest"""
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return {manifest[key] for key in keys if key in manifest}
+
+
+def read_latest_clean_data(clean_path: str) -> Tuple[pa.Table, Dict[int, int]]:
+    """Reads the rows of the latest version of every year from the clean table, partitioned
+    by year and version. Only the Parquet files of the latest partitions are read.
+
+    Args:
+        clean_path (str): the location of the clean table, a directory or an S3 prefix
+
+    Returns:
+        Tuple[pa.Table, Dict[int, int]]: the rows, with the columns of the latest_data query
+        of the endpoints, and the latest version of every year
+    """
+    dataset = ds.dataset(clean_path, format="parquet", partitioning="hive")
+
+    latest: Dict[int, int] = {}
+    for fragment in dataset.get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        year, version = int(keys["year"]), int(keys["version"])
+        latest[year] = max(version, latest.get(year, version))
+
+    latest_partitions = None
+    for year, version in latest.items():
+        partition = (pc.field("year") == year) & (pc.field("version") == version)
+        latest_partitions = partition if latest_partitions is None else latest_partitions | partition
+
+    table = dataset.to_table(filter=latest_partitions)
+    return table.append_column("latest_version", table["version"]), latest
+
+
+def publish_ship_snapshot(table: pa.Table, directory: str, dataset_version: str, clock=time.time) -> dict:
+    """Publishes the latest version rows for the point lookups of the ship data endpoint.
+
+    The rows are sorted by IMO number (and by reporting period, latest first) and written as
+    an uncompressed Arrow IPC file, so readers can memory-map it without copying. A sidecar
+    index holds the first row and the number of rows of every IMO number. The manifest,
+    renamed into place last, points to the files of the current dataset version.
+
+    Args:
+        table (pa.Table): the rows of the latest version of every year
+        directory (str): the directory of the serving artifacts
+        dataset_version (str): the version of the data, e.g. "2018=v5,2019=v3"
+
+    Returns:
+        dict: the manifest
+    """
+    os.makedirs(directory, exist_ok=True)
+    imo_numbers = pc.cast(table["imo_number"], pa.int64())
+    order = pc.sort_indices(
+        pa.table({"imo_number": imo_numbers, "reporting_period": table["reporting_period"]}),
+        sort_keys=[("imo_number", "ascending"), ("reporting_period", "descending")],
+    )
+    table = table.take(order).combine_chunks()
+    sorted_imo_numbers = imo_numbers.take(order).to_numpy()
+
+    keys, starts, counts = np.unique(sorted_imo_numbers, return_index=True, return_counts=True)
+    index = np.empty(len(keys), dtype=IMO_INDEX_DTYPE)
+    index["imo_number"], index["start"], index["count"] = keys, starts, counts
+
+    name = f"ships-{uuid.uuid5(uuid.NAMESPACE_URL, dataset_version).hex}"
+    snapshot, index_file = f"{name}.arrow", f"{name}.imo.npy"
+
+    def write_snapshot(path: str):
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    def write_index(path: str):
+        with open(path, "wb") as f:
+            np.save(f, index)
+
+    def write_manifest(path: str):
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    manifest = {
+        "dataset_version": dataset_version,
+        "snapshot": snapshot,
+        "index": index_file,
+        "rows": table.num_rows,
+        "ships": len(index),
+        "published_at": clock(),
+    }
+    # a reader may have read the previous manifest and not mapped its files yet, they are
+    # kept until the next publication
+    keep = {snapshot, index_file} | manifest_files(os.path.join(directory, SHIP_SNAPSHOT_MANIFEST), "snapshot", "index")
+    write_atomically(os.path.join(directory, snapshot), write_snapshot)
+    write_atomically(os.path.join(directory, index_file), write_index)
+    write_atomically(os.path.join(directory, SHIP_SNAPSHOT_MANIFEST), write_manifest)
+
+    # the readers that mapped older files keep them until they reload
+    for file_name in os.listdir(directory):
+        if file_name.startswith("ships-") and file_name not in keep and ".tmp-" not in file_name:
+            os.remove(os.path.join(directory, file_name))
+
+    logger.info(f"Published {table.num_rows} rows of {len(index)} ships for dataset version {dataset_version}")
+    return manifest
+
+
+def summarize_metadata(table: pa.Table) -> dict:
+    """The answer of the metadata endpoint for the rows of the latest version of every year:
+    the ship types, the number of distinct ships in total and per year, and the range of
+    reporting periods"""
+    ships = pa.table({"reporting_period": table["reporting_period"], "imo_number": table["imo_number"]})
+    per_year = ships.group_by("reporting_period").aggregate([("imo_number", "count_distinct")])
+    periods = pc.min_max(table["reporting_period"]).as_py()
+
+    return {
+        "ship_types": sorted(ship_type for ship_type in pc.unique(table["ship_type"]).to_pylist() if ship_type),
+        "total_ships": pc.count_distinct(table["imo_number"]).as_py(),
+        "ships_per_year": {
+            str(year): count
+            for year, count in sorted(zip(per_year["reporting_period"].to_pylist(), per_year["imo_number_count_distinct"].to_pylist()))
+        },
+        "earliest_period": periods["min"],
+        "latest_period": periods["max"],
+    }
+
+
+def publish_metadata_summary(table: pa.Table, directory: str, dataset_version: str, clock=time.time) -> dict:
+    """Publishes the summary of the metadata endpoint, a JSON file of a few hundred bytes the
+    endpoints keep in memory instead of querying the table.
+
+    Args:
+        table (pa.Table): the rows of the latest version of every year
+        directory (str): the directory of the serving artifacts
+        dataset_version (str): the version of the data, e.g. "2018=v5,2019=v3"
+
+    Returns:
+        dict: the summary
+    """
+    os.makedirs(directory, exist_ok=True)
+    summary = {"dataset_version": dataset_version, **summarize_metadata(table), "published_at": clock()}
+
+    def write_summary(path: str):
+        with open(path, "w") as f:
+            json.dump(summary, f)
+
+    write_atomically(os.path.join(directory, METADATA_SUMMARY), write_summary)
+    logger.info(f"Published the metadata summary of {summary['total_ships']} ships for dataset version {dataset_version}")
+    return summary
+
+
+def top_positions(values: np.ndarray, imo_numbers: np.ndarray, size: int) -> np.ndarray:
+    """The positions of the `size` largest values, largest first (and lowest IMO number first
+    among equal values, like the query of the ranking endpoint). Missing values (NaN) are not
+    ranked. A partial sort, O(n), finds the smallest value ranked and only the candidates
+    above it (or tied with it) are sorted."""
+    candidates = np.flatnonzero(~np.isnan(values))
+    if len(candidates) > size:
+        threshold = np.partition(values[candidates], len(candidates) - size)[len(candidates) - size]
+        candidates = candidates[values[candidates] >= threshold]
+    return candidates[np.lexsort((imo_numbers[candidates], -values[candidates]))][:size]
+
+
+def build_leaderboards(table: pa.Table, size: int = LEADERBOARD_SIZE) -> Tuple[pa.Table, list]:
+    """Ranks the ships of every reporting period and ship type by every metric of
+    LEADERBOARD_METRICS.
+
+    Args:
+        table (pa.Table): the rows of the latest version of every year
+        size (int): the number of ships of every leaderboard
+
+    Returns:
+        Tuple[pa.Table, list]: the leaderboards one after the other, with the rank, IMO
+        number, name and value of their ships, and the index of the leaderboards: their
+        metric, reporting period, ship type, first row and number of rows
+    """
+    table = table.filter(pc.is_valid(table["ship_type"]))
+    imo_numbers = pc.cast(table["imo_number"], pa.int64()).to_numpy()
+
+    # the rows sorted by reporting period and ship type, the ones of every group consecutive
+    keys = pa.table({"reporting_period": pc.cast(table["reporting_period"], pa.int64()), "ship_type": table["ship_type"]})
+    sort_keys = [("reporting_period", "ascending"), ("ship_type", "ascending")]
+    order = pc.sort_indices(keys, sort_keys=sort_keys).to_numpy()
+    groups = keys.group_by(["reporting_period", "ship_type"], use_threads=False).aggregate([([], "count_all")])
+    groups = groups.sort_by(sort_keys)
+    ends = np.cumsum(groups["count_all"].to_numpy())
+    groups = list(zip(groups["reporting_period"].to_pylist(), groups["ship_type"].to_pylist(), ends - groups["count_all"].to_numpy(), ends))
+
+    positions, ranks, scores, index = [], [], [], []
+    start = 0
+    for metric, column in LEADERBOARD_METRICS.items():
+        values = pc.cast(table[column], pa.float64()).to_numpy()
+        for reporting_period, ship_type, group_start, group_end in groups:
+            group_rows = order[group_start:group_end]
+            top = group_rows[top_positions(values[group_rows], imo_numbers[group_rows], size)]
+            index.append({
+                "metric": metric,
+                "reporting_period": reporting_period,
+                "ship_type": ship_type,
+                "start": start,
+                "count": len(top),
+            })
+            positions.append(top)
+            ranks.append(np.arange(1, len(top) + 1))
+            scores.append(values[top])
+            start += len(top)
+
+    positions = pa.array(np.concatenate(positions or [np.empty(0, dtype=np.int64)]))
+    leaderboards = pa.table({
+        "rank": pa.array(np.concatenate(ranks or [np.empty(0, dtype=np.int64)])),
+        "imo_number": pa.array(imo_numbers).take(positions),
+        "name": table["name"].take(positions),
+        "value": pa.array(np.concatenate(scores or [np.empty(0)])),
+    })
+    return leaderboards.combine_chunks(), index
+
+
+def publish_leaderboards(table: pa.Table, directory: str, dataset_version: str, size: int = LEADERBOARD_SIZE, clock=time.time) -> dict:
+    """Publishes the leaderboards of the ranking endpoint (build_leaderboards) as an
+    uncompressed Arrow IPC file, memory-mapped by the readers like the ship snapshot. The
+    manifest, renamed into place last, holds the index of the leaderboards, so a request is
+    a dictionary lookup and a zero-copy slice.
+
+    Args:
+        table (pa.Table): the rows of the latest version of every year
+        directory (str): the directory of the serving artifacts
+        dataset_version (str): the version of the data, e.g. "2018=v5,2019=v3"
+        size (int): the number of ships of every leaderboard
+
+    Returns:
+        dict: the manifest
+    """
+    os.makedirs(directory, exist_ok=True)
+    leaderboards, index = build_leaderboards(table, size)
+    file_name = f"leaderboards-{uuid.uuid5(uuid.NAMESPACE_URL, dataset_version).hex}.arrow"
+
+    def write_leaderboards(path: str):
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, leaderboards.schema) as writer:
+            writer.write_table(leaderboards)
+
+    def write_manifest(path: str):
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    manifest = {
+        "dataset_version": dataset_version,
+        "leaderboards": file_name,
+        "size": size,
+        "metrics": list(LEADERBOARD_METRICS),
+        "index": index,
+        "published_at": clock(),
+    }
+    # the file of the previous manifest is kept until the next publication, like the snapshot
+    keep = {file_name} | manifest_files(os.path.join(directory, LEADERBOARDS_MANIFEST), "leaderboards")
+    write_atomically(os.path.join(directory, file_name), write_leaderboards)
+    write_atomically(os.path.join(directory, LEADERBOARDS_MANIFEST), write_manifest)
+
+    # the readers that mapped older files keep them until they reload
+    for name in os.listdir(directory):
+        if name.startswith("leaderboards-") and name not in keep and ".tmp-" not in name:
+            os.remove(os.path.join(directory, name))
+
+    logger.info(f"Published {len(index)} leaderboards of up to {size} ships for dataset version {dataset_version}")
+    return manifest
+
+
+def upload_serving_artifacts(directory: str, store: ObjectStore, prefix: str = ""):
+    """Copies the serving artifacts of a directory to an object store, where the API syncs
+    them from (app/api/serving_sync.py). The files the manifests point to are uploaded
+    first and the manifests last, so a manifest never points to a file not uploaded yet.
+    The files of the previous dataset versions are left to the lifecycle rules of the
+    bucket, the API containers that have not synced yet still read them.
+
+    Args:
+        directory (str): the directory the artifacts were published to
+        store (ObjectStore): the store of the API
+        prefix (str): the prefix of the artifacts in the store
+    """
+    file_names = [name for name in os.listdir(directory) if name not in SERVING_MANIFESTS and ".tmp-" not in name]
+
+    def read(file_name: str) -> bytes:
+        with open(os.path.join(directory, file_name), "rb") as f:
+            return f.read()
+
+    async def upload():
+        await asyncio.gather(*(store.put(f"{prefix}{name}", read(name)) for name in file_names))
+        for name in SERVING_MANIFESTS:
+            if os.path.exists(os.path.join(directory, name)):
+                await store.put(f"{prefix}{name}", read(name), content_type="application/json")
+
+    asyncio.run(upload())
+    logger.info(f"Uploaded {len(file_names)} serving artifacts and their manifests to {prefix or 'the root of the store'}")
+
+
+def publish_serving_artifacts(clean_path: str, location: str) -> str:
+    """Publishes every serving artifact of the API from the latest versions of the clean
+    table: the metadata summary, the leaderboards and the ship snapshot. The snapshot is
+    published last, its manifest gives the dataset version served by the endpoints. It runs
+    after the clean partitions are written (etl_job.py), so the artifacts include the load.
+
+    Args:
+        clean_path (str): the location of the clean table, a directory or an S3 prefix
+        location (str): where the API reads the artifacts from: a local directory, or the
+            prefix of an object store (gs://<bucket>/<prefix>, s3://<bucket>/<prefix> or
+            file://<directory>) they are published to through a temporary directory
+
+    Returns:
+        str: the dataset version published
+    """
+    if location.startswith(("gs://", "s3://", "file://")):
+        with tempfile.TemporaryDirectory() as directory:
+            dataset_version = publish_serving_artifacts(clean_path, directory)
+            store_url, prefix = split_object_url(location)
+            upload_serving_artifacts(directory, get_object_store(store_url), prefix)
+        return dataset_version
+
+    table, latest = read_latest_clean_data(clean_path)
+    dataset_version = format_dataset_version(latest)
+    publish_metadata_summary(table, location, dataset_version)
+    publish_leaderboards(table, location, dataset_version)
+    publish_ship_snapshot(table, location, dataset_version)
+    return dataset_version
+
+
+def main():
+    publish_serving_artifacts(
+        os.environ.get("CLEAN_DATA_PATH", "s3://eu-marv-ship-emissions/clean"),
+        os.environ.get("SERVING_ARTIFACTS_URL", "../data/serving"),
+    )
+
+
+if __name__ == "__main__":
+    main()
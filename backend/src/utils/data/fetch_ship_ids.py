@@ -2,12 +2,12 @@ import os
 import boto3
 import logging
 
-import awswrangler as wr
 import pandas as pd
 
 from dotenv import load_dotenv
 from typing import Optional
 from botocore.exceptions import ClientError
+from .ship_registry import get_ship_registry
 
 load_dotenv()
 
@@ -35,40 +35,20 @@ def get_aws_session() -> boto3.Session:
         raise
 
 
-def fetch_ship_ids() -> Optional[pd.DataFrame]:
+def fetch_ship_ids(refresh: bool = False) -> Optional[pd.DataFrame]:
     """Fetch distinct ship IMO numbers and names from the latest version of each year.
+    The ships come from the local registry cache, which only queries Athena when a new
+    version of the dataset was published.
+
+    Args:
+        refresh (bool): check the dataset version even if the cache has not expired
 
     Returns:
         pd.DataFrame: DataFrame containing 'imo_number' and 'name' columns
     """
-
-    DATABASE = os.environ["DATABASE"]
-    TABLE = os.environ["TABLE"]
-
     try:
-        aws_session = get_aws_session()
-
-        query = f"""
-            WITH latest_versions AS (
-                SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
-                FROM "{DATABASE}"."{TABLE}"
-                GROUP BY CAST(year AS INTEGER)
-            ),
-
-            latest_data AS (
-                SELECT *
-                FROM "{DATABASE}"."{TABLE}" se
-                JOIN latest_versions lv
-                ON CAST(se.year AS INT) = lv.year
-                AND CAST(se.version AS INT) = lv.latest_version
-            )
-            
-            SELECT DISTINCT imo_number, name FROM latest_data;
-        """
-
-        unique_ships = wr.athena.read_sql_query(
-            query, database=DATABASE, boto3_session=aws_session
-        )
+        ships = get_ship_registry().get(refresh=refresh)
+        unique_ships = ships[["imo_number", "name"]].drop_duplicates().reset_index(drop=True)
         logger.info(
             f"Fetched all the ships from the database. There are {unique_ships.shape[0]} ships in the database."
         )
@@ -78,3 +58,17 @@ def fetch_ship_ids() -> Optional[pd.DataFrame]:
     except Exception as e:
         logger.error(f"An error occured when fetching the ship IDs: {e}")
         raise
+
+
+def fetch_ship_ids_and_types(refresh: bool = False) -> pd.DataFrame:
+    """Fetch distinct ship IMO numbers and ship types from the latest version of each year,
+    from the same registry cache as fetch_ship_ids.
+
+    Args:
+        refresh (bool): check the dataset version even if the cache has not expired
+
+    Returns:
+        pd.DataFrame: DataFrame containing 'imo_number' and 'ship_type' columns
+    """
+    ships = get_ship_registry().get(refresh=refresh)
+    return ships[["imo_number", "ship_type"]].drop_duplicates().reset_index(drop=True)
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+from typing import Iterable
+
+# Vessel prefixes that are not part of the name (motor vessel, steam ship, ...)
+PREFIXES = r"^(?:M\s?V|M\s?S|M\s?T|M\s?Y|S\s?S|R\s?V|F\s?V|L\s?NG\s?C)\s+"
+
+# The normalized names only contain A-Z, 0-9 and spaces, so every character gets a code
+# between 1 and 37 (0 is the padding) and a trigram is a single integer below 38 ** 3
+ALPHABET = " ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+ALPHABET_SIZE = len(ALPHABET) + 1
+CHARACTER_CODES = np.zeros(128, dtype=np.int64)
+CHARACTER_CODES[[ord(character) for character in ALPHABET]] = np.arange(1, ALPHABET_SIZE)
+
+# The Dice coefficient above which two names are taken to be the same ship, calibrated on the
+# perturbed names of benchmarks/name_matching_benchmark.py (python -m benchmarks.name_matching_benchmark --calibrate)
+NAME_MATCH_THRESHOLD = 0.75
+
+# Letters that have no ASCII decomposition
+TRANSLITERATION = str.maketrans({"Æ": "AE", "æ": "ae", "Ø": "O", "ø": "o", "ß": "ss", "Œ": "OE", "œ": "oe"})
+
+
+def normalize_names(names: Iterable[str]) -> pd.Series:
+    """Normalizes ship names so that spelling variants compare equal: upper case, accents
+    removed, no disambiguation in brackets (e.g. "Ever Given (ship)"), no vessel prefix
+    (e.g. "MV", "M/S") and only letters, digits and single spaces
+
+    Args:
+        names (Iterable[str]): the ship names
+
+    Returns:
+        pd.Series: the normalized names, empty strings for missing names
+    """
+    names = pd.Series(list(names) if not isinstance(names, pd.Series) else names, dtype=object)
+
+    normalized = (
+        names.fillna("")
+        .astype(str)
+        .str.translate(TRANSLITERATION)
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.upper()
+        .str.replace(r"\(.*?\)", " ", regex=True)
+        .str.replace(r"[^A-Z0-9]+", " ", regex=True)
+        .str.strip()
+        .str.replace(PREFIXES, "", regex=True)
+    )
+
+    return normalized.reset_index(drop=True)
+
+
+def _trigrams(normalized: pd.Series):
+    """Returns the distinct trigrams of every name as (name position, trigram id) pairs.
+    The names are padded with a space on each side, so the first and the last letters
+    get trigrams of their own."""
+    padded = (" " + normalized + " ").to_numpy(dtype=str)
+    lengths = np.char.str_len(padded)
+    width = max(int(lengths.max(initial=0)), 3)
+
+    codes = CHARACTER_CODES[padded.astype(f"<U{width}").view(np.uint32).reshape(len(padded), width)]
+    grams = (codes[:, :-2] * ALPHABET_SIZE + codes[:, 1:-1]) * ALPHABET_SIZE + codes[:, 2:]
+
+    valid = np.arange(width - 2) < (lengths - 2)[:, None]
+    names = np.broadcast_to(np.arange(len(padded))[:, None], grams.shape)[valid]
+    keys = np.unique(names.astype(np.int64) * ALPHABET_SIZE ** 3 + grams[valid])
+
+    return keys // ALPHABET_SIZE ** 3, keys % ALPHABET_SIZE ** 3
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Dice coefficient of the trigrams of two normalized names, between 0 and 1"""
+    names, grams = _trigrams(normalize_names([a, b]))
+    first, second = set(grams[names == 0]), set(grams[names == 1])
+    if not first or not second:
+        return 0.0
+
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+class NameIndex:
+    """Inverted index from trigrams to ship names, used to find the best match of many
+    names at once without comparing every pair.
+
+    Candidates are the indexed names that share one of the `block_grams` rarest trigrams
+    of the query (blocking), so common trigrams such as "ER " or " SE" never expand to
+    thousands of names. The candidates are then scored with the Dice coefficient of the
+    trigram sets.
+    """
+
+    def __init__(self, names: Iterable[str], block_grams: int = 4):
+        self.names = pd.Series(list(names) if not isinstance(names, pd.Series) else names).reset_index(drop=True)
+        name_ids, gram_ids = _trigrams(normalize_names(self.names))
+
+        self.size = len(self.names)
+        self.block_grams = block_grams
+        self.gram_counts = np.bincount(name_ids, minlength=self.size)
+
+        # postings in CSR layout: the names of trigram g are postings[offsets[g]:offsets[g + 1]]
+        order = np.argsort(gram_ids, kind="stable")
+        self.postings = name_ids[order]
+        self.document_frequency = np.bincount(gram_ids, minlength=ALPHABET_SIZE ** 3)
+        self.offsets = np.concatenate([[0], np.cumsum(self.document_frequency)])
+
+        # trigrams of every name in CSR layout, to score the candidates
+        self.name_offsets = np.concatenate([[0], np.cumsum(self.gram_counts)])
+        self.name_grams = gram_ids
+
+    @staticmethod
+    def _expand(offsets: np.ndarray, groups: np.ndarray):
+        """Returns, for every group, the positions offsets[g]:offsets[g + 1] and the index of
+        the group each position comes from"""
+        starts = offsets[groups]
+        counts = offsets[groups + 1] - starts
+        origins = np.repeat(np.arange(len(groups)), counts)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        return np.repeat(starts, counts) + steps, origins
+
+    def _score_batch(self, query_ids: np.ndarray, query_grams: np.ndarray, batch_size: int):
+        """Scores every query of a batch against its candidates"""
+        query_counts = np.bincount(query_ids, minlength=batch_size)
+
+        # blocking: the candidates share at least one of the rarest trigrams of the query
+        frequency = self.document_frequency[query_grams]
+        order = np.lexsort((query_grams, frequency, query_ids))
+        query_ids, query_grams, frequency = query_ids[order], query_grams[order], frequency[order]
+        rank = np.arange(len(query_ids)) - np.searchsorted(query_ids, query_ids, side="left")
+        blocking = (rank < self.block_grams) & (frequency > 0)
+
+        positions, origins = self._expand(self.offsets, query_grams[blocking])
+        pairs = np.unique(query_ids[blocking][origins] * self.size + self.postings[positions])
+        pair_queries, pair_names = pairs // self.size, pairs % self.size
+
+        # count the trigrams of every candidate that are in its query, with a dense
+        # (query, trigram) table of the batch
+        in_query = np.zeros((batch_size, ALPHABET_SIZE ** 3), dtype=bool)
+        in_query[query_ids, query_grams] = True
+        positions, origins = self._expand(self.name_offsets, pair_names)
+        shared = np.bincount(
+            origins, weights=in_query[pair_queries[origins], self.name_grams[positions]], minlength=len(pairs)
+        )
+
+        return pair_queries, pair_names, 2 * shared / (query_counts[pair_queries] + self.gram_counts[pair_names])
+
+    def match(self, queries: Iterable[str], threshold: float = 0.0, batch_size: int = 500) -> pd.DataFrame:
+        """Finds the best match of every query among the indexed names
+
+        Args:
+            queries (Iterable[str]): the names to match
+            threshold (float): the minimum score of a match
+            batch_size (int): the number of queries scored at once, which bounds the memory
+
+        Returns:
+            pd.DataFrame: for every query, in order, the best match, its position in the
+            index (-1 without a match) and its score
+        """
+        queries = pd.Series(list(queries) if not isinstance(queries, pd.Series) else queries).reset_index(drop=True)
+        normalized = normalize_names(queries)
+        positions = np.full(len(queries), -1, dtype=np.int64)
+        scores = np.zeros(len(queries))
+
+        for start in range(0, len(queries), batch_size):
+            batch = normalized.iloc[start:start + batch_size]
+            pair_queries, pair_names, pair_scores = self._score_batch(*_trigrams(batch), len(batch))
+            if len(pair_queries) == 0:
+                continue
+
+            # the best candidate of every query, the first indexed name on ties
+            order = np.lexsort((pair_names, -pair_scores, pair_queries))
+            best = order[np.unique(pair_queries[order], return_index=True)[1]]
+            positions[start + pair_queries[best]] = pair_names[best]
+            scores[start + pair_queries[best]] = pair_scores[best]
+
+        matched = (positions >= 0) & (scores >= threshold) & (scores > 0)
+        positions[~matched] = -1
+        scores[~matched] = 0.0
+
+        return pd.DataFrame({
+            "query": queries,
+            "match": self.names.reindex(positions).to_numpy(),
+            "index": positions,
+            "score": scores,
+        })
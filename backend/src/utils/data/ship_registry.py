@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import time
+import uuid
+
+import pandas as pd
+
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_COLUMNS = ["imo_number", "name", "ship_type"]
+
+REGISTRY_QUERY = """
+    WITH latest_versions AS (
+        SELECT CAST(year AS INTEGER) AS year, MAX(CAST(version AS INTEGER)) AS latest_version
+        FROM "{database}"."{table}"
+        GROUP BY CAST(year AS INTEGER)
+    ),
+
+    latest_data AS (
+        SELECT *
+        FROM "{database}"."{table}" se
+        JOIN latest_versions lv
+        ON CAST(se.year AS INT) = lv.year
+        AND CAST(se.version AS INT) = lv.latest_version
+    )
+
+    SELECT DISTINCT imo_number, name, ship_type FROM latest_data;
+"""
+
+
+def latest_versions_from_partitions(partitions: Dict[str, list], partition_keys: list) -> Dict[int, int]:
+    """Returns the latest version of every year from the year/version partitions of the table"""
+    year_index, version_index = partition_keys.index("year"), partition_keys.index("version")
+    latest: Dict[int, int] = {}
+    for values in partitions.values():
+        year, version = int(values[year_index]), int(values[version_index])
+        latest[year] = max(version, latest.get(year, version))
+
+    return latest
+
+
+def format_dataset_version(latest: Dict[int, int]) -> str:
+    return ",".join(f"{year}=v{version}" for year, version in sorted(latest.items()))
+
+
+def glue_dataset_version(session, database: str, table: str) -> str:
+    """Describes the data behind the latest-version query, e.g. "2018=v5,2019=v3". Reading the
+    partitions from the Glue catalog is a metadata call, much cheaper than an Athena query.
+
+    Args:
+        session (boto3.Session): the AWS session
+        database (str): the Glue database
+        table (str): the table partitioned by year and version
+
+    Returns:
+        str: the dataset version
+    """
+    import awswrangler as wr
+
+    partition_keys = [
+        key["Name"]
+        for key in session.client("glue").get_table(DatabaseName=database, Name=table)["Table"]["PartitionKeys"]
+    ]
+    partitions = wr.catalog.get_partitions(database=database, table=table, boto3_session=session)
+    return format_dataset_version(latest_versions_from_partitions(partitions, partition_keys))
+
+
+def athena_registry_loader(session, database: str, table: str) -> pd.DataFrame:
+    import awswrangler as wr
+
+    return wr.athena.read_sql_query(
+        REGISTRY_QUERY.format(database=database, table=table), database=database, boto3_session=session
+    )
+
+
+class ShipRegistryCache:
+    """Local cache of the ships of the latest version of every year (IMO number, name and
+    ship type).
+
+    The ships are kept in a Parquet snapshot on disk, keyed by the dataset version it was
+    built from. Within the TTL the snapshot is used without any remote call. After the TTL,
+    the dataset version is checked (a Glue metadata call) and the ships are only queried
+    again from Athena if a new version was published. If the version cannot be checked, a
+    stale snapshot is used rather than failing.
+    """
+
+    MANIFEST = "ship_registry.json"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        ttl_seconds: float = 24 * 3600,
+        loader: Optional[Callable[[], pd.DataFrame]] = None,
+        version_resolver: Optional[Callable[[], str]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.loader = loader or self._athena_loader
+        self.version_resolver = version_resolver or self._glue_version_resolver
+        self.clock = clock
+        self._session = None
+        self._ships: Optional[pd.DataFrame] = None
+        self._version: Optional[str] = None
+
+    def _aws_session(self):
+        if self._session is None:
+            from .fetch_ship_ids import get_aws_session
+
+            self._session = get_aws_session()
+        return self._session
+
+    def _athena_loader(self) -> pd.DataFrame:
+        return athena_registry_loader(self._aws_session(), os.environ["DATABASE"], os.environ["TABLE"])
+
+    def _glue_version_resolver(self) -> str:
+        return glue_dataset_version(self._aws_session(), os.environ["DATABASE"], os.environ["TABLE"])
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, self.MANIFEST)
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if not os.path.exists(os.path.join(self.cache_dir, manifest["snapshot"])):
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _read_snapshot(self, manifest: dict) -> pd.DataFrame:
+        if self._ships is None or self._version != manifest["version"]:
+            self._ships = pd.read_parquet(os.path.join(self.cache_dir, manifest["snapshot"]))
+            self._version = manifest["version"]
+        return self._ships
+
+    def _write_snapshot(self, ships: pd.DataFrame, version: str) -> dict:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        snapshot = f"ship_registry-{uuid.uuid5(uuid.NAMESPACE_URL, version).hex}.parquet"
+        tmp_path = os.path.join(self.cache_dir, f"{snapshot}.tmp-{uuid.uuid4().hex}")
+        ships.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(self.cache_dir, snapshot))
+
+        manifest = {"version": version, "snapshot": snapshot, "checked_at": self.clock()}
+        self._write_manifest(manifest)
+
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith("ship_registry-") and file_name != snapshot and ".tmp-" not in file_name:
+                os.remove(os.path.join(self.cache_dir, file_name))
+
+        return manifest
+
+    def get(self, refresh: bool = False) -> pd.DataFrame:
+        """Returns the ships, with imo_number, name and ship_type columns
+
+        Args:
+            refresh (bool): check the dataset version even if the TTL has not expired
+
+        Returns:
+            pd.DataFrame: the distinct ships of the latest version of every year
+        """
+        manifest = self._read_manifest()
+        if manifest and not refresh and self.clock() - manifest["checked_at"] < self.ttl_seconds:
+            return self._read_snapshot(manifest)
+
+        try:
+            version = self.version_resolver()
+        except Exception as e:
+            if manifest is None:
+                raise
+            logger.warning(f"Could not check the dataset version, using the snapshot of {manifest['version']}: {e}")
+            return self._read_snapshot(manifest)
+
+        if manifest and manifest["version"] == version:
+            self._write_manifest({**manifest, "checked_at": self.clock()})
+            return self._read_snapshot(manifest)
+
+        logger.info(f"Fetching the ships of dataset version {version}")
+        ships = self.loader()[REGISTRY_COLUMNS].drop_duplicates().reset_index(drop=True)
+        manifest = self._write_snapshot(ships, version)
+        self._ships, self._version = ships, version
+
+        return ships
+
+    def refresh(self) -> pd.DataFrame:
+        return self.get(refresh=True)
+
+
+_default_registry: Optional[ShipRegistryCache] = None
+
+
+def get_ship_registry() -> ShipRegistryCache:
+    """Returns the registry cache shared by the scripts of the process"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ShipRegistryCache(
+            cache_dir=os.environ.get("SHIP_REGISTRY_CACHE_DIR", "../data/cache/ship_registry"),
+            ttl_seconds=float(os.environ.get("SHIP_REGISTRY_TTL_SECONDS", 24 * 3600)),
+        )
+    return _default_registry
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Optional, Set
+
+from .utils.data.name_matching import NAME_MATCH_THRESHOLD, name_similarity
+
+logger = logging.getLogger(__name__)
+
+
+def parse_infobox(html_page: str) -> Dict[str, str]:
+    """Returns the label/value rows of the infobox of a ship article. It runs in the
+    parsing processes, so BeautifulSoup is only imported there."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_page, "html.parser")
+    table = soup.find("table", attrs={"class": "infobox"})
+    if table is None:
+        return {}
+    table_body = table.find("tbody") or table
+
+    ship_info_dict = {}
+    rows = table_body.find_all("tr", attrs={"style": "vertical-align:top;"})
+    for row in rows:
+        cols = [ele.text.strip() for ele in row.find_all("td")]
+
+        if len(cols) == 2:
+            ship_info_dict[cols[0]] = cols[1]
+
+    return ship_info_dict
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Tokens are added at `rate` per second up to `capacity`,
+    and every request takes one, waiting for it if the bucket is empty. Waiting callers
+    reserve their token before sleeping, so they are served in order."""
+
+    def __init__(self, rate: float, capacity: int = 1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes a token and returns the time waited for it"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class ContentCache:
+    """On-disk cache of the search results and the article HTML.
+
+    Contents are stored once under the sha256 of their bytes (`objects/`), and every request
+    (e.g. the search of an IMO number) points to the contents it returned (`refs/`). Pages
+    reached through several searches are stored once, and a cache entry is never half written
+    because both files are renamed into place.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def _digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, kind: str, digest: str) -> str:
+        return os.path.join(self.directory, kind, digest[:2], digest)
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _ref_path(self, namespace: str, key: str) -> str:
+        return self._path("refs", self._digest(f"{namespace}\0{key}".encode("utf-8")))
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        try:
+            with open(self._ref_path(namespace, key), "r") as f:
+                digest = f.read()
+            with open(self._path("objects", digest), "rb") as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def put(self, namespace: str, key: str, value: str):
+        data = value.encode("utf-8")
+        digest = self._digest(data)
+        object_path = self._path("objects", digest)
+
+        if not os.path.exists(object_path):
+            self._write(object_path, data)
+        self._write(self._ref_path(namespace, key), digest.encode("utf-8"))
+
+
+def load_checkpoint(path: str) -> Dict[str, dict]:
+    """Reads the records of the ships already crawled, keyed by IMO number. A line cut by
+    a crash is ignored, and a ship crawled twice keeps its latest record."""
+    records = {}
+    if not os.path.exists(path):
+        return records
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[str(record["imo_number"])] = record
+
+    return records
+
+
+class WikipediaCrawler:
+    """Crawls the Wikipedia articles of the ships concurrently.
+
+    Searches and page downloads run in a thread pool and share a token bucket, so the
+    request rate stays under the limit whatever the number of threads. Every response is
+    kept in a ContentCache, so a rerun does not repeat requests. The infoboxes are parsed
+    in a process pool while the downloads go on, and every finished ship is appended to a
+    JSONL checkpoint, so an interrupted crawl resumes where it stopped.
+
+    An article is only downloaded if its title matches the name of the ship, with the
+    matcher and the threshold of the NameIndex (src/utils/data/name_matching.py).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        checkpoint_path: str,
+        client=None,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        max_workers: int = 4,
+        parse_workers: Optional[int] = None,
+        name_threshold: float = NAME_MATCH_THRESHOLD,
+        similarity: Callable[[str, str], float] = name_similarity,
+        parse: Callable[[str], Dict[str, str]] = parse_infobox,
+    ):
+        if client is None:
+            import wikipedia
+
+            client = wikipedia
+        self.client = client
+        self.cache = ContentCache(cache_dir)
+        self.checkpoint_path = checkpoint_path
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self.max_workers = max_workers
+        self.parse_workers = parse_workers
+        self.name_threshold = name_threshold
+        self.similarity = similarity
+        self.parse = parse
+        self._checkpoint_lock = threading.Lock()
+
+    def search(self, imo_number) -> Optional[str]:
+        """Returns the title of the first search result for the IMO number"""
+        query = f"IMO number: {imo_number}"
+        cached = self.cache.get("search", query)
+        if cached is None:
+            self.rate_limiter.acquire()
+            cached = json.dumps(self.client.search(query, results=1))
+            self.cache.put("search", query, cached)
+
+        results = json.loads(cached)
+        return results[0] if results else None
+
+    def fetch_html(self, title: str) -> str:
+        html_page = self.cache.get("html", title)
+        if html_page is None:
+            # loading the page and its HTML are two requests
+            self.rate_limiter.acquire()
+            page_object = self.client.page(title, auto_suggest=False)
+            self.rate_limiter.acquire()
+            html_page = page_object.html()
+            self.cache.put("html", title, html_page)
+
+        return html_page
+
+    def fetch(self, imo_number, name: str) -> dict:
+        """Searches the article of a ship and downloads it if its title matches the name. A
+        ship without a name is recorded as invalid without a request, no title can match it."""
+        if not isinstance(name, str) or not name.strip():
+            return {"imo_number": str(imo_number), "name": None, "status": "invalid"}
+
+        record = {"imo_number": str(imo_number), "name": name}
+        try:
+            title = self.search(imo_number)
+            if title is None:
+                return {**record, "status": "not_found"}
+            if self.similarity(name, title) < self.name_threshold:
+                return {**record, "status": "no_match", "title": title}
+
+            return {**record, "status": "found", "title": title, "html": self.fetch_html(title)}
+        except Exception as e:
+            logger.warning(f"Failed to crawl {imo_number}: {e}")
+            return {**record, "status": "error", "error": str(e)}
+
+    def _write_checkpoint(self, record: dict):
+        record = {key: value for key, value in record.items() if key != "html"}
+        line = json.dumps(record, ensure_ascii=False)
+
+        with self._checkpoint_lock, open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+
+    def _write_parsed(self, record: dict, future: Future):
+        try:
+            record = {**record, "infobox": future.result()}
+        except Exception as e:
+            logger.warning(f"Failed to parse the article of {record['imo_number']}: {e}")
+            record = {**record, "status": "error", "error": str(e)}
+        self._write_checkpoint(record)
+
+    def run(self, ships: pd.DataFrame) -> Dict[str, dict]:
+        """Crawls the ships that are not in the checkpoint yet. Ships that failed with an
+        error are crawled again, the ones without a name are checkpointed as invalid and
+        not crawled again.
+
+        Args:
+            ships (pd.DataFrame): the ships, with imo_number and name columns
+
+        Returns:
+            Dict[str, dict]: the records of all the crawled ships keyed by IMO number
+        """
+        done: Set[str] = {
+            imo_number for imo_number, record in load_checkpoint(self.checkpoint_path).items()
+            if record["status"] != "error"
+        }
+        pending = ships[~ships["imo_number"].astype(str).isin(done)]
+        logger.info(f"{len(done)} ships already crawled, {len(pending)} to go")
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        parser = ProcessPoolExecutor(self.parse_workers) if self.parse_workers != 0 else None
+        try:
+            with ThreadPoolExecutor(self.max_workers) as fetcher:
+                futures = [
+                    fetcher.submit(self.fetch, row.imo_number, row.name)
+                    for row in pending[["imo_number", "name"]].itertuples(index=False)
+                ]
+                for future in as_completed(futures):
+                    record = future.result()
+                    if record["status"] != "found":
+                        self._write_checkpoint(record)
+                    elif parser is None:
+                        parsed = Future()
+                        try:
+                            parsed.set_result(self.parse(record["html"]))
+                        except Exception as e:
+                            parsed.set_exception(e)
+                        self._write_parsed(record, parsed)
+                    else:
+                        parsed = parser.submit(self.parse, record["html"])
+                        parsed.add_done_callback(lambda f, record=record: self._write_parsed(record, f))
+        finally:
+            if parser is not None:
+                parser.shutdown(wait=True)
+
+        return load_checkpoint(self.checkpoint_path)
@@ -0,0 +1,88 @@
+import importlib
+import pytest
+import pandas as pd
+
+from app.api import query_backend
+from app.api.query_backend import DuckDBBackend, QueryBackend
+
+DATABASE = "ship-emissions-database"
+TABLE = "clean_emissions"
+ENDPOINTS = ["emissions_endpoint", "metadata_endpoint", "rankings_endpoint", "ship_data_endpoint", "ship_types_endpoint"]
+
+
+def make_report(imo_numbers, ship_types, year, co2):
+    return pd.DataFrame({
+        "imo_number": imo_numbers,
+        "name": [f"SHIP {imo_number}" for imo_number in imo_numbers],
+        "ship_type": ship_types,
+        "reporting_period": year,
+        "port_of_registry": "Valletta",
+        "home_port": None,
+        "ice_class": "IA",
+        "doc_issue_date": "2019-03-01",
+        "doc_expiry_date": "2024-06-30",
+        "verifier_number": "1234",
+        "technical_efficiency_value": "12.3",
+        "total_co2_emissions": co2,
+        "co2_emissions_from_all_voyages_between_ports_under_a_ms_jurisdiction": 10.5,
+        "co2_emissions_from_all_voyages_which_departed_from_ports_under_a_ms_jurisdiction": 20.25,
+        "co2_emissions_from_all_voyages_to_ports_under_a_ms_jurisdiction": 30.0,
+        "co2_emissions_which_occurred_within_ports_under_a_ms_jurisdiction_at_berth": 4.0,
+        "co2_emissions_assigned_to_passenger_transport": None,
+        "co2_emissions_assigned_to_freight_transport": 5.5,
+        "co2_emissions_assigned_to_on_laden": 6.0,
+        "annual_average_co2_emissions_per_distance": [1000 / value for value in co2],
+        "total_fuel_consumption": [value / 4 for value in co2],
+    })
+
+
+@pytest.fixture
+def clean_table(tmp_path):
+    """The clean table partitioned by year and version. 2018 was published twice and only
+    its second version is served."""
+    reports = {
+        (2018, 1): make_report([9000001, 9000002, 9000003], ["Container ship", "Oil tanker", "Oil tanker"], 2018, [1.0, 2.0, 3.0]),
+        (2018, 2): make_report([9000001, 9000002], ["Container ship", "Oil tanker"], 2018, [100.5, 200.5]),
+        (2019, 1): make_report([9000001, 9000003, 9000004], ["Container ship", "Oil tanker", "Bulk carrier"], 2019, [110.0, 310.0, 410.0]),
+    }
+    for (year, version), report in reports.items():
+        partition = tmp_path / "clean" / f"year={year}" / f"version={version}"
+        partition.mkdir(parents=True)
+        report.to_parquet(partition / "part-00000.snappy.parquet", index=False)
+
+    return str(tmp_path / "clean")
+
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    monkeypatch.setenv("DATABASE", DATABASE)
+    monkeypatch.setenv("TABLE", TABLE)
+    monkeypatch.setenv("API_URL", "https://api.example.com")
+
+    return {
+        name: importlib.reload(importlib.import_module(f"app.api.endpoints.{name}"))
+        for name in ENDPOINTS
+    }
+
+
+@pytest.fixture
+def duckdb_backend(clean_table, monkeypatch):
+    """The DuckDB backend over the clean table, used by the endpoints"""
+    backend = DuckDBBackend(DATABASE, TABLE, clean_table)
+    monkeypatch.setattr(query_backend, "_default_backend", backend)
+    return backend
+
+
+class RecordingBackend(QueryBackend):
+    def __init__(self, backend):
+        self.backend = backend
+        self.queries = []
+        self.parameters = []
+
+    def execute(self, query, parameters=None):
+        self.queries.append(query)
+        self.parameters.append(parameters)
+        return self.backend.execute(query, parameters)
+
+    def columns(self, table):
+        return self.backend.columns(table)
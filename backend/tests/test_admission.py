@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+import pytest
+
+from botocore.exceptions import ClientError
+from app.api import admission, query_backend
+from app.api.admission import (
+    INTERACTIVE,
+    SCAN,
+    AdmissionBackend,
+    AdmissionController,
+    QueueFullError,
+    query_priority,
+)
+from app.api.query_backend import QueryBackend
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def hold_slot(controller, release, priority=SCAN):
+    """Takes a slot of the controller until `release` is set"""
+    def run():
+        with controller.admit(priority):
+            release.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_queries_over_the_limit_wait_for_a_slot():
+    controller = AdmissionController(max_in_flight=2)
+    running, max_running, lock = [0], [0], threading.Lock()
+
+    def query():
+        with controller.admit():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=query) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics = controller.metrics
+    assert max_running[0] == 2
+    assert (metrics["admitted"], metrics["in_flight"], metrics["queue_depth"]) == (8, 0, 0)
+    assert metrics["max_queue_depth"] >= 1 and metrics["wait_seconds_max"] > 0
+
+
+def test_interactive_queries_pass_the_waiting_scans():
+    controller = AdmissionController(max_in_flight=1)
+    release, order = threading.Event(), []
+    blocker = hold_slot(controller, release)
+    wait_until(lambda: controller.metrics["in_flight"] == 1)
+
+    def query(name, priority):
+        with controller.admit(priority):
+            order.append(name)
+
+    threads = []
+    for name, priority in [("scan 1", SCAN), ("scan 2", SCAN), ("lookup", INTERACTIVE)]:
+        threads.append(threading.Thread(target=query, args=(name, priority)))
+        threads[-1].start()
+        wait_until(lambda: controller.metrics["queue_depth"] == len(threads))
+
+    release.set()
+    for thread in threads + [blocker]:
+        thread.join()
+
+    assert order == ["lookup", "scan 1", "scan 2"]
+
+
+def test_queries_are_rejected_when_the_queue_is_full_or_too_slow():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_wait_seconds=0.05)
+    release = threading.Event()
+    blocker = hold_slot(controller, release)
+    wait_until(lambda: controller.metrics["in_flight"] == 1)
+
+    # waits in the queue until it times out
+    with pytest.raises(QueueFullError, match="Timed out"):
+        with controller.admit():
+            pass
+
+    waiting = hold_slot(controller, release)
+    wait_until(lambda: controller.metrics["queue_depth"] == 1)
+    with pytest.raises(QueueFullError, match="queue is full") as error:
+        with controller.admit(INTERACTIVE):
+            pass
+    assert error.value.retry_after >= 1
+
+    release.set()
+    blocker.join()
+    waiting.join()
+    assert controller.metrics["rejected"] == 2
+
+
+class PriorityRecorder(QueryBackend):
+    def __init__(self, error=None):
+        self.priorities = []
+        self.error = error
+
+    def execute(self, query, parameters=None):
+        self.priorities.append(admission._query_priority.get())
+        if self.error:
+            raise self.error
+        return [{"total_results": "0"}]
+
+
+def test_point_lookups_are_interactive(endpoints, monkeypatch):
+    recorder = PriorityRecorder()
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+
+    endpoints["emissions_endpoint"].lambda_handler({"queryStringParameters": {"ship_id": "9000001"}}, None)
+    endpoints["emissions_endpoint"].lambda_handler({"queryStringParameters": {"ship_type": "Oil tanker"}}, None)
+    endpoints["ship_data_endpoint"].lambda_handler({"pathParameters": {"ship_id": "9000001"}}, None)
+
+    assert recorder.priorities == [INTERACTIVE, INTERACTIVE, SCAN, SCAN, INTERACTIVE]
+
+
+def test_overloaded_endpoints_answer_503_with_retry_after(endpoints, monkeypatch):
+    throttled = ClientError({"Error": {"Code": "TooManyRequestsException"}}, "StartQueryExecution")
+    backend = AdmissionBackend(PriorityRecorder(error=throttled), AdmissionController(max_in_flight=1))
+    monkeypatch.setattr(query_backend, "_default_backend", backend)
+
+    responses = [
+        endpoints["emissions_endpoint"].lambda_handler({"queryStringParameters": None}, None),
+        endpoints["emissions_endpoint"].batch_lambda_handler({"queryStringParameters": {"ship_ids": "9000001"}}, None),
+        endpoints["ship_data_endpoint"].lambda_handler({"pathParameters": {"ship_id": "9000001"}}, None),
+        endpoints["ship_types_endpoint"].lambda_handler(
+            {"queryStringParameters": {"ship_type": "Oil tanker", "page": "1", "limit": "10"}}, None
+        ),
+        endpoints["metadata_endpoint"].lambda_handler({}, None),
+    ]
+
+    for response in responses:
+        assert response["statusCode"] == 503
+        assert response["headers"]["Retry-After"] == "1"
+        assert "error" in json.loads(response["body"])
+
+
+def test_priority_is_scoped_to_the_block():
+    with query_priority(INTERACTIVE):
+        assert admission._query_priority.get() == INTERACTIVE
+    assert admission._query_priority.get() == SCAN
@@ -0,0 +1,89 @@
+import gzip
+import io
+import json
+import subprocess
+import sys
+import pytest
+
+from pathlib import Path
+from wsgiref.util import setup_testing_defaults
+from app.api import app
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def api(endpoints, duckdb_backend, monkeypatch):
+    # the endpoint modules reloaded by the endpoints fixture
+    monkeypatch.setattr(app, "_handlers", {})
+    return app.lambda_handler
+
+
+def body(response):
+    assert isinstance(response["body"], str)
+    return json.loads(response["body"])
+
+
+def test_every_endpoint_is_routed(api, endpoints):
+    metadata = body(api({"httpMethod": "GET", "path": "/metadata"}, None))
+    assert metadata["results"][0]["total_ships"] == "4"
+
+    ship = body(api({"httpMethod": "GET", "path": "/ships/9000001"}, None))
+    assert [row["reporting_period"] for row in ship["results"]] == ["2019", "2018"]
+
+    event = {"httpMethod": "GET", "path": "/ships", "queryStringParameters": {"ship_type": "Oil tanker", "page": "1", "limit": "10"}}
+    assert body(api(event, None))["metadata"]["total_results"] == 2
+
+    batch = {"httpMethod": "POST", "path": "/emissions/batch", "body": json.dumps({"ship_ids": [9000004]})}
+    assert body(api(batch, None))["results"][0]["total_results"] == 1
+
+
+def test_http_api_events_are_routed_without_their_stage(api):
+    event = {
+        "rawPath": "/dev/ships/9000002",
+        "requestContext": {"stage": "dev", "http": {"method": "GET"}},
+        "queryStringParameters": {"fields": "imo_number"},
+    }
+    assert body(api(event, None))["results"] == [{"imo_number": "9000002"}]
+
+
+def test_unknown_routes_and_methods(api):
+    assert api({"httpMethod": "GET", "path": "/ports"}, None)["statusCode"] == 404
+
+    response = api({"httpMethod": "DELETE", "path": "/emissions/batch"}, None)
+    assert response["statusCode"] == 405 and response["headers"]["Allow"] == "GET, POST"
+
+
+def test_error_bodies_are_serialized(api):
+    response = api({"httpMethod": "GET", "path": "/emissions", "queryStringParameters": {"limit": "1000"}}, None)
+    assert response["statusCode"] == 400 and "Limit" in body(response)["error"]
+
+
+def test_the_wsgi_server_decodes_the_responses(api):
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/emissions", "QUERY_STRING": "limit=100&format=typed",
+               "HTTP_ACCEPT_ENCODING": "gzip"}
+    setup_testing_defaults(environ)
+    started = []
+    chunks = app.wsgi_app(environ, lambda status, headers: started.append((status, dict(headers))))
+
+    status, headers = started[0]
+    assert status == "200 OK" and headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(b"".join(chunks)))["results"][0]["imo_number"] == 9000001
+
+    environ = {"REQUEST_METHOD": "POST", "PATH_INFO": "/emissions/batch", "CONTENT_TYPE": "application/json"}
+    setup_testing_defaults(environ)
+    payload = json.dumps({"ship_ids": [9000003]}).encode()
+    environ.update({"CONTENT_LENGTH": str(len(payload)), "wsgi.input": io.BytesIO(payload)})
+    chunks = app.wsgi_app(environ, lambda status, headers: started.append((status, dict(headers))))
+    assert json.loads(b"".join(chunks))["results"][0]["ship_id"] == "9000003"
+
+
+def test_importing_the_application_does_no_work():
+    code = (
+        "import sys, app.api.app; "
+        "print([m for m in sys.modules if m.startswith('app.api.endpoints.') or m in ('boto3', 'numpy', 'pyarrow', 'duckdb')])"
+    )
+    # from the backend directory, wherever pytest runs from
+    backend = Path(__file__).resolve().parents[1]
+    result = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,54 @@
+import pytest
+import pandas as pd
+
+from unittest.mock import patch
+from src.AWSStorageManager import AWSStorageManager
+
+
+@pytest.fixture
+def storage_manager(monkeypatch):
+    """Fixture that creates an AWSStorageManager with a mocked boto3 client."""
+    monkeypatch.setenv("AWS_ACCESS_KEY", "key")
+    monkeypatch.setenv("AWS_SECRET_KEY", "secret")
+    monkeypatch.setenv("REGION_NAME", "eu-west-1")
+    monkeypatch.setenv("BUCKET_NAME", "bucket")
+
+    with patch("src.AWSStorageManager.boto3") as mock_boto3:
+        manager = AWSStorageManager(max_pool_connections=25, max_workers=4)
+        yield manager, mock_boto3
+
+
+def test_client_is_created_once_with_pool(storage_manager):
+    manager, mock_boto3 = storage_manager
+
+    manager.upload_file("a.csv", "bucket", "raw/a.csv")
+    manager.upload_file("b.csv", "bucket", "raw/b.csv")
+
+    mock_boto3.client.assert_called_once()
+    assert mock_boto3.client.call_args.kwargs["config"].max_pool_connections == 25
+    assert manager.client.upload_file.call_count == 2
+
+
+def test_download_file_from_bucket_in_memory(storage_manager):
+    manager, _ = storage_manager
+
+    def write_csv(bucket, key, fileobj, **kwargs):
+        fileobj.write(b"Reporting Period,Version\n2023,33\n")
+
+    manager.client.download_fileobj.side_effect = write_csv
+
+    df = manager.download_file_from_bucket(bucket_layer="raw", blob_name="reports_metadata.csv")
+
+    assert manager.client.download_fileobj.call_args.args[:2] == ("bucket", "raw/reports_metadata.csv")
+    pd.testing.assert_frame_equal(df, pd.DataFrame({"Reporting Period": [2023], "Version": [33]}))
+
+
+def test_upload_many_and_download_many(storage_manager):
+    manager, _ = storage_manager
+    manager.client.download_fileobj.side_effect = lambda bucket, key, fileobj, **kwargs: fileobj.write(key.encode())
+
+    uploaded = manager.upload_many([("/tmp/a.csv", "raw/a.csv"), ("/tmp/b.csv", "raw/b.csv")])
+    downloaded = manager.download_many(["raw/a.csv", "raw/b.csv"])
+
+    assert uploaded == {"raw/a.csv": True, "raw/b.csv": True}
+    assert downloaded == {"raw/a.csv": b"raw/a.csv", "raw/b.csv": b"raw/b.csv"}
@@ -0,0 +1,113 @@
+import pytest
+
+from app.api import query_backend, ship_snapshot
+from app.api.caching import is_not_modified
+from app.api.ship_snapshot import ShipSnapshotReader
+from src.serving_artifacts import publish_ship_snapshot, read_latest_clean_data
+from tests.conftest import RecordingBackend
+
+SHIP_TYPES_EVENT = {"queryStringParameters": {"ship_type": "Oil tanker", "page": "1", "limit": "10"}}
+
+
+@pytest.fixture
+def recorder(duckdb_backend, monkeypatch):
+    monkeypatch.setenv("DATASET_VERSION", "2018=v2,2019=v1")
+    recorder = RecordingBackend(duckdb_backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+    return recorder
+
+
+def conditional(event, **headers):
+    return {**event, "headers": headers}
+
+
+@pytest.mark.parametrize("name, event", [("metadata_endpoint", {}), ("ship_types_endpoint", SHIP_TYPES_EVENT)])
+def test_repeat_visits_are_answered_without_querying(endpoints, recorder, name, event):
+    handler = endpoints[name].lambda_handler
+    response = handler(event, None)
+    etag = response["headers"]["ETag"]
+    assert etag.startswith('W/"') and "max-age=300" in response["headers"]["Cache-Control"]
+
+    queries = len(recorder.queries)
+    not_modified = handler(conditional(event, **{"If-None-Match": etag}), None)
+
+    assert not_modified["statusCode"] == 304 and not_modified["body"] == ""
+    assert not_modified["headers"]["ETag"] == etag
+    assert len(recorder.queries) == queries
+
+
+@pytest.mark.parametrize("name, query", [
+    ("ship_types_endpoint", None),
+    ("ship_types_endpoint", {"ship_type": "Oil tanker", "limit": "10"}),
+    ("ship_types_endpoint", {"ship_type": "Oil tanker", "page": "first", "limit": "10"}),
+    ("ship_types_endpoint", {"ship_type": "Oil tanker", "page": "1", "limit": "1000"}),
+    ("ship_types_endpoint", {"page": "1", "limit": "10"}),
+    ("emissions_endpoint", {"page": "first"}),
+    ("emissions_endpoint", {"limit": "0"}),
+])
+def test_invalid_requests_are_rejected_before_the_conditional_check(endpoints, recorder, name, query):
+    handler = endpoints[name].lambda_handler
+    response = handler(conditional({"queryStringParameters": query}, **{"If-None-Match": "*"}), None)
+    assert response["statusCode"] == 400 and recorder.queries == []
+
+
+@pytest.mark.parametrize("query", [
+    {"ship_ids": "9000001,first"},
+    {"ship_ids": "9000001", "fields": "speed"},
+    {"ship_ids": "9000001", "format": "xml"},
+])
+def test_invalid_batches_are_rejected_before_the_conditional_check(endpoints, recorder, query):
+    handler = endpoints["emissions_endpoint"].batch_lambda_handler
+    response = handler(conditional({"queryStringParameters": query}, **{"If-None-Match": "*"}), None)
+    assert response["statusCode"] == 400 and recorder.queries == []
+
+
+def test_etags_change_with_the_dataset_version_and_the_request(endpoints, recorder, monkeypatch):
+    handler = endpoints["emissions_endpoint"].lambda_handler
+    etag = handler({"queryStringParameters": {"year": "2018"}}, None)["headers"]["ETag"]
+
+    assert handler({"queryStringParameters": {"year": "2019"}}, None)["headers"]["ETag"] != etag
+
+    monkeypatch.setenv("DATASET_VERSION", "2018=v3,2019=v1")
+    response = handler(conditional({"queryStringParameters": {"year": "2018"}}, **{"if-none-match": etag}), None)
+    assert response["statusCode"] == 200 and response["headers"]["ETag"] != etag
+
+
+def test_last_modified_is_the_publication_of_the_snapshot(endpoints, recorder, clean_table, tmp_path, monkeypatch):
+    monkeypatch.delenv("DATASET_VERSION")
+    table, _ = read_latest_clean_data(clean_table)
+    publish_ship_snapshot(table, str(tmp_path / "serving"), "2018=v2,2019=v1", clock=lambda: 1700000000.5)
+    monkeypatch.setattr(
+        ship_snapshot, "_default_reader", ShipSnapshotReader(str(tmp_path / "serving"), clock=lambda: 1700000100)
+    )
+
+    event = {"pathParameters": {"ship_id": "9000001"}}
+    response = endpoints["ship_data_endpoint"].lambda_handler(event, None)
+    assert response["headers"]["Last-Modified"] == "Tue, 14 Nov 2023 22:13:20 GMT"
+
+    since = conditional(event, **{"If-Modified-Since": "Tue, 14 Nov 2023 22:13:20 GMT"})
+    assert endpoints["ship_data_endpoint"].lambda_handler(since, None)["statusCode"] == 304
+    before = conditional(event, **{"If-Modified-Since": "Tue, 14 Nov 2023 22:13:19 GMT"})
+    assert endpoints["ship_data_endpoint"].lambda_handler(before, None)["statusCode"] == 200
+
+
+def test_nothing_is_cached_without_a_dataset_version(endpoints, duckdb_backend, monkeypatch):
+    monkeypatch.delenv("DATASET_VERSION", raising=False)
+    response = endpoints["metadata_endpoint"].lambda_handler(conditional({}, **{"If-None-Match": "*"}), None)
+
+    assert response["statusCode"] == 200
+    assert "ETag" not in response["headers"] and "Cache-Control" not in response["headers"]
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"other", W/"abc"', True),
+    ("*", True),
+    ('W/"other"', False),
+])
+def test_if_none_match_uses_the_weak_comparison(if_none_match, expected):
+    # If-None-Match wins over If-Modified-Since
+    event = {"headers": {"If-None-Match": if_none_match, "If-Modified-Since": "Tue, 14 Nov 2023 22:13:20 GMT"}}
+    headers = {"ETag": 'W/"abc"', "Last-Modified": "Tue, 14 Nov 2023 22:13:20 GMT"}
+    assert is_not_modified(event, headers) is expected
@@ -1,9 +1,18 @@
 import pytest
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
 from selenium.common.exceptions import TimeoutException
-from src.data_acquisition import check_for_new_report_versions, get_reporting_table_content, prepare_selenium_params
+from src.data_acquisition import (
+    check_for_new_report_versions,
+    get_reporting_table_content,
+    prepare_selenium_params,
+    build_interim_schema,
+    change_format_and_upload_to_interim_bucket,
+)
 
 
 def create_test_df(periods, versions, dates, files):
@@ -207,4 +216,114 @@ def test_exception_during_table_wait(mock_wait, mock_prepare_selenium):
     mock_driver.get.assert_called_once()
     mock_wait.assert_called_once()
     mock_driver.quit.assert_called_once()
-    assert result is None
\ No newline at end of file
+    assert result is None
+
+
+def test_build_interim_schema():
+    schema = build_interim_schema(
+        ["IMO Number", "Name", "Reporting Period", "Total CO₂ emissions [m tonnes]", "A"]
+    )
+
+    assert schema.field("IMO Number").type == pa.int64()
+    assert schema.field("Reporting Period").type == pa.int64()
+    assert schema.field("Total CO₂ emissions [m tonnes]").type == pa.float64()
+    assert schema.field("Name").type == pa.string()
+    assert schema.field("A").type == pa.string()
+
+
+class StubS3Client:
+    """Keeps the objects and the parts of the multipart uploads in memory"""
+
+    def __init__(self, failing_part=None):
+        self.objects = {}
+        self.parts = {}
+        self.aborted = []
+        self.part_counts = []
+        self.failing_part = failing_part
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.parts[Key] = {}
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.failing_part:
+            raise ClientError({"Error": {"Code": "500"}}, "UploadPart")
+        self.parts[UploadId][PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.parts.pop(UploadId)
+        self.part_counts.append(len(parts))
+        assert [part["PartNumber"] for part in MultipartUpload["Parts"]] == sorted(parts)
+        self.objects[Key] = b"".join(parts[number] for number in sorted(parts))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.parts.pop(UploadId)
+        self.aborted.append(Key)
+
+
+def raw_report(rows):
+    return pd.DataFrame({
+        "IMO Number": [1234567 + i for i in range(rows)],
+        "Name": [f"Ship {i}" for i in range(rows)],
+        "Reporting Period": [2023] * rows,
+        "Verifier Address": ["Addr"] * rows,
+        "Total CO₂ emissions [m tonnes]": [300.6 if i % 2 == 0 else "Division by zero!" for i in range(rows)],
+    })
+
+
+@patch('src.data_acquisition.get_s3_client')
+@patch('src.data_acquisition.pd.read_excel')
+def test_change_format_and_upload_to_interim_bucket(mock_read_excel, mock_get_s3_client):
+    mock_read_excel.return_value = raw_report(2)
+    mock_get_s3_client.return_value = client = StubS3Client()
+
+    change_format_and_upload_to_interim_bucket(
+        filepath="/tmp/report.xlsx", bucket_name="bucket", s3_file_name="interim/2023/report.parquet"
+    )
+
+    # smaller than a part, sent with a single PUT
+    assert list(client.objects) == ["interim/2023/report.parquet"] and client.parts == {}
+    table = pq.read_table(pa.BufferReader(client.objects["interim/2023/report.parquet"]))
+    assert "Verifier Address" not in table.column_names
+    assert table.schema.field("IMO Number").type == pa.int64()
+    assert table.schema.field("Total CO₂ emissions [m tonnes]").type == pa.float64()
+    assert table.column("Total CO₂ emissions [m tonnes]").to_pylist() == [300.6, None]
+
+
+@patch('src.data_acquisition.INTERIM_ROW_GROUP_SIZE', 100)
+@patch('src.data_acquisition.INTERIM_PART_SIZE', 1024)
+@patch('src.data_acquisition.get_s3_client')
+@patch('src.data_acquisition.pd.read_excel')
+def test_interim_file_is_streamed_in_parts(mock_read_excel, mock_get_s3_client):
+    mock_read_excel.return_value = raw_report(1000)
+    mock_get_s3_client.return_value = client = StubS3Client()
+
+    change_format_and_upload_to_interim_bucket(
+        filepath="/tmp/report.xlsx", bucket_name="bucket", s3_file_name="interim/2023/report.parquet"
+    )
+
+    assert client.part_counts[0] > 1
+    parquet_file = pq.ParquetFile(pa.BufferReader(client.objects["interim/2023/report.parquet"]))
+    assert parquet_file.metadata.num_row_groups == 10
+    table = parquet_file.read()
+    assert table.column("IMO Number").to_pylist() == [1234567 + i for i in range(1000)]
+    assert table.column("Total CO₂ emissions [m tonnes]").null_count == 500
+
+
+@patch('src.data_acquisition.INTERIM_PART_SIZE', 1024)
+@patch('src.data_acquisition.get_s3_client')
+@patch('src.data_acquisition.pd.read_excel')
+def test_failed_interim_upload_is_aborted(mock_read_excel, mock_get_s3_client):
+    mock_read_excel.return_value = raw_report(1000)
+    mock_get_s3_client.return_value = client = StubS3Client(failing_part=2)
+
+    change_format_and_upload_to_interim_bucket(
+        filepath="/tmp/report.xlsx", bucket_name="bucket", s3_file_name="interim/2023/report.parquet"
+    )
+
+    assert client.objects == {} and client.parts == {}
+    assert client.aborted == ["interim/2023/report.parquet"]
@@ -0,0 +1,70 @@
+import base64
+import json
+import pytest
+
+from app.api import query_backend, ship_snapshot
+from app.api.ship_snapshot import ShipSnapshotReader
+from src.serving_artifacts import publish_ship_snapshot, read_latest_clean_data
+from tests.conftest import RecordingBackend
+
+
+def batch(endpoints, event):
+    return endpoints["emissions_endpoint"].batch_lambda_handler(event, None)
+
+
+def single(endpoints, ship_id):
+    response = endpoints["emissions_endpoint"].lambda_handler({"queryStringParameters": {"ship_id": ship_id}}, None)
+    return json.loads(response["body"])["results"]
+
+
+@pytest.fixture
+def recorder(duckdb_backend, monkeypatch):
+    recorder = RecordingBackend(duckdb_backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+    return recorder
+
+
+def test_ships_are_resolved_with_one_query_and_grouped(endpoints, recorder):
+    response = batch(endpoints, {"queryStringParameters": {"ship_ids": "9000003, 9000001,9999999,9000003"}})
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 200
+    assert len(recorder.queries) == 1
+    assert [(ship["ship_id"], ship["total_results"]) for ship in body["results"]] == [
+        ("9000003", 1), ("9000001", 2), ("9999999", 0)
+    ]
+    assert body["metadata"]["total_results"] == 3
+    assert body["results"][1]["results"] == single(endpoints, "9000001")
+
+
+def test_ship_ids_can_be_posted(endpoints, recorder):
+    body = json.dumps({"ship_ids": [9000002, "9000004"]})
+    for event in [{"body": body}, {"body": base64.b64encode(body.encode()).decode(), "isBase64Encoded": True}]:
+        results = json.loads(batch(endpoints, event)["body"])["results"]
+        assert [ship["ship_id"] for ship in results] == ["9000002", "9000004"]
+
+
+def test_snapshot_ships_are_not_queried(endpoints, recorder, clean_table, tmp_path, monkeypatch):
+    table, _ = read_latest_clean_data(clean_table)
+    publish_ship_snapshot(table, str(tmp_path / "serving"), "2018=v2,2019=v1")
+    monkeypatch.setattr(ship_snapshot, "_default_reader", ShipSnapshotReader(str(tmp_path / "serving")))
+
+    results = json.loads(batch(endpoints, {"queryStringParameters": {"ship_ids": "9000001,9999999"}})["body"])["results"]
+
+    assert results[0]["results"] == single(endpoints, "9000001")
+    assert recorder.parameters[0] == [9999999]
+
+
+@pytest.mark.parametrize("event", [
+    {"queryStringParameters": {"ship_ids": "9000001,abc"}},
+    {"queryStringParameters": None},
+    {"body": "not json"},
+    {"body": json.dumps({"ship_ids": "9000001"})},
+    {"queryStringParameters": {"ship_ids": ",".join(str(9000000 + i) for i in range(201))}},
+])
+def test_invalid_batches_are_rejected(endpoints, recorder, event):
+    response = batch(endpoints, event)
+
+    assert response["statusCode"] == 400
+    assert "error" in json.loads(response["body"])
+    assert recorder.queries == []
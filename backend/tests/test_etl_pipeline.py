@@ -1,9 +1,12 @@
+import asyncio
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, Mock
 import pandas as pd
 import datetime
 import pandas.api.types as ptypes
 from src.etl_pipeline import ETLPipeline
+from src.object_store import LocalObjectStore
 
 @pytest.fixture
 def etl_pipeline():
@@ -206,6 +209,17 @@ def test_run(etl_pipeline):
         assert 'processed_date' in mock_blob.metadata
         mock_blob.patch.assert_called_once()
 
+def test_synchronous_methods_with_an_injected_store(tmp_path):
+    """Test that the synchronous methods use the GCS bucket when another store is given."""
+    with patch('src.etl_pipeline.GoogleCloudStorageManager') as mock_storage_manager:
+        etl = ETLPipeline(object_store=LocalObjectStore(str(tmp_path)))
+        mock_storage_manager.assert_not_called()
+
+        mock_storage_manager.return_value.client.list_blobs.return_value = []
+        assert etl.extract() == {}
+        assert etl.storage_client is mock_storage_manager.return_value
+        mock_storage_manager.assert_called_once()
+
 def test_tranform_adds_version_and_date_from_filename():
     """Test that version and generation date are extracted from filename."""
     pipeline = object.__new__(ETLPipeline)
@@ -224,4 +238,61 @@ def test_tranform_adds_version_and_date_from_filename():
     assert 'generation_date' in result.columns
     gen_date = result['generation_date'].iloc[0]
     assert ptypes.is_datetime64_any_dtype(result['generation_date'].dtype)
-    assert pd.Timestamp('2023-03-15') == pd.Timestamp(gen_date)
\ No newline at end of file
+    assert pd.Timestamp('2023-03-15') == pd.Timestamp(gen_date)
+
+
+def test_tranform_is_called_without_a_pipeline():
+    """Test that tranform runs on the class, as the transform workers call it, like on an instance."""
+    test_filepath = 'bronze-bucket/2024/2024-v2-15032023-info.xlsx'
+
+    result = ETLPipeline.tranform(df=_build_minimal_input_df(), file_=test_filepath)
+    expected = object.__new__(ETLPipeline).tranform(df=_build_minimal_input_df(), file_=test_filepath)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert result['version'].iloc[0] == '2'
+
+def test_run_pipelined_on_local_store(tmp_path):
+    """Test that the pipelined mode processes only the new reports and records the metrics."""
+    store = LocalObjectStore(str(tmp_path))
+    new_reports = [f"bronze-bucket/{year}/{year}-v1-01012025-info.xlsx" for year in (2021, 2022, 2023)]
+    for report_name in new_reports:
+        asyncio.run(store.put(report_name, report_name.encode(), metadata={'processed_by_ETL': False}))
+    asyncio.run(store.put('bronze-bucket/2020/2020-v9-01012025-info.xlsx', b'old', metadata={'processed_by_ETL': True}))
+
+    pipeline = ETLPipeline(object_store=store)
+    with patch('src.etl_pipeline.transform_report', side_effect=lambda contents, name: contents.upper()), \
+         ThreadPoolExecutor(max_workers=2) as executor:
+        metrics = pipeline.run_pipelined(transform_workers=2, queue_size=1, executor=executor)
+
+    for report_name in new_reports:
+        _, year, filename = report_name.split('/')
+        silver = asyncio.run(store.get(f"silver-bucket/{year}/{filename.replace('xlsx', 'parquet')}"))
+        assert silver == report_name.upper().encode()
+        assert asyncio.run(store.stat(report_name)).metadata['processed_by_ETL'] == 'True'
+
+    assert not asyncio.run(store.list(prefix='silver-bucket/2020/'))
+    summary = metrics.summary()
+    assert summary['download']['count'] == summary['transform']['count'] == summary['upload']['count'] == 3
+    assert summary['downloaded_queue']['max_depth'] <= 1
+
+def test_run_pipelined_skips_the_reports_that_fail(tmp_path):
+    """Test that a report failing to transform is logged and skipped, not processed, and the others loaded."""
+    store = LocalObjectStore(str(tmp_path))
+    reports = [f"bronze-bucket/{year}/{year}-v1-01012025-info.xlsx" for year in (2021, 2022, 2023)]
+    for report_name in reports:
+        asyncio.run(store.put(report_name, report_name.encode(), metadata={'processed_by_ETL': False}))
+
+    def transform(contents, name):
+        if '2022' in name:
+            raise ValueError('corrupt report')
+        return contents
+
+    pipeline = ETLPipeline(object_store=store)
+    with patch('src.etl_pipeline.transform_report', side_effect=transform), \
+         ThreadPoolExecutor(max_workers=2) as executor:
+        metrics = pipeline.run_pipelined(transform_workers=2, queue_size=1, executor=executor)
+
+    assert metrics.failed_reports == [reports[1]]
+    assert metrics.summary()['upload']['count'] == 2
+    assert asyncio.run(store.stat(reports[1])).metadata['processed_by_ETL'] == 'False'
+    assert asyncio.run(store.stat(reports[2])).metadata['processed_by_ETL'] == 'True'
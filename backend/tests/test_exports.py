@@ -0,0 +1,119 @@
+import importlib
+import io
+import json
+import pytest
+
+from botocore.exceptions import ClientError
+from unittest.mock import MagicMock
+from app.api.exports import ExportRequest, export_select
+from tests.conftest import DATABASE, TABLE
+
+JOB_ID = "6f1c2a4e-8d3b-4c5a-9e7f-0a1b2c3d4e5f"
+EXPORT_LOCATION = "s3://eu-marv-ship-emissions/exports"
+
+
+@pytest.fixture
+def export_endpoint(endpoints, duckdb_backend, monkeypatch):
+    monkeypatch.setenv("OUTPUT_LOCATION", "s3://athena-results/")
+    monkeypatch.setenv("EXPORT_LOCATION", EXPORT_LOCATION)
+    module = importlib.reload(importlib.import_module("app.api.endpoints.export_endpoint"))
+    exports = module.get_exports()
+    exports._athena_client, exports._s3_client = MagicMock(), MagicMock()
+    exports.athena_client.start_query_execution.return_value = {"QueryExecutionId": JOB_ID}
+    return module
+
+
+def submit(export_endpoint, body):
+    return export_endpoint.submit_lambda_handler({"body": json.dumps(body)}, None)
+
+
+def execution(state, query=f"UNLOAD (SELECT 1) TO '{EXPORT_LOCATION}/abc/' WITH (format = 'PARQUET')", **statistics):
+    return {"QueryExecution": {"Query": query, "Status": {"State": state}, "Statistics": statistics}}
+
+
+def test_an_export_is_a_single_unload(export_endpoint):
+    response = submit(export_endpoint, {"format": "tsv", "ship_type": "Oil tanker", "year": 2019, "fields": ["imo_number", "name"]})
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 202
+    assert body == {"job_id": JOB_ID, "status": "QUEUED", "status_url": f"https://api.example.com/exports/{JOB_ID}"}
+    assert response["headers"]["Location"] == body["status_url"]
+
+    kwargs = export_endpoint.get_exports().athena_client.start_query_execution.call_args.kwargs
+    query = kwargs["QueryString"]
+    assert query.startswith("UNLOAD (") and f"TO '{EXPORT_LOCATION}/" in query
+    assert query.endswith("WITH (format = 'TEXTFILE', field_delimiter = '\\t')")
+    assert 'SELECT "imo_number", "name"' in query and "Oil tanker" not in query
+    assert kwargs["ExecutionParameters"] == ["'Oil tanker'", "2019"]
+    assert kwargs["ResultConfiguration"] == {"OutputLocation": "s3://athena-results/"}
+
+
+@pytest.mark.parametrize("body", [
+    {"format": "xlsx"},
+    {"format": "csv"},
+    {"year": "last"},
+    {"ship_ids": "9000001"},
+    {"fields": ["imo_number", "password"]},
+    ["not", "an", "object"],
+])
+def test_invalid_exports_are_rejected(export_endpoint, body):
+    assert submit(export_endpoint, body)["statusCode"] == 400
+    export_endpoint.get_exports().athena_client.start_query_execution.assert_not_called()
+
+
+def test_throttled_exports_are_retried_later(export_endpoint):
+    start = export_endpoint.get_exports().athena_client.start_query_execution
+    start.side_effect = ClientError({"Error": {"Code": "TooManyRequestsException"}}, "StartQueryExecution")
+
+    response = submit(export_endpoint, {})
+    assert response["statusCode"] == 503 and response["headers"]["Retry-After"] == "1"
+
+
+def test_the_progress_and_files_of_an_export_are_polled(export_endpoint):
+    exports = export_endpoint.get_exports()
+    exports.athena_client.get_query_execution.side_effect = [
+        execution("RUNNING", DataScannedInBytes=1024, TotalExecutionTimeInMillis=1500),
+        execution("SUCCEEDED", DataScannedInBytes=4096, TotalExecutionTimeInMillis=3000),
+    ]
+    exports.s3_client.get_object.return_value = {"Body": io.BytesIO(
+        f"{EXPORT_LOCATION}/abc/part-0.parquet\n{EXPORT_LOCATION}/abc/part-1.parquet\n".encode()
+    )}
+    exports.s3_client.generate_presigned_url.side_effect = lambda method, Params, ExpiresIn: f"https://signed/{Params['Key']}"
+
+    def poll():
+        response = export_endpoint.status_lambda_handler({"pathParameters": {"job_id": JOB_ID}}, None)
+        assert response["headers"]["Cache-Control"] == "no-store"
+        return json.loads(response["body"])
+
+    running = poll()
+    assert (running["status"], running["bytes_scanned"], running["elapsed_seconds"]) == ("RUNNING", 1024, 1.5)
+    assert "files" not in running
+
+    done = poll()
+    assert done["files"] == ["https://signed/exports/abc/part-0.parquet", "https://signed/exports/abc/part-1.parquet"]
+    exports.s3_client.get_object.assert_called_once_with(Bucket="athena-results", Key=f"{JOB_ID}-manifest.csv")
+
+
+@pytest.mark.parametrize("job_id, result", [
+    ("../etc/passwd", None),
+    (JOB_ID, execution("SUCCEEDED", query="SELECT * FROM clean_emissions")),
+    (JOB_ID, ClientError({"Error": {"Code": "InvalidRequestException"}}, "GetQueryExecution")),
+])
+def test_only_exports_can_be_polled(export_endpoint, job_id, result):
+    athena = export_endpoint.get_exports().athena_client
+    athena.get_query_execution.side_effect = [result]
+
+    response = export_endpoint.status_lambda_handler({"pathParameters": {"job_id": job_id}}, None)
+    assert response["statusCode"] == 404
+
+
+def test_the_export_query_runs_on_the_latest_version(duckdb_backend):
+    query, parameters = export_select(DATABASE, TABLE, ExportRequest(ship_ids=[9000001, 9000003], fields=["imo_number", "year"]))
+    rows = duckdb_backend.execute(query + "ORDER BY imo_number, year", parameters)
+
+    assert rows == [
+        {"imo_number": "9000001", "year": "2018"},
+        {"imo_number": "9000001", "year": "2019"},
+        {"imo_number": "9000003", "year": "2019"},
+    ]
+    assert len(duckdb_backend.execute(*export_select(DATABASE, TABLE, ExportRequest()))) == 5
@@ -0,0 +1,108 @@
+import json
+import pytest
+
+from unittest.mock import MagicMock
+from app.api import query_backend, ship_snapshot
+from app.api.query_backend import AthenaBackend, parse_fields
+from app.api.ship_snapshot import ShipSnapshotReader
+from src.serving_artifacts import publish_ship_snapshot, read_latest_clean_data
+from tests.conftest import DATABASE, TABLE, RecordingBackend
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def recorder(duckdb_backend, monkeypatch):
+    recorder = RecordingBackend(duckdb_backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+    return recorder
+
+
+def response_body(response, status=200):
+    assert response["statusCode"] == status
+    return json.loads(response["body"])
+
+
+def test_fields_are_parsed_in_order_and_validated():
+    allowed = ["imo_number", "name", "total_co2_emissions"]
+
+    assert parse_fields(None, allowed) is None
+    assert parse_fields("total_co2_emissions, name,name", allowed) == ["total_co2_emissions", "name"]
+    for value in ["", " , ", "name,ship_type", "name; DROP TABLE x", 'name"']:
+        with pytest.raises(ValueError, match="Invalid parameter value"):
+            parse_fields(value, allowed)
+
+
+def test_emissions_select_only_the_requested_fields(endpoints, recorder):
+    event = {"queryStringParameters": {"ship_type": "Oil tanker", "fields": "imo_number,total_co2_emissions"}}
+    body = response_body(endpoints["emissions_endpoint"].lambda_handler(event, None))
+
+    assert body["results"] == [
+        {"imo_number": "9000002", "total_co2_emissions": "200.5"},
+        {"imo_number": "9000003", "total_co2_emissions": "310.0"},
+    ]
+    assert "SELECT imo_number, total_co2_emissions\n" in recorder.queries[0]
+    assert "name" not in recorder.queries[0]
+
+
+def test_unknown_fields_are_rejected_before_querying(endpoints, recorder):
+    event = {"queryStringParameters": {"ship_id": "9000001", "fields": "port_of_registry"}}
+    response = endpoints["emissions_endpoint"].lambda_handler(event, None)
+
+    assert response["statusCode"] == 400
+    assert recorder.queries == []
+
+
+def test_batches_are_grouped_without_the_imo_number_field(endpoints, recorder):
+    event = {"queryStringParameters": {"ship_ids": "9000003,9000001", "fields": "reporting_period"}}
+    body = response_body(endpoints["emissions_endpoint"].batch_lambda_handler(event, None))
+
+    assert [ship["results"] for ship in body["results"]] == [
+        [{"reporting_period": "2019"}],
+        [{"reporting_period": "2019"}, {"reporting_period": "2018"}],
+    ]
+
+
+def test_ship_data_fields_are_checked_against_the_table(endpoints, recorder):
+    ship_data = endpoints["ship_data_endpoint"]
+    event = {"pathParameters": {"ship_id": "9000001"}, "queryStringParameters": {"fields": "port_of_registry,latest_version"}}
+    body = response_body(ship_data.lambda_handler(event, None))
+
+    assert body["results"] == [
+        {"port_of_registry": "Valletta", "latest_version": "1"},
+        {"port_of_registry": "Valletta", "latest_version": "2"},
+    ]
+    assert 'SELECT "port_of_registry", "latest_version"' in recorder.queries[0]
+
+    event["queryStringParameters"]["fields"] = "port_of_registry,secret"
+    assert "secret" in response_body(ship_data.lambda_handler(event, None), 400)["error"]
+
+
+def test_ship_data_fields_are_read_from_the_snapshot(endpoints, recorder, clean_table, tmp_path, monkeypatch):
+    table, _ = read_latest_clean_data(clean_table)
+    publish_ship_snapshot(table, str(tmp_path / "serving"), "2018=v2,2019=v1")
+    monkeypatch.setattr(ship_snapshot, "_default_reader", ShipSnapshotReader(str(tmp_path / "serving")))
+
+    event = {"pathParameters": {"ship_id": "9000001"}, "queryStringParameters": {"fields": "year,total_co2_emissions"}}
+    body = response_body(endpoints["ship_data_endpoint"].lambda_handler(event, None))
+
+    assert body["results"] == [
+        {"year": "2019", "total_co2_emissions": "110.0"},
+        {"year": "2018", "total_co2_emissions": "100.5"},
+    ]
+    assert recorder.queries == []
+
+
+def test_athena_columns_are_read_once_from_the_catalog():
+    client = MagicMock()
+    client.get_table_metadata.return_value = {"TableMetadata": {
+        "Columns": [{"Name": "imo_number"}, {"Name": "name"}],
+        "PartitionKeys": [{"Name": "year"}, {"Name": "version"}],
+    }}
+    backend = AthenaBackend(DATABASE, "s3://results/", client=client)
+
+    assert backend.columns(TABLE) == ["imo_number", "name", "year", "version"]
+    assert backend.columns(TABLE) == ["imo_number", "name", "year", "version"]
+    client.get_table_metadata.assert_called_once_with(
+        CatalogName="AwsDataCatalog", DatabaseName=DATABASE, TableName=TABLE
+    )
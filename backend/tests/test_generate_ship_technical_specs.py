@@ -0,0 +1,129 @@
+import importlib.util
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
+from unittest.mock import patch
+from src.data_generation import generate_ship_technical_specs as specs
+
+# sdv is only installed with the data generation scripts, the sampling is also tested with a stub
+requires_sdv = pytest.mark.skipif(importlib.util.find_spec("sdv") is None, reason="sdv is not installed")
+
+
+class StubSynthesizer:
+    """Samples from its random state, reset by set_random_state like an sdv synthesizer"""
+
+    def __init__(self):
+        self.rng = np.random.default_rng(0)
+
+    def set_random_state(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, num_rows):
+        return pd.DataFrame({"IMO_number": np.zeros(num_rows, dtype=int), "length (m)": self.rng.uniform(50, 400, num_rows)})
+
+
+def load_stub_synthesizer(path):
+    return StubSynthesizer()
+
+
+@pytest.fixture
+def training_data():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "IMO_number": np.arange(9000000, 9000200),
+        "gross_tonnage": rng.uniform(1000, 100000, 200).round(),
+        "dwt (tonnes)": rng.uniform(1000, 200000, 200).round(),
+        "length (m)": rng.uniform(50, 400, 200).round(1),
+        "beam (m)": rng.uniform(10, 60, 200).round(1),
+        "built_year": rng.integers(1990, 2024, 200),
+    })
+
+
+def test_fingerprint_changes_only_with_the_training_data(training_data):
+    fingerprint = specs.training_data_fingerprint(training_data)
+
+    assert specs.training_data_fingerprint(training_data.copy()) == fingerprint
+
+    changed = training_data.copy()
+    changed.loc[0, "beam (m)"] += 1
+    assert specs.training_data_fingerprint(changed) != fingerprint
+    assert specs.training_data_fingerprint(training_data.rename(columns={"beam (m)": "beam"})) != fingerprint
+
+
+@requires_sdv
+def test_saved_synthesizer_is_reused(training_data, tmp_path):
+    path = specs.load_or_fit_synthesizer(training_data, str(tmp_path))
+    assert os.path.exists(path)
+
+    from sdv.single_table import GaussianCopulaSynthesizer
+
+    with patch.object(GaussianCopulaSynthesizer, "fit") as fit:
+        assert specs.load_or_fit_synthesizer(training_data, str(tmp_path)) == path
+    fit.assert_not_called()
+
+
+@requires_sdv
+def test_sampling_does_not_depend_on_the_number_of_workers(training_data, tmp_path):
+    path = specs.load_or_fit_synthesizer(training_data, str(tmp_path))
+    imo_numbers = np.arange(9100000, 9100250)
+
+    single = specs.sample_synthetic_specs(path, imo_numbers, str(tmp_path / "single.parquet"), seed=3,
+                                          chunk_size=100, workers=1)
+    parallel = specs.sample_synthetic_specs(path, imo_numbers, str(tmp_path / "parallel.parquet"), seed=3,
+                                            chunk_size=100, workers=2)
+
+    single, parallel = pd.read_parquet(single), pd.read_parquet(parallel)
+    assert single["imo_number"].tolist() == imo_numbers.tolist()
+    assert single["synthetic"].all()
+    assert "IMO_number" not in single.columns
+    pd.testing.assert_frame_equal(single, parallel)
+
+
+@requires_sdv
+def test_no_ships_is_an_error(training_data, tmp_path):
+    path = specs.load_or_fit_synthesizer(training_data, str(tmp_path))
+    with pytest.raises(ValueError):
+        specs.sample_synthetic_specs(path, [], str(tmp_path / "empty.parquet"))
+    assert not (tmp_path / "empty.parquet").exists()
+
+
+def test_chunks_are_seeded_whatever_the_worker(tmp_path):
+    imo_numbers = np.arange(9100000, 9100250)
+
+    def sample(name, seed=3, workers=1):
+        path = specs.sample_synthetic_specs("stub", imo_numbers, str(tmp_path / f"{name}.parquet"), seed=seed,
+                                            chunk_size=100, workers=workers, loader=load_stub_synthesizer)
+        return pd.read_parquet(path)
+
+    single, parallel = sample("single"), sample("parallel", workers=2)
+    assert single["imo_number"].tolist() == imo_numbers.tolist()
+    assert "IMO_number" not in single.columns
+    pd.testing.assert_frame_equal(single, parallel)
+
+    # every chunk has a seed of its own, derived from the seed of the run
+    lengths = single["length (m)"].to_numpy()
+    assert not np.array_equal(lengths[:100], lengths[100:200])
+    assert not np.array_equal(lengths, sample("other", seed=4)["length (m)"].to_numpy())
+
+
+def test_sdv_synthesizers_are_seeded_only_on_the_checked_versions(monkeypatch):
+    seeds = []
+
+    class GaussianCopulaSynthesizer:
+        __module__ = "sdv.single_table.copulas"
+
+        def _set_random_state(self, seed):
+            seeds.append(seed)
+
+    synthesizer = GaussianCopulaSynthesizer()
+
+    monkeypatch.setattr(specs.importlib.metadata, "version", lambda name: "1.17.4")
+    specs.seed_synthesizer(synthesizer, 7)
+    assert seeds == [7]
+
+    monkeypatch.setattr(specs.importlib.metadata, "version", lambda name: "1.18.0")
+    with pytest.raises(RuntimeError):
+        specs.seed_synthesizer(synthesizer, 8)
+    assert seeds == [7]
@@ -0,0 +1,101 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.data_generation.generate_voyage_data import VoyageDataGenerator
+
+
+@pytest.fixture
+def generator():
+    return VoyageDataGenerator()
+
+
+@pytest.fixture
+def vessels(generator):
+    ship_types = list(generator.vessel_types) + ["Unsupported type"]
+    return pd.DataFrame({
+        "imo_number": np.arange(9000000, 9000000 + 520),
+        "ship_type": [ship_types[i % len(ship_types)] for i in range(520)],
+    })
+
+
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic"""
+    values = np.sort(np.concatenate([a, b]))
+    cdf_a = np.searchsorted(np.sort(a), values, side="right") / len(a)
+    cdf_b = np.searchsorted(np.sort(b), values, side="right") / len(b)
+    return np.max(np.abs(cdf_a - cdf_b))
+
+
+def test_vectorized_has_same_layout_as_per_row(generator, vessels):
+    np.random.seed(0)
+    per_row = generator.generate_fleet_data(vessels, range(2018, 2020))
+    vectorized = generator.generate_fleet_data_vectorized(vessels, range(2018, 2020), seed=0)
+
+    assert list(vectorized.columns) == list(per_row.columns)
+    assert vectorized[["imo_number", "reporting_period", "ship_type"]].equals(
+        per_row[["imo_number", "reporting_period", "ship_type"]]
+    )
+    assert "Unsupported type" not in vectorized["ship_type"].values
+
+
+def test_vectorized_keeps_the_relationships(generator, vessels):
+    data = generator.generate_fleet_data_vectorized(vessels, range(2018, 2024), seed=1)
+    max_distance = data["ship_type"].map({name: specs["total_distance"][1] for name, specs in generator.vessel_types.items()})
+
+    assert (data["EU_Port_Calls"] + data["Non_EU_Port_Calls"] == data["Total_Port_Calls"]).all()
+    assert (data["Laden_Voyages"] + data["Ballast_Voyages"] == data["Total_Port_Calls"]).all()
+    assert (data["Total_Distance"] <= max_distance).all()
+    np.testing.assert_allclose(
+        data["Distance_EU_Waters"] + data["Distance_Non_EU_Waters"], data["Total_Distance"], atol=0.011
+    )
+
+
+def test_vectorized_is_reproducible(generator, vessels):
+    first = generator.generate_fleet_data_vectorized(vessels, range(2018, 2020), seed=42)
+    second = generator.generate_fleet_data_vectorized(vessels, range(2018, 2020), seed=42)
+    other = generator.generate_fleet_data_vectorized(vessels, range(2018, 2020), seed=43)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert not first.equals(other)
+
+
+@pytest.mark.parametrize("column", [
+    "Total_Port_Calls", "EU_Port_Calls", "Total_Distance", "Distance_EU_Waters",
+    "Average_Trip_Distance", "Laden_Voyages", "Days_At_Sea", "Average_Port_Stay",
+])
+def test_vectorized_is_statistically_equivalent(generator, vessels, column):
+    np.random.seed(7)
+    per_row = generator.generate_fleet_data(vessels, range(2018, 2024))
+    vectorized = generator.generate_fleet_data_vectorized(vessels, range(2018, 2024), seed=7)
+
+    # the critical value of the KS test for 3000 samples per side at the 0.001 level is ~0.05
+    for ship_type in generator.vessel_types:
+        assert ks_statistic(
+            per_row.loc[per_row["ship_type"] == ship_type, column].to_numpy(),
+            vectorized.loc[vectorized["ship_type"] == ship_type, column].to_numpy(),
+        ) < 0.25
+    assert ks_statistic(per_row[column].to_numpy(), vectorized[column].to_numpy()) < 0.05
+
+
+def test_sharded_output_does_not_depend_on_workers_or_shards(generator, vessels, tmp_path):
+    one_worker = generator.generate_fleet_data_sharded(
+        vessels, range(2018, 2021), str(tmp_path / "one"), seed=3, workers=1, vessels_per_shard=200, row_group_vessels=64
+    )
+    two_workers = generator.generate_fleet_data_sharded(
+        vessels, range(2018, 2021), str(tmp_path / "two"), seed=3, workers=2, vessels_per_shard=200, row_group_vessels=64
+    )
+    other_shards = generator.generate_fleet_data_sharded(
+        vessels, range(2018, 2021), str(tmp_path / "other"), seed=3, workers=2, vessels_per_shard=1000
+    )
+
+    assert len(one_worker) == len(two_workers) == 3 and len(other_shards) == 1
+    assert [os.path.basename(path) for path in one_worker] == [os.path.basename(path) for path in two_workers]
+    assert pq.ParquetFile(one_worker[0]).num_row_groups == 4
+    first = pd.read_parquet(str(tmp_path / "one"))
+    pd.testing.assert_frame_equal(first, pd.read_parquet(str(tmp_path / "two")))
+    pd.testing.assert_frame_equal(first, pd.read_parquet(str(tmp_path / "other")))
+    assert len(first) == (vessels["ship_type"] != "Unsupported type").sum() * 3
+    assert (first["EU_Port_Calls"] + first["Non_EU_Port_Calls"] == first["Total_Port_Calls"]).all()
@@ -0,0 +1,90 @@
+import pytest
+
+from google.api_core.exceptions import NotFound
+from unittest.mock import patch, Mock
+from src.google_cloud_storage_manager import GoogleCloudStorageManager
+
+
+@pytest.fixture
+def storage_manager(monkeypatch):
+    """Fixture that creates a GoogleCloudStorageManager with a mocked storage client."""
+    monkeypatch.setenv("GCP_PROJECT_ID", "project")
+    monkeypatch.setenv("BUCKET_NAME", "bucket")
+
+    with patch("src.google_cloud_storage_manager.storage"), \
+         patch("src.google_cloud_storage_manager.default_credentials", return_value=(Mock(), "project")):
+        yield GoogleCloudStorageManager(max_workers=4, parallel_threshold=100, chunk_size=16)
+
+
+def test_small_object_is_downloaded_in_one_request(storage_manager):
+    blob = Mock(size=10, generation=1)
+    blob.download_as_bytes.return_value = b"0123456789"
+    storage_manager.bucket.get_blob.return_value = blob
+
+    assert storage_manager.download_bytes("silver-bucket/2023/report.parquet") == b"0123456789"
+    blob.download_as_bytes.assert_called_once_with(if_generation_match=1)
+
+
+def test_large_object_is_downloaded_in_ranges(storage_manager):
+    payload = bytes(range(250))
+    blob = Mock(size=len(payload), generation=7)
+    blob.download_as_bytes.side_effect = lambda start, end, **kwargs: payload[start:end + 1]
+    storage_manager.bucket.get_blob.return_value = blob
+
+    contents = storage_manager.download_bytes("silver-bucket/2023/report.parquet")
+
+    assert contents == payload
+    assert blob.download_as_bytes.call_count == 16
+    assert all(call.kwargs["if_generation_match"] == 7 for call in blob.download_as_bytes.call_args_list)
+
+
+def test_large_object_is_uploaded_as_composed_parts(storage_manager):
+    blobs = {}
+    uploaded = {}
+
+    def make_blob(name):
+        blob = Mock()
+        blob.name = name
+        blob.upload_from_file.side_effect = lambda f, **kwargs: uploaded.__setitem__(name, f.read())
+        blobs[name] = blob
+        return blob
+
+    storage_manager.bucket.blob.side_effect = make_blob
+    payload = bytes(range(250))
+
+    storage_manager.upload_bytes("gold-bucket/report.parquet", payload, content_type="application/octet-stream")
+
+    final_blob = blobs["gold-bucket/report.parquet"]
+    parts = final_blob.compose.call_args.args[0]
+    assert len(parts) == 16
+    assert b"".join(uploaded[part.name] for part in parts) == payload
+    assert all(part.delete.called for part in parts)
+
+
+def test_the_client_shares_a_session_sized_to_the_workers(storage_manager):
+    from src import google_cloud_storage_manager
+
+    session = google_cloud_storage_manager.storage.Client.call_args.kwargs["_http"]
+    assert session.get_adapter("https://storage.googleapis.com")._pool_maxsize == 4
+
+
+def test_the_parts_of_a_failed_upload_are_deleted(storage_manager):
+    blobs = {}
+
+    def make_blob(name):
+        blob = Mock()
+        blob.name = name
+        if name.endswith("/03"):
+            blob.upload_from_file.side_effect = IOError("connection reset")
+            blob.delete.side_effect = NotFound("never uploaded")
+        blobs[name] = blob
+        return blob
+
+    storage_manager.bucket.blob.side_effect = make_blob
+
+    with pytest.raises(IOError):
+        storage_manager.upload_bytes("gold-bucket/report.parquet", bytes(range(250)))
+
+    blobs["gold-bucket/report.parquet"].compose.assert_not_called()
+    parts = [blob for name, blob in blobs.items() if ".parts/" in name]
+    assert len(parts) == 16 and all(part.delete.called for part in parts)
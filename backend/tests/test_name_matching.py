@@ -0,0 +1,42 @@
+import numpy as np
+
+from src.utils.data.name_matching import NameIndex, _trigrams, name_similarity, normalize_names
+
+
+def test_normalize_names():
+    assert normalize_names(["MV Ever Given (ship)", "M/S Ærø-2", " msc  oscar ", None]).tolist() == [
+        "EVER GIVEN", "AERO 2", "MSC OSCAR", "",
+    ]
+
+
+def test_name_similarity():
+    assert name_similarity("EVER GIVEN", "Ever Given (ship)") == 1.0
+    assert name_similarity("MSC OSCAR", "MSC OLIVER") < 0.6
+    assert name_similarity("", "MSC OSCAR") == 0.0
+
+
+def test_index_finds_the_best_match():
+    names = ["EVER GIVEN", "EVER GREEN", "MSC OSCAR", "MSC OLIVER", "MAERSK ALABAMA"]
+    matches = NameIndex(names).match(["ever given", "M/V Maersk Alabma", "msc oscar 2", "zzz", None], threshold=0.5)
+
+    assert matches["match"].tolist()[:3] == ["EVER GIVEN", "MAERSK ALABAMA", "MSC OSCAR"]
+    assert matches["index"].tolist() == [0, 4, 2, -1, -1]
+    assert matches["score"].iloc[0] == 1.0
+    assert (matches["score"].iloc[3:] == 0).all()
+
+
+def test_index_scores_are_exact_dice_coefficients():
+    rng = np.random.default_rng(0)
+    words = ["SEA", "STAR", "OCEAN", "NORDIC", "SPIRIT", "EXPRESS", "KAROMI", "VELUNA", "TORIS"]
+    names = [" ".join(rng.choice(words, rng.integers(1, 4))) + f" {i % 7}" for i in range(300)]
+    queries = [name.replace("A", "E", 1) for name in rng.choice(names, 50)]
+
+    matches = NameIndex(names, block_grams=1000).match(queries, batch_size=16)
+
+    def trigram_sets(values):
+        ids, grams = _trigrams(normalize_names(values))
+        return [set(grams[ids == i]) for i in range(len(values))]
+
+    name_grams = trigram_sets(names)
+    for query_grams, score in zip(trigram_sets(queries), matches["score"]):
+        assert score == max(2 * len(query_grams & grams) / (len(query_grams) + len(grams)) for grams in name_grams)
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+import pandas as pd
+
+from io import BytesIO
+from unittest.mock import patch
+from src.etl_pipeline import ETLPipeline
+from src.object_store import LocalObjectStore, split_object_url
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalObjectStore(str(tmp_path))
+
+
+def test_local_store_put_get_and_ranges(store):
+    asyncio.run(store.put("silver-bucket/2023/report.parquet", b"0123456789", content_type="text/plain"))
+
+    assert asyncio.run(store.get("silver-bucket/2023/report.parquet")) == b"0123456789"
+    assert asyncio.run(store.get_range("silver-bucket/2023/report.parquet", 2, 5)) == b"234"
+
+    info = asyncio.run(store.stat("silver-bucket/2023/report.parquet"))
+    assert info.size == 10
+    assert info.content_type == "text/plain"
+
+
+def test_local_store_list_and_patch_metadata(store):
+    asyncio.run(store.put("bronze-bucket/2023/a.xlsx", b"a", metadata={"processed_by_ETL": False}))
+    asyncio.run(store.put("bronze-bucket/2022/b.xlsx", b"b"))
+    asyncio.run(store.put("silver-bucket/2023/a.parquet", b"c"))
+
+    asyncio.run(store.patch_metadata("bronze-bucket/2023/a.xlsx", {"processed_date": "2025-01-01"}))
+    objects = asyncio.run(store.list(prefix="bronze-bucket/"))
+
+    assert [info.name for info in objects] == ["bronze-bucket/2022/b.xlsx", "bronze-bucket/2023/a.xlsx"]
+    assert objects[1].metadata == {"processed_by_ETL": "False", "processed_date": "2025-01-01"}
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(store.stat("bronze-bucket/2021/missing.xlsx"))
+
+
+def test_run_async_on_local_store(store):
+    asyncio.run(store.put("bronze-bucket/2023/2023-v1-01012024-info.xlsx", b"new", metadata={"processed_by_ETL": False}))
+    asyncio.run(store.put("bronze-bucket/2022/2022-v9-01012024-info.xlsx", b"old", metadata={"processed_by_ETL": True}))
+    pipeline = ETLPipeline(object_store=store)
+
+    with patch("src.etl_pipeline.read_report") as mock_read_report, \
+         patch.object(pipeline, "tranform") as mock_transform:
+        mock_transform.return_value = pd.DataFrame({"imo_number": [1234567]})
+        asyncio.run(pipeline.run_async())
+
+    mock_read_report.assert_called_once_with(b"new", "bronze-bucket/2023/2023-v1-01012024-info.xlsx")
+    silver = asyncio.run(store.get("silver-bucket/2023/2023-v1-01012024-info.parquet"))
+    pd.testing.assert_frame_equal(pd.read_parquet(BytesIO(silver)), pd.DataFrame({"imo_number": [1234567]}))
+
+    bronze = asyncio.run(store.stat("bronze-bucket/2023/2023-v1-01012024-info.xlsx"))
+    assert bronze.metadata["processed_by_ETL"] == "True"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("s3://bucket/serving/", ("s3://bucket", "serving/")),
+    ("gs://bucket/a/b", ("gs://bucket", "a/b/")),
+    ("s3://bucket", ("s3://bucket", "")),
+    ("file:///tmp/serving", ("file:///tmp/serving", "")),
+])
+def test_object_urls_are_split_into_the_store_and_the_prefix(url, expected):
+    assert split_object_url(url) == expected
@@ -0,0 +1,233 @@
+import json
+import os
+import pytest
+
+from unittest.mock import MagicMock
+from app.api import query_backend
+from app.api.query_backend import AthenaBackend, DuckDBBackend, create_query_backend, page_clause
+from app.api.admission import AdmissionBackend
+from app.api.single_flight import SingleFlightBackend
+from tests.conftest import DATABASE, TABLE, RecordingBackend
+
+pytest.importorskip("duckdb")
+
+# the requests of every query of the endpoints
+ENDPOINT_EVENTS = [
+    ("emissions_endpoint", {"queryStringParameters": None}),
+    ("emissions_endpoint", {"queryStringParameters": {"ship_id": "9000001"}}),
+    ("emissions_endpoint", {"queryStringParameters": {"ship_type": "Oil tanker", "year": "2019"}}),
+    ("emissions_endpoint", {"queryStringParameters": {"ship_type": "Oil tanker", "page": "2", "limit": "1"}}),
+    ("emissions_endpoint", {"queryStringParameters": {"year": "2018"}}),
+    ("metadata_endpoint", {}),
+    ("ship_data_endpoint", {"pathParameters": {"ship_id": "9000001"}}),
+    ("ship_types_endpoint", {"queryStringParameters": {"ship_type": "Oil tanker", "page": "1", "limit": "10"}}),
+]
+
+
+def call(endpoints, name, event):
+    response = endpoints[name].lambda_handler(event, None)
+    assert response["statusCode"] == 200
+    return json.loads(response["body"])
+
+
+def test_emissions_per_ship_id_serves_the_latest_version(endpoints, duckdb_backend):
+    body = call(endpoints, "emissions_endpoint", {"queryStringParameters": {"ship_id": "9000001"}})
+
+    assert body["metadata"]["total_results"] == 2
+    assert [(row["reporting_period"], row["total_co2_emissions"]) for row in body["results"]] == [
+        ("2019", "110.0"), ("2018", "100.5")
+    ]
+    assert body["results"][0]["co2_emissions_assigned_to_passenger_transport"] == ""
+
+
+def test_emissions_are_paginated(endpoints, duckdb_backend):
+    body = call(endpoints, "emissions_endpoint", {"queryStringParameters": {"ship_type": "Oil tanker", "page": "2", "limit": "1"}})
+
+    # 9000002 (2018 v2) and 9000003 (2019), not 9000003 of the replaced 2018 v1
+    assert body["metadata"]["total_results"] == 2
+    assert [row["imo_number"] for row in body["results"]] == ["9000003"]
+
+
+def test_metadata_and_ship_types(endpoints, duckdb_backend):
+    metadata = call(endpoints, "metadata_endpoint", {})["results"][0]
+    assert metadata["ship_types"] == ["Bulk carrier", "Container ship", "Oil tanker"]
+    assert (metadata["total_ships"], metadata["earliest_period"], metadata["latest_period"]) == ("4", "2018", "2019")
+
+    ships = call(endpoints, "ship_types_endpoint", ENDPOINT_EVENTS[-1][1])
+    assert [row["imo_number"] for row in ships["results"]] == ["9000002", "9000003"]
+    assert ships["results"][0]["home_port"] == ""
+
+
+def test_ship_data_returns_every_column(endpoints, duckdb_backend):
+    results = call(endpoints, "ship_data_endpoint", {"pathParameters": {"ship_id": "9000001"}})["results"]
+
+    assert [(row["year"], row["version"], row["latest_version"]) for row in results] == [("2019", "1", "1"), ("2018", "2", "2")]
+    assert results[1]["port_of_registry"] == "Valletta"
+
+
+def test_every_endpoint_query_runs_on_duckdb(endpoints, duckdb_backend, monkeypatch):
+    recorder = RecordingBackend(duckdb_backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+
+    for name, event in ENDPOINT_EVENTS:
+        call(endpoints, name, event)
+
+    assert len(recorder.queries) == 17
+
+
+def normalize(rows):
+    """Rows as sorted tuples of (column, value), with the numbers compared as numbers"""
+    def value(text):
+        try:
+            return round(float(text), 6)
+        except ValueError:
+            return text
+
+    return sorted(tuple(sorted((column, value(text)) for column, text in row.items())) for row in rows)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("PARITY_OUTPUT_LOCATION"),
+    reason="needs Athena: set PARITY_OUTPUT_LOCATION and PARITY_DATA_PATH (the S3 location of the clean table)",
+)
+def test_athena_and_duckdb_parity(endpoints, monkeypatch):
+    """Runs every query of the endpoints on Athena and on DuckDB over the same Parquet files"""
+    duckdb_backend = DuckDBBackend(DATABASE, TABLE, os.environ["PARITY_DATA_PATH"])
+    recorder = RecordingBackend(duckdb_backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+    for name, event in ENDPOINT_EVENTS:
+        call(endpoints, name, event)
+
+    athena_backend = AthenaBackend(DATABASE, os.environ["PARITY_OUTPUT_LOCATION"])
+    for query, parameters in zip(recorder.queries, recorder.parameters):
+        assert normalize(athena_backend.execute(query, parameters)) == normalize(duckdb_backend.execute(query, parameters)), query
+
+
+def results_page(rows, next_token=None, header=True):
+    page = {
+        "ResultSet": {
+            "ResultSetMetadata": {"ColumnInfo": [{"Label": "imo_number"}, {"Label": "name"}]},
+            "Rows": ([{"Data": [{"VarCharValue": "imo_number"}, {"VarCharValue": "name"}]}] if header else [])
+            + [{"Data": [{"VarCharValue": imo_number}, {}]} for imo_number in rows],
+        }
+    }
+    if next_token:
+        page["NextToken"] = next_token
+    return page
+
+
+def test_athena_backend_waits_and_reads_every_page():
+    client = MagicMock()
+    client.start_query_execution.return_value = {"QueryExecutionId": "q-1"}
+    client.get_query_execution.side_effect = [
+        {"QueryExecution": {"Status": {"State": state}}} for state in ["QUEUED", "RUNNING", "SUCCEEDED"]
+    ]
+    client.get_query_results.side_effect = [results_page(["1", "2"], next_token="t-1"), results_page(["3"], header=False)]
+
+    backend = AthenaBackend(DATABASE, "s3://results/", client=client, poll_interval=0)
+    rows = backend.execute("SELECT 1")
+
+    assert rows == [{"imo_number": imo_number, "name": ""} for imo_number in ["1", "2", "3"]]
+    client.start_query_execution.assert_called_once_with(
+        QueryString="SELECT 1",
+        QueryExecutionContext={"Database": DATABASE},
+        ResultConfiguration={"OutputLocation": "s3://results/"},
+    )
+    assert client.get_query_results.call_args_list[1].kwargs == {"QueryExecutionId": "q-1", "NextToken": "t-1"}
+
+
+def test_athena_backend_raises_on_failed_queries():
+    client = MagicMock()
+    client.start_query_execution.return_value = {"QueryExecutionId": "q-1"}
+    client.get_query_execution.return_value = {"QueryExecution": {"Status": {"State": "FAILED"}}}
+
+    with pytest.raises(Exception, match="FAILED"):
+        AthenaBackend(DATABASE, "s3://results/", client=client, poll_interval=0).execute("SELECT 1")
+
+
+def test_the_backend_is_selected_by_the_environment(monkeypatch, clean_table):
+    monkeypatch.setenv("DATABASE", DATABASE)
+    monkeypatch.setenv("TABLE", TABLE)
+    monkeypatch.setenv("OUTPUT_LOCATION", "s3://results/")
+    monkeypatch.setenv("DUCKDB_DATA_PATH", clean_table)
+
+    monkeypatch.delenv("QUERY_BACKEND", raising=False)
+    monkeypatch.delenv("SINGLE_FLIGHT", raising=False)
+    monkeypatch.delenv("QUERY_MAX_IN_FLIGHT", raising=False)
+    backend = create_query_backend()
+    assert isinstance(backend, SingleFlightBackend)
+    assert isinstance(backend.backend, AdmissionBackend) and isinstance(backend.backend.backend, AthenaBackend)
+    assert backend.backend.controller.max_in_flight == 20
+
+    monkeypatch.setenv("QUERY_BACKEND", "duckdb")
+    monkeypatch.setenv("SINGLE_FLIGHT", "off")
+    monkeypatch.setenv("QUERY_MAX_IN_FLIGHT", "0")
+    assert isinstance(create_query_backend(), DuckDBBackend)
+
+    with pytest.raises(ValueError):
+        create_query_backend("bigquery")
+
+
+def test_athena_queries_are_parameterized_and_reuse_results():
+    client = MagicMock()
+    client.start_query_execution.return_value = {"QueryExecutionId": "q-1"}
+    client.get_query_execution.return_value = {"QueryExecution": {
+        "Status": {"State": "SUCCEEDED"},
+        "Statistics": {"DataScannedInBytes": 0, "ResultReuseInformation": {"ReusedPreviousResult": True}},
+    }}
+    client.get_query_results.return_value = results_page([])
+
+    backend = AthenaBackend(
+        DATABASE, "s3://results/", client=client, poll_interval=0,
+        reuse_max_age_minutes=60, dataset_version=lambda: "2018=v2,2019=v1",
+    )
+    backend.execute("SELECT * FROM latest_data WHERE ship_type = ? AND reporting_period = ?", ["Ro-ro ship'; --", 2019])
+
+    kwargs = client.start_query_execution.call_args.kwargs
+    assert kwargs["QueryString"].startswith("/* dataset_version: 2018=v2,2019=v1 */\n")
+    assert kwargs["ExecutionParameters"] == ["'Ro-ro ship''; --'", "2019"]
+    assert kwargs["ResultReuseConfiguration"] == {
+        "ResultReuseByAgeConfiguration": {"Enabled": True, "MaxAgeInMinutes": 60}
+    }
+    assert backend.metrics == {"executions": 1, "reused_results": 1, "bytes_scanned": 0}
+
+
+def test_athena_results_are_not_reused_without_a_dataset_version():
+    client = MagicMock()
+    client.start_query_execution.return_value = {"QueryExecutionId": "q-1"}
+    client.get_query_execution.return_value = {"QueryExecution": {"Status": {"State": "SUCCEEDED"}}}
+    client.get_query_results.return_value = results_page([])
+
+    for dataset_version in (None, lambda: None):
+        backend = AthenaBackend(
+            DATABASE, "s3://results/", client=client, poll_interval=0,
+            reuse_max_age_minutes=60, dataset_version=dataset_version,
+        )
+        backend.execute("SELECT * FROM latest_data")
+
+        kwargs = client.start_query_execution.call_args.kwargs
+        assert kwargs["QueryString"] == "SELECT * FROM latest_data"
+        assert "ResultReuseConfiguration" not in kwargs
+
+
+def test_request_values_are_never_part_of_the_sql(endpoints, duckdb_backend, monkeypatch):
+    recorder = RecordingBackend(duckdb_backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+
+    body = call(endpoints, "emissions_endpoint", {"queryStringParameters": {"ship_type": "Oil tanker' OR '1'='1"}})
+    call(endpoints, "emissions_endpoint", {"queryStringParameters": {"ship_type": "Bulk carrier"}})
+
+    assert body["results"] == []
+    # the same query text for every ship type, so Athena can reuse its results
+    assert recorder.queries[0] == recorder.queries[2]
+    assert recorder.parameters[2] == ["Bulk carrier"]
+
+    response = endpoints["ship_data_endpoint"].lambda_handler({"pathParameters": {"ship_id": "1 OR 1=1"}}, None)
+    assert response["statusCode"] == 400
+
+
+def test_pages_are_formatted_from_integers_only():
+    assert page_clause(3, 10).split() == ["OFFSET", "20", "LIMIT", "10"]
+    for page, limit in [("1; DROP TABLE x", 10), (1, "10"), (1, True)]:
+        with pytest.raises(TypeError):
+            page_clause(page, limit)
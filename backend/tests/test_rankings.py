@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+import numpy as np
+import pytest
+
+from app.api import leaderboards, metadata_summary, query_backend, serving_sync, ship_snapshot
+from app.api.leaderboards import LeaderboardReader
+from app.api.query_backend import DuckDBBackend
+from src import serving_artifacts
+from src.serving_artifacts import LEADERBOARD_METRICS, publish_leaderboards, publish_serving_artifacts, read_latest_clean_data, top_positions
+from tests.conftest import DATABASE, TABLE, RecordingBackend, make_report
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def ranked_table(tmp_path):
+    """40 ships of two types reported in 2020, with ties at the top"""
+    rng = np.random.default_rng(0)
+    co2 = rng.uniform(100, 1000, 40).round(1)
+    co2[[3, 4, 7, 11]] = 2000.0
+    ship_types = ["Oil tanker" if i % 3 else "Bulk carrier" for i in range(40)]
+
+    partition = tmp_path / "clean" / "year=2020" / "version=1"
+    partition.mkdir(parents=True)
+    make_report(list(range(9100040, 9100000, -1)), ship_types, 2020, list(co2)).to_parquet(partition / "part-00000.snappy.parquet", index=False)
+    return str(tmp_path / "clean")
+
+
+@pytest.fixture
+def rankings(endpoints, ranked_table, tmp_path, monkeypatch):
+    backend = DuckDBBackend(DATABASE, TABLE, ranked_table)
+    monkeypatch.setattr(query_backend, "_default_backend", backend)
+
+    table, _ = read_latest_clean_data(ranked_table)
+    publish_leaderboards(table, str(tmp_path / "serving"), "2020=v1", size=20, clock=lambda: 1000.0)
+    reader = LeaderboardReader(str(tmp_path / "serving"), clock=lambda: 1000.0)
+    return endpoints["rankings_endpoint"], backend, reader
+
+
+def ranking(endpoint, **query):
+    response = endpoint.lambda_handler({"queryStringParameters": query}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_the_api_and_the_etl_agree_on_the_artifacts(endpoints):
+    # the ETL and the API are deployed separately, each with its own copy of the names
+    assert endpoints["rankings_endpoint"].RANKING_METRICS == serving_artifacts.LEADERBOARD_METRICS
+    assert leaderboards.LEADERBOARDS_MANIFEST == serving_artifacts.LEADERBOARDS_MANIFEST
+    assert metadata_summary.METADATA_SUMMARY == serving_artifacts.METADATA_SUMMARY
+    assert ship_snapshot.SHIP_SNAPSHOT_MANIFEST == serving_artifacts.SHIP_SNAPSHOT_MANIFEST
+
+
+@pytest.mark.parametrize("size", [1, 5, 13, 50])
+def test_partial_sorts_rank_like_a_full_sort(size):
+    rng = np.random.default_rng(size)
+    values = rng.integers(0, 20, 30).astype(float)
+    values[[2, 9]] = np.nan
+    imo_numbers = rng.permutation(30) + 9000000
+
+    ranked = sorted((-value, imo_number, position) for position, (value, imo_number) in enumerate(zip(values, imo_numbers)) if not np.isnan(value))
+    assert top_positions(values, imo_numbers, size).tolist() == [position for _, _, position in ranked[:size]]
+
+
+@pytest.mark.parametrize("metric", list(LEADERBOARD_METRICS))
+@pytest.mark.parametrize("ship_type, limit", [("Oil tanker", 10), ("Bulk carrier", 20), ("Container ship", 5)])
+def test_leaderboards_answer_like_the_query(rankings, monkeypatch, metric, ship_type, limit):
+    endpoint, backend, reader = rankings
+    query = {"metric": metric, "year": "2020", "ship_type": ship_type, "limit": str(limit)}
+    status, queried = ranking(endpoint, **query)
+    assert status == 200
+
+    recorder = RecordingBackend(backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+    monkeypatch.setattr(leaderboards, "_default_reader", reader)
+
+    assert ranking(endpoint, **query)[1]["results"] == queried["results"]
+    assert recorder.queries == []
+
+
+def test_the_top_ships_are_ranked(rankings, monkeypatch):
+    endpoint, _, reader = rankings
+    monkeypatch.setattr(leaderboards, "_default_reader", reader)
+
+    _, body = ranking(endpoint, year="2020", ship_type="Oil tanker", limit="3", format="typed")
+    assert body["metadata"]["metric"] == "total_co2"
+    # the ships tied at 2000 are ranked by IMO number, the Bulk carrier one excluded
+    assert [(row["rank"], row["imo_number"], row["value"]) for row in body["results"]] == [
+        (1, 9100029, 2000.0), (2, 9100033, 2000.0), (3, 9100036, 2000.0),
+    ]
+
+
+def test_longer_rankings_are_queried(rankings, monkeypatch):
+    endpoint, backend, reader = rankings
+    recorder = RecordingBackend(backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+    monkeypatch.setattr(leaderboards, "_default_reader", reader)
+
+    _, body = ranking(endpoint, year="2020", ship_type="Oil tanker", limit="25")
+    assert len(body["results"]) == 25 and len(recorder.queries) == 1
+
+
+@pytest.mark.parametrize("query", [
+    {"ship_type": "Oil tanker"},
+    {"year": "2020"},
+    {"year": "last", "ship_type": "Oil tanker"},
+    {"year": "2020", "ship_type": "Oil tanker", "metric": "speed"},
+    {"year": "2020", "ship_type": "Oil tanker", "limit": "101"},
+])
+def test_invalid_rankings_are_rejected(rankings, query):
+    status, body = ranking(rankings[0], **query)
+    assert status == 400 and body["error"].startswith("Invalid parameter value")
+
+
+def test_rankings_are_queried_when_the_leaderboards_are_gone(rankings, tmp_path, monkeypatch):
+    endpoint, _, reader = rankings
+    with open(tmp_path / "serving" / "leaderboards.json") as f:
+        os.remove(tmp_path / "serving" / json.load(f)["leaderboards"])
+    monkeypatch.setattr(leaderboards, "_default_reader", reader)
+
+    status, body = ranking(endpoint, year="2020", ship_type="Oil tanker", limit="3")
+    assert reader.get() is None
+    assert status == 200 and [row["imo_number"] for row in body["results"]] == ["9100029", "9100033", "9100036"]
+
+
+def test_the_leaderboards_of_a_load_are_synced_by_the_api(rankings, ranked_table, tmp_path, monkeypatch):
+    endpoint, backend, _ = rankings
+    query = {"year": "2020", "ship_type": "Oil tanker", "limit": "10"}
+    queried = ranking(endpoint, **query)[1]["results"]
+
+    publish_serving_artifacts(ranked_table, f"file://{tmp_path / 'store'}")
+    monkeypatch.delenv("SHIP_SNAPSHOT_DIR", raising=False)
+    monkeypatch.setenv("SERVING_ARTIFACTS_URL", f"file://{tmp_path / 'store'}")
+    (tmp_path / "container").mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "container"))
+    monkeypatch.setattr(serving_sync, "_default_sync", None)
+    monkeypatch.setattr(leaderboards, "_default_reader", None)
+    recorder = RecordingBackend(backend)
+    monkeypatch.setattr(query_backend, "_default_backend", recorder)
+
+    assert ranking(endpoint, **query)[1]["results"] == queried
+    assert recorder.queries == []
@@ -0,0 +1,101 @@
+import base64
+import gzip
+import json
+import brotli
+import pytest
+
+from app.api.responses import format_rows, infer_type, json_response, negotiate_encoding, parse_format
+
+
+def decode(response):
+    body = response["body"]
+    if response.get("isBase64Encoded"):
+        body = base64.b64decode(body)
+        encoding = response["headers"]["Content-Encoding"]
+        body = brotli.decompress(body) if encoding == "br" else gzip.decompress(body)
+    return json.loads(body)
+
+
+def events(encoding=None, **params):
+    return {"headers": {"Accept-Encoding": encoding} if encoding else {}, "queryStringParameters": params}
+
+
+ROWS = [
+    {"imo_number": "9000001", "name": "SHIP 1", "total_co2_emissions": "100.5", "verifier_number": "0042", "home_port": ""},
+    {"imo_number": "9000002", "name": "1234", "total_co2_emissions": "7", "verifier_number": "0043", "home_port": "Piraeus"},
+]
+
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("gzip, br;q=0.5", "gzip"),
+    ("deflate", None),
+    ("*", "br"),
+    ("br;q=0, gzip;q=0", None),
+    (None, None),
+])
+def test_the_encoding_is_negotiated(header, encoding):
+    assert negotiate_encoding(header) == encoding
+
+
+def test_numeric_columns_are_typed():
+    assert [infer_type(values) for values in [["1", "-2", ""], ["1.5", "2", "NaN"], ["0042"], ["", ""], ["1e3", "."]]] == [
+        int, float, str, str, str
+    ]
+
+    rows = format_rows(ROWS, "typed", {"name": str})
+    assert rows[1] == {
+        "imo_number": 9000002, "name": "1234", "total_co2_emissions": 7.0, "verifier_number": "0043", "home_port": "Piraeus"
+    }
+    assert rows[0]["home_port"] is None and rows[0]["verifier_number"] == "0042"
+    assert format_rows(ROWS, "json") is ROWS
+
+
+def test_columnar_layout_sends_the_columns_once():
+    assert format_rows(ROWS[:1], "columnar") == {
+        "columns": ["imo_number", "name", "total_co2_emissions", "verifier_number", "home_port"],
+        "data": [[9000001, "SHIP 1", 100.5, "0042", None]],
+    }
+    assert format_rows([], "columnar") == {"columns": [], "data": []}
+    with pytest.raises(ValueError, match="format must be one of"):
+        parse_format("csv")
+
+
+def test_large_bodies_are_compressed_and_base64_encoded():
+    body = {"results": ROWS * 50}
+
+    for encoding in ["br", "gzip"]:
+        response = json_response({"headers": {"accept-encoding": encoding}}, body)
+        assert response["isBase64Encoded"] and response["headers"]["Content-Encoding"] == encoding
+        assert decode(response) == body
+
+    plain = json_response({"headers": None}, body)
+    assert "isBase64Encoded" not in plain and decode(plain) == body
+    # small bodies are sent as they are
+    assert "isBase64Encoded" not in json_response(events("gzip"), {"results": ROWS})
+
+
+def test_emissions_can_be_columnar_and_typed(endpoints, duckdb_backend):
+    handler = endpoints["emissions_endpoint"].lambda_handler
+    rows = decode(handler(events(), None))["results"]
+    columnar = decode(handler(events("gzip", format="columnar"), None))["results"]
+
+    assert columnar["columns"][:2] == ["imo_number", "name"]
+    assert columnar["data"][0][:5] == [int(rows[0]["imo_number"]), rows[0]["name"], rows[0]["ship_type"], 2019, 110.0]
+
+    batch = endpoints["emissions_endpoint"].batch_lambda_handler(events(ship_ids="9000001", format="typed"), None)
+    assert decode(batch)["results"][0]["results"][0]["reporting_period"] == 2019
+
+
+def test_ship_data_and_ship_types_are_typed(endpoints, duckdb_backend):
+    ship = decode(endpoints["ship_data_endpoint"].lambda_handler(
+        {"pathParameters": {"ship_id": "9000001"}, "queryStringParameters": {"format": "typed"}}, None
+    ))["results"][0]
+    assert (ship["imo_number"], ship["latest_version"], ship["home_port"]) == (9000001, 1, None)
+
+    event = events(ship_type="Oil tanker", page="1", limit="10", format="typed")
+    ships = decode(endpoints["ship_types_endpoint"].lambda_handler(event, None))["results"]
+    assert (ships[0]["imo_number"], ships[0]["verifier_number"]) == (9000002, "1234")
+
+    event["queryStringParameters"]["format"] = "xml"
+    assert endpoints["ship_types_endpoint"].lambda_handler(event, None)["statusCode"] == 400
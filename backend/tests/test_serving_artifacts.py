@@ -0,0 +1,225 @@
+import json
+import os
+import tempfile
+import pyarrow.compute as pc
+import pytest
+
+from app.api import metadata_summary, query_backend, serving_sync, ship_snapshot
+from app.api.metadata_summary import MetadataSummaryReader
+from app.api.query_backend import DuckDBBackend, QueryBackend
+from app.api.serving_sync import ServingArtifactSync
+from app.api.ship_snapshot import ShipSnapshotReader
+from src.object_store import LocalObjectStore
+from src.serving_artifacts import (
+    SHIP_SNAPSHOT_MANIFEST,
+    publish_metadata_summary,
+    publish_serving_artifacts,
+    publish_ship_snapshot,
+    read_latest_clean_data,
+    upload_serving_artifacts,
+)
+from src.utils.data.ship_registry import format_dataset_version
+from tests.conftest import DATABASE, TABLE
+
+
+class UnavailableBackend(QueryBackend):
+    def execute(self, query):
+        raise AssertionError("the snapshot should have answered")
+
+
+@pytest.fixture
+def snapshot_dir(clean_table, tmp_path):
+    table, latest = read_latest_clean_data(clean_table)
+    publish_ship_snapshot(table, str(tmp_path / "serving"), format_dataset_version(latest), clock=lambda: 1000.0)
+    return str(tmp_path / "serving")
+
+
+def ship_data(endpoints, ship_id):
+    response = endpoints["ship_data_endpoint"].lambda_handler({"pathParameters": {"ship_id": ship_id}}, None)
+    return json.loads(response["body"])["results"]
+
+
+def test_only_the_latest_versions_are_published(snapshot_dir):
+    with open(os.path.join(snapshot_dir, SHIP_SNAPSHOT_MANIFEST)) as f:
+        manifest = json.load(f)
+
+    assert manifest["dataset_version"] == "2018=v2,2019=v1"
+    assert (manifest["rows"], manifest["ships"]) == (5, 4)
+    assert sorted(os.listdir(snapshot_dir)) == sorted([SHIP_SNAPSHOT_MANIFEST, manifest["snapshot"], manifest["index"]])
+
+
+def test_snapshot_lookups_match_the_query(endpoints, clean_table, snapshot_dir, monkeypatch):
+    monkeypatch.setattr(query_backend, "_default_backend", DuckDBBackend(DATABASE, TABLE, clean_table))
+    queried = {ship_id: ship_data(endpoints, ship_id) for ship_id in ["9000001", "9000002", "9000004"]}
+
+    monkeypatch.setattr(query_backend, "_default_backend", UnavailableBackend())
+    monkeypatch.setattr(ship_snapshot, "_default_reader", ShipSnapshotReader(snapshot_dir, clock=lambda: 1000.0))
+    for ship_id, rows in queried.items():
+        assert ship_data(endpoints, ship_id) == rows
+
+
+def test_misses_and_stale_snapshots_fall_back_to_the_query(endpoints, clean_table, snapshot_dir, monkeypatch):
+    monkeypatch.setattr(query_backend, "_default_backend", DuckDBBackend(DATABASE, TABLE, clean_table))
+    clock = [1000.0]
+    reader = ShipSnapshotReader(snapshot_dir, max_age_seconds=60, clock=lambda: clock[0])
+    monkeypatch.setattr(ship_snapshot, "_default_reader", reader)
+
+    assert reader.lookup("9999999") is None
+    assert reader.lookup("not a number") is None
+    assert ship_data(endpoints, "9999999") == []
+
+    assert reader.lookup("9000003") is not None
+    clock[0] += 120
+    assert reader.lookup("9000003") is None
+    assert [row["reporting_period"] for row in ship_data(endpoints, "9000003")] == ["2019"]
+
+
+def test_reader_maps_a_new_snapshot_when_it_is_published(clean_table, snapshot_dir):
+    reader = ShipSnapshotReader(snapshot_dir, clock=lambda: 1000.0)
+    assert [row["total_co2_emissions"] for row in reader.lookup(9000002)] == ["200.5"]
+
+    table, _ = read_latest_clean_data(clean_table)
+    publish_ship_snapshot(table.slice(0, 0), snapshot_dir, "2018=v3", clock=lambda: 1000.0)
+
+    assert reader.lookup(9000002) is None
+    assert reader.get().dataset_version == "2018=v3"
+
+
+def metadata(endpoints):
+    return json.loads(endpoints["metadata_endpoint"].lambda_handler({}, None)["body"])["results"][0]
+
+
+def test_the_metadata_summary_answers_like_the_queries(endpoints, clean_table, tmp_path, monkeypatch):
+    monkeypatch.setattr(query_backend, "_default_backend", DuckDBBackend(DATABASE, TABLE, clean_table))
+    queried = metadata(endpoints)
+    assert queried == {
+        "ship_types": ["Bulk carrier", "Container ship", "Oil tanker"],
+        # ships, not rows: 9000001 reported in both years
+        "total_ships": "4",
+        "ships_per_year": {"2018": "2", "2019": "3"},
+        "earliest_period": "2018",
+        "latest_period": "2019",
+    }
+
+    table, latest = read_latest_clean_data(clean_table)
+    publish_metadata_summary(table, str(tmp_path / "serving"), format_dataset_version(latest), clock=lambda: 1000.0)
+    monkeypatch.setattr(query_backend, "_default_backend", UnavailableBackend())
+    monkeypatch.setattr(metadata_summary, "_default_reader", MetadataSummaryReader(str(tmp_path / "serving"), clock=lambda: 1000.0))
+
+    assert metadata(endpoints) == queried
+
+
+def test_the_metadata_summary_is_reread_when_published_and_ignored_when_stale(clean_table, tmp_path):
+    directory = str(tmp_path / "serving")
+    table, _ = read_latest_clean_data(clean_table)
+    publish_metadata_summary(table, directory, "2018=v2,2019=v1", clock=lambda: 1000.0)
+
+    clock = [1000.0]
+    reader = MetadataSummaryReader(directory, max_age_seconds=60, clock=lambda: clock[0])
+    assert reader.get()["total_ships"] == 4
+
+    publish_metadata_summary(table.filter(pc.field("reporting_period") == 2019), directory, "2019=v1", clock=lambda: 1010.0)
+    assert (reader.get()["dataset_version"], reader.get()["ships_per_year"]) == ("2019=v1", {"2019": 3})
+
+    clock[0] += 120
+    assert reader.get() is None
+    assert MetadataSummaryReader(str(tmp_path / "missing")).get() is None
+
+
+def test_the_previous_snapshot_is_kept_for_one_publication(clean_table, snapshot_dir):
+    with open(os.path.join(snapshot_dir, SHIP_SNAPSHOT_MANIFEST)) as f:
+        first = json.load(f)
+    table, _ = read_latest_clean_data(clean_table)
+
+    publish_ship_snapshot(table, snapshot_dir, "2018=v3,2019=v1", clock=lambda: 1000.0)
+    assert os.path.exists(os.path.join(snapshot_dir, first["snapshot"]))
+
+    publish_ship_snapshot(table, snapshot_dir, "2018=v4,2019=v1", clock=lambda: 1000.0)
+    assert not os.path.exists(os.path.join(snapshot_dir, first["snapshot"]))
+    assert len([name for name in os.listdir(snapshot_dir) if name.endswith(".arrow")]) == 2
+
+
+def test_lookups_are_queried_when_the_snapshot_files_are_gone(endpoints, clean_table, snapshot_dir, monkeypatch):
+    with open(os.path.join(snapshot_dir, SHIP_SNAPSHOT_MANIFEST)) as f:
+        os.remove(os.path.join(snapshot_dir, json.load(f)["snapshot"]))
+    monkeypatch.setattr(query_backend, "_default_backend", DuckDBBackend(DATABASE, TABLE, clean_table))
+    reader = ShipSnapshotReader(snapshot_dir, clock=lambda: 1000.0)
+    monkeypatch.setattr(ship_snapshot, "_default_reader", reader)
+
+    assert reader.lookup("9000001") is None
+    assert [row["reporting_period"] for row in ship_data(endpoints, "9000001")] == ["2019", "2018"]
+
+
+@pytest.fixture
+def synced_api(tmp_path, monkeypatch):
+    """The API of a container syncing the artifacts published to tmp_path/store/serving"""
+    monkeypatch.delenv("SHIP_SNAPSHOT_DIR", raising=False)
+    monkeypatch.setenv("SERVING_ARTIFACTS_URL", f"file://{tmp_path / 'store' / 'serving'}")
+    monkeypatch.setenv("SERVING_ARTIFACTS_SYNC_SECONDS", "0")
+    (tmp_path / "container").mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "container"))
+    monkeypatch.setattr(serving_sync, "_default_sync", None)
+    monkeypatch.setattr(ship_snapshot, "_default_reader", None)
+    monkeypatch.setattr(metadata_summary, "_default_reader", None)
+    return str(tmp_path / "store" / "serving")
+
+
+def test_the_artifacts_published_to_a_store_are_synced_by_the_api(endpoints, clean_table, synced_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(query_backend, "_default_backend", DuckDBBackend(DATABASE, TABLE, clean_table))
+    queried = ship_data(endpoints, "9000002")
+
+    assert publish_serving_artifacts(clean_table, f"file://{synced_api}") == "2018=v2,2019=v1"
+    with open(os.path.join(synced_api, SHIP_SNAPSHOT_MANIFEST)) as f:
+        manifest = json.load(f)
+    assert os.path.exists(os.path.join(synced_api, manifest["snapshot"]))
+
+    monkeypatch.setattr(query_backend, "_default_backend", UnavailableBackend())
+    assert ship_data(endpoints, "9000002") == queried
+    assert os.path.exists(tmp_path / "container" / "serving-artifacts" / manifest["index"])
+
+
+def test_the_synced_manifests_are_checked_at_intervals(clean_table, tmp_path):
+    table, _ = read_latest_clean_data(clean_table)
+    staging, store, directory = str(tmp_path / "staging"), LocalObjectStore(str(tmp_path / "store")), str(tmp_path / "local")
+    clock = [0.0]
+    sync = ServingArtifactSync(f"file://{tmp_path / 'store'}", directory, interval_seconds=60, clock=lambda: clock[0])
+    reader = ShipSnapshotReader(directory, clock=lambda: 1000.0)
+
+    def publish(dataset_version):
+        manifest = publish_ship_snapshot(table, staging, dataset_version, clock=lambda: 1000.0)
+        upload_serving_artifacts(staging, store)
+        return manifest
+
+    sync.sync(SHIP_SNAPSHOT_MANIFEST, "snapshot", "index")
+    assert reader.get() is None
+
+    first = publish("2018=v2,2019=v1")
+    clock[0] += 60
+    sync.sync(SHIP_SNAPSHOT_MANIFEST, "snapshot", "index")
+    assert reader.get().dataset_version == "2018=v2,2019=v1"
+
+    # a new publication is synced at the next check, the files of the previous manifest kept
+    # until the one after
+    publish("2018=v3,2019=v1")
+    sync.sync(SHIP_SNAPSHOT_MANIFEST, "snapshot", "index")
+    assert reader.get().dataset_version == "2018=v2,2019=v1"
+    clock[0] += 60
+    sync.sync(SHIP_SNAPSHOT_MANIFEST, "snapshot", "index")
+    assert reader.get().dataset_version == "2018=v3,2019=v1"
+    assert os.path.exists(os.path.join(directory, first["snapshot"]))
+
+    publish("2018=v4,2019=v1")
+    clock[0] += 60
+    sync.sync(SHIP_SNAPSHOT_MANIFEST, "snapshot", "index")
+    assert reader.lookup(9000002)[0]["imo_number"] == "9000002"
+    assert not os.path.exists(os.path.join(directory, first["snapshot"]))
+    assert len([name for name in os.listdir(directory) if name.endswith(".arrow")]) == 2
+
+
+def test_the_metadata_summary_of_a_load_is_synced_by_the_api(endpoints, clean_table, synced_api, monkeypatch):
+    monkeypatch.setattr(query_backend, "_default_backend", DuckDBBackend(DATABASE, TABLE, clean_table))
+    queried = metadata(endpoints)
+
+    publish_serving_artifacts(clean_table, f"file://{synced_api}")
+    monkeypatch.setattr(query_backend, "_default_backend", UnavailableBackend())
+    assert metadata(endpoints) == queried
@@ -0,0 +1,105 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+
+from src.data_generation.ship_particulars_parser import (
+    attach_imo_numbers,
+    extract_metres,
+    extract_year,
+    extraction_coverage,
+    load_ship_particulars,
+    parse_ship_particulars,
+)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    wikipedia = {
+        "9321483": {
+            "Identification": "IMO number: 9321483; Call sign: 9HA2589",
+            "Tonnage": "94,511 GT; 58,000 NT; 105,000 t DWT",
+            "Length": "984 ft (299.9 m)",
+            "Beam": "40 m (131 ft)",
+            "Completed": "7 December 2022",
+        },
+        "Ever Given": {
+            "Identification": "IMO number: 9811000",
+            "Name": "Ever Given",
+            "Tonnage": "219079 GT",
+            "Length": "1,312 ft",
+            "Beam": "",
+            "Completed": "",
+        },
+    }
+    fleet = {
+        "9384992": {
+            "Length (m)": "230.0",
+            "Breadth (m)": "42.0 m",
+            "grossTonnage": 57462,
+            "deadweight": "Missing",
+            "Built year": "2007",
+        },
+    }
+
+    paths = []
+    for name, data in [("wikipedia", wikipedia), ("fleet", fleet)]:
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps(data), encoding="utf-8")
+        paths.append(str(path))
+
+    return paths
+
+
+def test_parse_ship_particulars(sources):
+    parsed = parse_ship_particulars(load_ship_particulars(sources)).set_index("IMO_number")
+
+    assert parsed.index.tolist() == [9321483, 9811000, 9384992]
+    assert parsed.loc[9321483].drop("name").to_dict() == {
+        "built_year": 2022,
+        "length (m)": 299.9,
+        "beam (m)": 40.0,
+        "gross_tonnage": 94511.0,
+        "net_tonnage": 58000.0,
+        "dwt (tonnes)": 105000.0,
+    }
+    assert parsed.loc[9811000, "name"] == "Ever Given"
+    assert parsed.loc[9321483, "name"] is None
+    # feet are converted and a number without separators is not cut
+    assert parsed.loc[9811000, "length (m)"] == pytest.approx(1312 * 0.3048)
+    assert parsed.loc[9811000, "gross_tonnage"] == 219079
+    assert np.isnan(parsed.loc[9811000, "beam (m)"])
+    assert pd.isna(parsed.loc[9811000, "built_year"])
+    # the fleet list has numeric fields and lengths without units
+    assert parsed.loc[9384992, ["length (m)", "beam (m)", "gross_tonnage"]].tolist() == [230.0, 42.0, 57462.0]
+    assert parsed.loc[9384992, "built_year"] == 2007
+    assert np.isnan(parsed.loc[9384992, "dwt (tonnes)"])
+
+
+def test_extraction_coverage(sources):
+    coverage = extraction_coverage(parse_ship_particulars(load_ship_particulars(sources)))
+
+    assert coverage.loc["IMO_number", "coverage"] == 1.0
+    assert coverage.loc["beam (m)", "found"] == 2
+    assert coverage.loc["net_tonnage", "missing"] == 2
+
+
+def test_extract_helpers():
+    assert extract_metres(pd.Series(["184.55 m", "26.40m", "100 feet", None])).tolist()[:3] == [184.55, 26.4, 30.48]
+    assert extract_year(pd.Series(["28 July 2004", "1975", "unknown"])).tolist()[:2] == [2004, 1975]
+
+
+def test_attach_imo_numbers_by_name(tmp_path):
+    path = tmp_path / "scrape.json"
+    path.write_text(json.dumps({
+        "MV Ever Given (ship)": {"Length": "399.9 m"},
+        "Unknown vessel": {"Length": "120 m"},
+        "9321483": {"Name": "MSC Oscar", "Length": "395.4 m"},
+    }), encoding="utf-8")
+    ships = pd.DataFrame({"imo_number": [9811000, 9321483], "name": ["EVER GIVEN", "MSC OSCAR"]})
+
+    parsed = attach_imo_numbers(parse_ship_particulars(load_ship_particulars([str(path)])), ships)
+
+    assert parsed["IMO_number"].tolist()[0] == 9811000
+    assert pd.isna(parsed["IMO_number"].iloc[1])
+    assert parsed["IMO_number"].iloc[2] == 9321483
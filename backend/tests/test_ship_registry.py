@@ -0,0 +1,103 @@
+import os
+import pytest
+import pandas as pd
+
+from unittest.mock import MagicMock, patch
+from src.utils.data.ship_registry import ShipRegistryCache, latest_versions_from_partitions
+from src.utils.data.fetch_ship_ids import fetch_ship_ids, fetch_ship_ids_and_types
+
+
+class FakeRemote:
+    def __init__(self):
+        self.version = "2018=v1,2019=v2"
+        self.loads = 0
+        self.version_checks = 0
+        self.offline = False
+
+    def load(self):
+        self.loads += 1
+        return pd.DataFrame({
+            "imo_number": [9321483, 9321483, 9811000],
+            "name": ["MSC OSCAR", "MSC OSCAR II", "EVER GIVEN"],
+            "ship_type": ["Container ship", "Container ship", "Container ship"],
+        })
+
+    def resolve_version(self):
+        self.version_checks += 1
+        if self.offline:
+            raise ConnectionError("no network")
+        return self.version
+
+
+@pytest.fixture
+def remote():
+    return FakeRemote()
+
+
+@pytest.fixture
+def clock():
+    return [1000.0]
+
+
+def make_cache(tmp_path, remote, clock):
+    return ShipRegistryCache(
+        str(tmp_path), ttl_seconds=60, loader=remote.load, version_resolver=remote.resolve_version,
+        clock=lambda: clock[0],
+    )
+
+
+def test_snapshot_is_reused_within_ttl(tmp_path, remote, clock):
+    ships = make_cache(tmp_path, remote, clock).get()
+    assert list(ships.columns) == ["imo_number", "name", "ship_type"]
+
+    # a new process reads the snapshot from disk without any remote call
+    pd.testing.assert_frame_equal(make_cache(tmp_path, remote, clock).get(), ships)
+    assert (remote.loads, remote.version_checks) == (1, 1)
+
+
+def test_expired_snapshot_is_only_reloaded_for_a_new_version(tmp_path, remote, clock):
+    cache = make_cache(tmp_path, remote, clock)
+    cache.get()
+
+    clock[0] += 120
+    cache.get()
+    assert (remote.loads, remote.version_checks) == (1, 2)
+
+    remote.version = "2018=v1,2019=v3"
+    cache.refresh()
+    assert (remote.loads, remote.version_checks) == (2, 3)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".parquet")]) == 1
+
+
+def test_stale_snapshot_is_used_when_offline(tmp_path, remote, clock):
+    make_cache(tmp_path, remote, clock).get()
+    remote.offline = True
+    clock[0] += 120
+
+    assert len(make_cache(tmp_path, remote, clock).get()) == 3
+    with pytest.raises(ConnectionError):
+        make_cache(tmp_path / "empty", remote, clock).get()
+
+
+def test_latest_versions_from_partitions():
+    partitions = {
+        "s3://bucket/clean/year=2018/version=1/": ["2018", "1"],
+        "s3://bucket/clean/year=2018/version=3/": ["2018", "3"],
+        "s3://bucket/clean/year=2019/version=2/": ["2019", "2"],
+    }
+
+    assert latest_versions_from_partitions(partitions, ["year", "version"]) == {2018: 3, 2019: 2}
+
+
+def test_fetch_functions_share_one_registry(tmp_path, remote, clock):
+    registry = make_cache(tmp_path, remote, clock)
+
+    with patch("src.utils.data.fetch_ship_ids.get_ship_registry", MagicMock(return_value=registry)):
+        ids = fetch_ship_ids()
+        types = fetch_ship_ids_and_types()
+
+    assert ids.to_dict("list") == {
+        "imo_number": [9321483, 9321483, 9811000], "name": ["MSC OSCAR", "MSC OSCAR II", "EVER GIVEN"],
+    }
+    assert types.to_dict("list") == {"imo_number": [9321483, 9811000], "ship_type": ["Container ship"] * 2}
+    assert remote.loads == 1
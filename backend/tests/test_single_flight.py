@@ -0,0 +1,142 @@
+import threading
+import time
+import pytest
+
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from app.api.query_backend import QueryBackend
+from app.api.single_flight import DynamoDBSingleFlight, SingleFlight, SingleFlightBackend, query_key
+
+
+class SlowBackend(QueryBackend):
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.executions = 0
+        self.lock = threading.Lock()
+
+    def execute(self, query, parameters=None):
+        with self.lock:
+            self.executions += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [{"query": query, "parameters": str(parameters)}]
+
+
+def run_concurrently(calls):
+    with ThreadPoolExecutor(len(calls)) as executor:
+        futures = [executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+
+def test_query_keys_ignore_whitespace():
+    assert query_key("SELECT *\n   FROM t WHERE a = ?", [1]) == query_key("SELECT * FROM t WHERE a = ?", [1])
+    assert query_key("SELECT * FROM t WHERE a = ?", [1]) != query_key("SELECT * FROM t WHERE a = ?", [2])
+
+
+def test_concurrent_identical_queries_share_one_execution():
+    backend = SlowBackend()
+    single_flight = SingleFlight()
+    coalesced = SingleFlightBackend(backend, single_flight)
+
+    results = run_concurrently([lambda: coalesced.execute("SELECT ?", ["Oil tanker"])] * 10)
+    other = coalesced.execute("SELECT ?", ["Bulk carrier"])
+
+    assert backend.executions == 2
+    assert all(rows == results[0] for rows in results) and other != results[0]
+    assert single_flight.metrics == {"executions": 2, "shared": 9}
+
+    # every caller gets its own rows
+    results[0][0]["query"] = "changed"
+    assert results[1][0]["query"] == "SELECT ?"
+
+
+def test_errors_are_shared_and_not_cached():
+    backend = SlowBackend(error=RuntimeError("Query failed with status: FAILED"))
+    coalesced = SingleFlightBackend(backend, SingleFlight())
+
+    def call():
+        with pytest.raises(RuntimeError):
+            coalesced.execute("SELECT 1")
+
+    run_concurrently([call] * 5)
+    assert backend.executions == 1
+
+    backend.error = None
+    assert coalesced.execute("SELECT 1")
+    assert backend.executions == 2
+
+
+class FakeDynamoDB:
+    """The conditional put, get and delete of a DynamoDB table keyed by query_key"""
+
+    def __init__(self, clock):
+        self.items = {}
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+        with self.lock:
+            key = Item["query_key"]["S"]
+            current = self.items.get(key)
+            if ConditionExpression and current and float(current["expires_at"]["N"]) >= self.clock():
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+            self.items[key] = Item
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        with self.lock:
+            item = self.items.get(Key["query_key"]["S"])
+        return {"Item": item} if item else {}
+
+    def delete_item(self, TableName, Key):
+        with self.lock:
+            self.items.pop(Key["query_key"]["S"], None)
+
+
+def instance(client, **kwargs):
+    return DynamoDBSingleFlight("single-flight", client=client, poll_interval=0.01, **kwargs)
+
+
+def test_instances_share_executions_through_dynamodb():
+    client = FakeDynamoDB(time.time)
+    backend = SlowBackend()
+    instances = [instance(client) for _ in range(4)]
+
+    results = run_concurrently([
+        lambda single_flight=single_flight: SingleFlightBackend(backend, single_flight).execute("SELECT 1")
+        for single_flight in instances for _ in range(3)
+    ])
+
+    assert backend.executions == 1
+    assert all(rows == results[0] for rows in results)
+    assert sum(single_flight.metrics["shared"] for single_flight in instances) == 3
+    assert sum(single_flight.local.metrics["shared"] for single_flight in instances) == 8
+
+
+def test_waiting_instances_run_the_query_when_the_leader_fails_or_dies():
+    clock = [1000.0]
+    client = FakeDynamoDB(lambda: clock[0])
+    client.put_item(TableName="single-flight", Item={
+        "query_key": {"S": "key"}, "status": {"S": "running"}, "expires_at": {"N": "1010"},
+    })
+
+    def sleep(seconds):
+        clock[0] += 5
+
+    follower = instance(client, clock=lambda: clock[0], sleep=sleep)
+    assert follower.do("key", lambda: "ran") == "ran"
+    assert follower.metrics == {"executions": 0, "shared": 0, "fallbacks": 1}
+
+    # the lock of the dead leader has expired, so a new call takes it
+    assert follower.do("key", lambda: "leader") == "leader"
+    assert client.items["key"]["status"]["S"] == "done"
+
+
+def test_large_results_are_not_shared():
+    client = FakeDynamoDB(time.time)
+    single_flight = instance(client)
+    single_flight.MAX_RESULT_BYTES = 10
+
+    assert single_flight.do("key", lambda: ["a long result"]) == ["a long result"]
+    assert client.items == {}
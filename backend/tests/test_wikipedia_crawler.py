@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import pytest
+import pandas as pd
+
+from src.utils.data.name_matching import NAME_MATCH_THRESHOLD, NameIndex
+from src.wikipedia_crawler import ContentCache, TokenBucket, WikipediaCrawler, load_checkpoint, parse_infobox
+
+INFOBOX_HTML = """
+<table class="infobox"><tbody>
+<tr style="vertical-align:top;"><td>Tonnage</td><td>94,511 GT</td></tr>
+<tr style="vertical-align:top;"><td>Length</td><td>299.9 m</td></tr>
+</tbody></table>
+"""
+
+
+class StubPage:
+    def __init__(self, html):
+        self._html = html
+
+    def html(self):
+        return self._html
+
+
+class StubWikipedia:
+    """Answers like the wikipedia package from a dictionary of IMO number -> article title"""
+
+    def __init__(self, articles, failing=()):
+        self.articles = articles
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def search(self, query, results=1):
+        with self.lock:
+            self.calls.append(("search", query))
+        imo_number = query.split(": ")[1]
+        if imo_number in self.failing:
+            raise ConnectionError("timeout")
+        return [self.articles[imo_number]] if imo_number in self.articles else []
+
+    def page(self, title, auto_suggest=True):
+        with self.lock:
+            self.calls.append(("page", title))
+        return StubPage(f"<html>{title}</html>")
+
+
+def stub_parse(html_page):
+    return {"html_length": str(len(html_page))}
+
+
+@pytest.fixture
+def ships():
+    return pd.DataFrame({
+        "imo_number": [9321483, 9811000, 9384992, 9100001],
+        "name": ["MSC OSCAR", "EVER GIVEN", "NO ARTICLE", "SOMETHING ELSE"],
+    })
+
+
+@pytest.fixture
+def articles():
+    return {"9321483": "MSC Oscar", "9811000": "Ever Given", "9100001": "Unrelated article"}
+
+
+def make_crawler(tmp_path, client, **kwargs):
+    kwargs.setdefault("parse_workers", 0)
+    return WikipediaCrawler(
+        cache_dir=str(tmp_path / "cache"),
+        checkpoint_path=str(tmp_path / "checkpoint.jsonl"),
+        client=client,
+        requests_per_second=1000,
+        burst=1000,
+        parse=stub_parse,
+        **kwargs,
+    )
+
+
+def test_token_bucket_spaces_requests():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+
+    bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0], sleep=sleep)
+
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert bucket.acquire() == 0.0
+    assert waits == [0.5, 1.0]
+
+
+def test_content_cache_stores_identical_contents_once(tmp_path):
+    cache = ContentCache(str(tmp_path))
+    cache.put("html", "Ever Given", "<html>page</html>")
+    cache.put("html", "MV Ever Given", "<html>page</html>")
+
+    assert cache.get("html", "MV Ever Given") == "<html>page</html>"
+    assert cache.get("html", "Ever Green") is None
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "objects")) == 1
+
+
+def test_crawl_records_every_ship(tmp_path, ships, articles):
+    records = make_crawler(tmp_path, StubWikipedia(articles)).run(ships)
+
+    assert {imo_number: record["status"] for imo_number, record in records.items()} == {
+        "9321483": "found", "9811000": "found", "9384992": "not_found", "9100001": "no_match",
+    }
+    assert records["9321483"]["infobox"] == {"html_length": str(len("<html>MSC Oscar</html>"))}
+    assert "html" not in records["9321483"]
+
+
+def test_titles_are_matched_like_the_name_index(tmp_path):
+    titles = {"9321483": "MV MSC Oscar (ship)", "9811000": "Ever Glory", "9384992": "Evergreen Marine"}
+    ships = pd.DataFrame({"imo_number": list(titles), "name": ["MSC OSCAR", "EVER GIVEN", "EVER GIVEN"]})
+    records = make_crawler(tmp_path, StubWikipedia(titles)).run(ships)
+
+    matches = NameIndex(titles.values()).match(ships["name"], threshold=NAME_MATCH_THRESHOLD)
+    assert records["9321483"]["status"] == "found" and matches["match"][0] == "MV MSC Oscar (ship)"
+    assert records["9811000"]["status"] == records["9384992"]["status"] == "no_match"
+    assert matches["index"][1] == matches["index"][2] == -1
+
+
+def test_rerun_uses_checkpoint_and_cache(tmp_path, ships, articles):
+    make_crawler(tmp_path, StubWikipedia(articles)).run(ships.iloc[:2])
+
+    # the first two ships are in the checkpoint, the others are crawled
+    client = StubWikipedia(articles)
+    records = make_crawler(tmp_path, client).run(ships)
+    assert len(records) == 4
+    assert {query for _, query in client.calls} == {"IMO number: 9384992", "IMO number: 9100001"}
+
+    # without the checkpoint, every response comes from the cache
+    os.remove(tmp_path / "checkpoint.jsonl")
+    client = StubWikipedia(articles)
+    assert make_crawler(tmp_path, client).run(ships) == records
+    assert client.calls == []
+
+
+def test_failed_ships_are_retried(tmp_path, ships, articles):
+    records = make_crawler(tmp_path, StubWikipedia(articles, failing={"9811000"})).run(ships)
+    assert records["9811000"]["status"] == "error"
+
+    client = StubWikipedia(articles)
+    records = make_crawler(tmp_path, client).run(ships)
+    assert records["9811000"]["status"] == "found"
+    assert ("search", "IMO number: 9811000") in client.calls
+
+
+def test_ships_without_a_name_are_checkpointed_as_invalid(tmp_path, ships, articles):
+    ships = pd.concat([ships, pd.DataFrame({"imo_number": ["9200001", "9200002"], "name": [None, " "]})])
+    client = StubWikipedia(articles)
+    records = make_crawler(tmp_path, client).run(ships)
+
+    assert records["9200001"] == {"imo_number": "9200001", "name": None, "status": "invalid"}
+    assert records["9200002"]["status"] == "invalid"
+    assert not any(query.endswith(("9200001", "9200002")) for _, query in client.calls)
+
+    client = StubWikipedia(articles)
+    assert make_crawler(tmp_path, client).run(ships) == records
+    assert client.calls == []
+
+
+def test_checkpoint_ignores_truncated_line(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(json.dumps({"imo_number": "9321483", "status": "not_found"}) + '\n{"imo_number": "98', "utf-8")
+
+    assert list(load_checkpoint(str(path))) == ["9321483"]
+
+
+def test_parsing_in_worker_processes(tmp_path, ships, articles):
+    records = make_crawler(tmp_path, StubWikipedia(articles), parse_workers=2).run(ships)
+
+    assert records["9811000"]["infobox"] == {"html_length": str(len("<html>Ever Given</html>"))}
+
+
+def test_parse_infobox():
+    pytest.importorskip("bs4")
+
+    assert parse_infobox(INFOBOX_HTML) == {"Tonnage": "94,511 GT", "Length": "299.9 m"}
+    assert parse_infobox("<html></html>") == {}